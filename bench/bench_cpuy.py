@@ -0,0 +1,62 @@
+import json
+import os
+import time
+
+import cocotb
+from cocotb.clock import Clock
+
+from cpuy_iss import Cpu
+from cpuy_tb import RomDriver
+from cpuy_tb.profile import Profiler
+from cpuy_tb.table import reset
+
+from .workloads import WORKLOADS
+
+
+async def measure(dut, name):
+    """Runs a workload, checks its ports against cpuy_iss and records it into $CPUY_BENCH"""
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+    program = WORKLOADS[name]
+
+    await reset(dut)
+    profiler = Profiler(dut)
+    profiler.start()
+    start = time.perf_counter()
+    result = await RomDriver(dut, program).run()
+    wall_time = time.perf_counter() - start
+    profiler.stop()
+
+    reference = Cpu(program)
+    reference.run()
+    assert result.reason == "sentinel", f"Unexpected halt of {name}: {result}"
+    assert dut.p0_tb.value == reference.p0out, \
+        f"Unexpected P0 of {name}: desired {reference.p0out}, got {dut.p0_tb.value}"
+    assert dut.p1_tb.value == reference.p1out, \
+        f"Unexpected P1 of {name}: desired {reference.p1out}, got {dut.p1_tb.value}"
+
+    directory = os.environ.get("CPUY_BENCH")
+    if directory:
+        with open(os.path.join(directory, f"{name}.json"), "w") as stream:
+            json.dump({"wall_time": wall_time, "cycles": profiler.profile.cycles,
+                       "instructions": profiler.profile.instructions}, stream)
+
+
+@cocotb.test()
+async def alu_loop(dut):
+    await measure(dut, "alu_loop")
+
+
+@cocotb.test()
+async def multiply(dut):
+    await measure(dut, "multiply")
+
+
+@cocotb.test()
+async def call_chain(dut):
+    await measure(dut, "call_chain")
+
+
+@cocotb.test()
+async def timer_isr(dut):
+    await measure(dut, "timer_isr")
@@ -0,0 +1,221 @@
+"""Benchmark suite of the RTL, the testbench and the Python reference model
+
+Every workload of bench/workloads.py runs once as a cocotb test of
+bench/bench_cpuy.py, one simulation at a time, and on cpuy_iss, interpreted
+and translated to basic blocks. The suite reports the host wall time,
+simulated clock cycles, cycles per second and instructions retired of each,
+and compares them against bench/baseline.json:
+
+    python -m bench.run [--sim verilator] [--update] [--tolerance 0.3]
+
+Simulated cycles and instructions are budgets, exceeding them is a performance
+regression of the RTL. Throughput depends on the host, a simulator or model
+slower than its baseline by more than the tolerance is a regression of the
+simulation or of the harness. Either fails the suite, as does a workload whose
+ports do not match cpuy_iss. --update writes the results as the new baseline,
+throughput only for the simulators run, so record it on the host that checks it.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+from cpuy_iss import Cpu
+from cpuy_iss.blocks import BlockCpu
+from cpuy_tb.build import ROOT
+from cpuy_tb.regress import discover, run
+
+from .workloads import WORKLOADS
+
+VERSION = 1
+
+BASELINE = os.path.join(ROOT, "bench", "baseline.json")
+
+ISS = "iss" # Throughput key of the Python reference model
+ISS_BLOCKS = "iss_blocks" # and of its basic block translation
+
+
+class BenchResult:
+    __slots__ = ("workload", "simulator", "status", "message", "wall_time", "cycles", "instructions")
+
+    def __init__(self, workload, simulator, status, message="", wall_time=0.0, cycles=0, instructions=0):
+        self.workload = workload
+        self.simulator = simulator
+        self.status = status # "passed" or "failed"
+        self.message = message
+        self.wall_time = wall_time
+        self.cycles = cycles
+        self.instructions = instructions
+
+    @property
+    def cycles_per_second(self):
+        return self.cycles / self.wall_time if self.wall_time else 0.0
+
+    def to_json(self):
+        return {"status": self.status, "wall_time": self.wall_time, "cycles": self.cycles,
+                "instructions": self.instructions, "cycles_per_second": self.cycles_per_second}
+
+
+def run_rtl(workloads, sim="icarus", waves="fst"):
+    """Runs the workloads on the RTL, one simulation at a time, returns their BenchResults"""
+    module, tests = discover(package="bench", prefix="bench_")[0]
+    bench_dir = os.path.join(ROOT, "sim_build", "bench")
+    records = os.path.join(bench_dir, "records")
+    shutil.rmtree(records, ignore_errors=True)
+    os.makedirs(records)
+    os.environ["CPUY_BENCH"] = records
+
+    results = []
+    shards = run([(module, name) for name in workloads if name in tests], sim, jobs=1, waves=waves,
+                 directory=os.path.join(bench_dir, "workers"))
+    for shard in shards:
+        if shard.status != "passed":
+            results.append(BenchResult(shard.name, sim, "failed", shard.message))
+            continue
+        with open(os.path.join(records, f"{shard.name}.json")) as stream:
+            record = json.load(stream)
+        # The last instruction of every workload, a NOP, retires after the driver stops at the sentinel
+        results.append(BenchResult(shard.name, sim, "passed", "", record["wall_time"], record["cycles"] + 2,
+                                   record["instructions"] + 1))
+    return results
+
+
+def run_iss(workloads, repeat=20, cpu_class=Cpu, simulator=ISS):
+    """Runs the workloads on cpuy_iss, the best wall time of repeat runs, returns their BenchResults"""
+    results = []
+    for name in workloads:
+        best = None
+        for _ in range(repeat):
+            cpu = cpu_class(WORKLOADS[name])
+            start = time.perf_counter()
+            cpu.run()
+            wall_time = time.perf_counter() - start
+            best = wall_time if best is None else min(best, wall_time)
+        results.append(BenchResult(name, simulator, "passed", "", best, cpu.cycles, cpu.instructions))
+    return results
+
+
+def read_baseline(path):
+    try:
+        with open(path) as stream:
+            baseline = json.load(stream)
+    except FileNotFoundError:
+        return {"version": VERSION, "workloads": {}, "throughput": {}}
+    if baseline.get("version") != VERSION:
+        raise ValueError(f"Baseline version {baseline.get('version')}, this suite reads {VERSION}")
+    return baseline
+
+
+def update_baseline(baseline, results):
+    """Baseline with the budgets of the ISS results and the throughput of every result"""
+    for result in results:
+        if result.status != "passed":
+            continue
+        if result.simulator == ISS:
+            baseline["workloads"][result.workload] = {"cycles": result.cycles, "instructions": result.instructions}
+        baseline["throughput"].setdefault(result.simulator, {})[result.workload] = round(result.cycles_per_second, 1)
+    return baseline
+
+
+def compare(result, baseline, tolerance):
+    """(failed, note) of a result against the baseline"""
+    if result.status != "passed":
+        return True, result.message
+    budget = baseline["workloads"].get(result.workload)
+    reference = baseline["throughput"].get(result.simulator, {}).get(result.workload)
+    notes = []
+    failed = False
+    if budget is None:
+        notes.append("no cycle budget")
+    elif result.cycles > budget["cycles"] or result.instructions > budget["instructions"]:
+        failed = True
+        notes.append(f"over budget: {budget['cycles']} cycles, {budget['instructions']} instructions")
+    elif (result.cycles, result.instructions) != (budget["cycles"], budget["instructions"]):
+        notes.append("under budget, update the baseline")
+    if reference is None:
+        notes.append("no throughput baseline")
+    else:
+        change = result.cycles_per_second / reference - 1
+        if change < -tolerance:
+            failed = True
+            notes.append(f"{-100 * change:.0f}% slower than {reference:.0f} cycles/s")
+        else:
+            notes.append(f"{100 * change:+.0f}%")
+    return failed, ", ".join(notes)
+
+
+def check_rtl(rtl, iss):
+    """Fails RTL results whose cycles or instructions disagree with the model run of the same workload"""
+    models = {result.workload: result for result in iss}
+    for result in rtl:
+        model = models.get(result.workload)
+        if result.status != "passed" or model is None:
+            continue
+        if (result.cycles, result.instructions) != (model.cycles, model.instructions):
+            result.status = "failed"
+            result.message = (f"{result.cycles} cycles and {result.instructions} instructions, cpuy_iss "
+                              f"{model.cycles} and {model.instructions}")
+
+
+def summary(results, baseline, tolerance):
+    lines = [f"{'WORKLOAD':<12} {'SIM':<10} {'STATUS':>7} {'WALL (s)':>9} {'CYCLES':>8} {'INSTR':>7} "
+             f"{'CYCLES/S':>10}  BASELINE"]
+    failed = 0
+    for result in results:
+        regression, note = compare(result, baseline, tolerance)
+        failed += regression
+        lines.append(f"{result.workload:<12} {result.simulator:<10} {'FAILED' if regression else 'PASSED':>7} "
+                     f"{result.wall_time:>9.3f} {result.cycles:>8} {result.instructions:>7} "
+                     f"{result.cycles_per_second:>10.0f}  {note}")
+    lines.append(f"{len(results)} benchmarks, {failed} failed")
+    return "\n".join(lines), failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__.splitlines()[0])
+    parser.add_argument("workloads", nargs="*", help="workloads to run, all of them by default")
+    parser.add_argument("--sim", default=os.environ.get("SIM", "icarus"), choices=("icarus", "verilator"))
+    parser.add_argument("--waves", default=os.environ.get("WAVES_FORMAT", "fst"), choices=("fst", "vcd"),
+                        help="format of the waveform capture built in, as in the regression")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="throughput drop tolerated, 0.3 is 30%%")
+    parser.add_argument("--repeat", type=int, default=20, help="runs of every workload on cpuy_iss, the best counts")
+    parser.add_argument("--no-rtl", action="store_true", help="benchmark cpuy_iss only")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("-o", "--output", help="results JSON to write")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.exit(1, f"Unknown workloads {', '.join(sorted(unknown))}, workloads are {', '.join(WORKLOADS)}\n")
+    workloads = args.workloads or list(WORKLOADS)
+
+    iss = run_iss(workloads, args.repeat)
+    blocks = run_iss(workloads, args.repeat, BlockCpu, ISS_BLOCKS)
+    rtl = [] if args.no_rtl else run_rtl(workloads, args.sim, args.waves)
+    check_rtl(rtl + blocks, iss)
+    results = rtl + iss + blocks
+
+    baseline = read_baseline(args.baseline)
+    if args.update:
+        baseline = update_baseline(baseline, results)
+        with open(args.baseline, "w") as stream:
+            json.dump(baseline, stream, indent=1, sort_keys=True)
+            stream.write("\n")
+    text, failed = summary(results, baseline, args.tolerance)
+    print(text)
+
+    if args.output:
+        output = {"version": VERSION, "results": {}}
+        for result in results:
+            output["results"].setdefault(result.simulator, {})[result.workload] = result.to_json()
+        with open(args.output, "w") as stream:
+            json.dump(output, stream, indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
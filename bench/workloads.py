@@ -0,0 +1,136 @@
+"""Programs of the benchmark suite, representative CPUy workloads
+
+Every workload ends writing its result to the ports and running 2 NOPs before
+the sentinel, so the suite checks the RTL against cpuy_iss while it measures
+it, and knows the last instruction the RTL retires after the driver stops.
+"""
+
+from cpuy_iss.asm import assemble
+
+# Tight loop of 1 operand ALU instructions
+alu_loop = assemble("""
+        MovLM 0, 250
+        MovLM 1, 0
+loop:   MovMW 1
+        AddLW 0x17
+        XorLW 0x5A
+        RL
+        Not
+        OrLW 3
+        SubLW 9
+        AndLW 0x7E
+        Swap
+        Inc
+        MovWM 1
+        MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        Jmp loop
+done:   MovMW 1
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+""")
+
+# Products and sums of RAM operands, MulMW writes the high byte of the product to its second operand
+multiply = assemble("""
+        MovLM 0, 250
+        MovLM 1, 3
+        MovLM 2, 1
+loop:   MovMW 2
+        MulMW 1, 3
+        OrLW 1
+        MulMW 1, 3
+        AddMW 3
+        MovWM 2
+        MovMW 1
+        MulMW 2, 3
+        AddMW 3
+        OrLW 1
+        MovWM 1
+        MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        Jmp loop
+done:   MovMW 1
+        MovWP0
+        MovMW 2
+        MovWP1
+        NOP
+        NOP
+        .byte 127
+""")
+
+STACK_CHAIN = 15 # Nested calls, the stack holds 16 return addresses
+
+# Chains of 15 nested calls and their returns
+call_chain = assemble("""
+        MovLM 0, 60
+        MovLW 0
+loop:   Call f1
+        MovWM 1
+        MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        MovMW 1
+        Jmp loop
+""" + "".join(f"""
+f{depth}:{' ' * (4 - len(str(depth)))}Inc
+        Call f{depth + 1}
+        Ret
+""" for depth in range(1, STACK_CHAIN)) + f"""
+f{STACK_CHAIN}:    Inc
+        Ret
+done:   MovMW 1
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+""")
+
+# The Timer 0 interruption pattern of test_cpuy.instructions2, with a short count so the routine runs often.
+# The routine keeps W and the loop does not test flags, cpuy does not save them on interruptions
+timer_isr = assemble("""
+        Jmp main
+        .org 0x20               ; Timer 0 interruption vector
+        XchWM 2
+        MovMW 1
+        Inc
+        MovWM 1
+        XchWM 2
+        Ret
+        .org 0x40
+main:   MovLW 40                ; Timer 0 counts 40 down with autoreload
+        MovWR0
+        MovLW 0
+        MovWR1
+        MovLW 5
+        TmrCfg
+        MovLM 1, 0
+        MovLM 3, 0
+        MovLW 160               ; GIE and T0IE
+        CpuCfg
+loop:   MovMW 3                 ; Until 128 interruptions
+        AddLW 1
+        MovWM 3
+        MovMW 1
+        Tb7jc loop
+        MovLW 0
+        CpuCfg
+        MovMW 3
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+""")
+
+WORKLOADS = {
+    "alu_loop": alu_loop,
+    "multiply": multiply,
+    "call_chain": call_chain,
+    "timer_isr": timer_isr,
+}
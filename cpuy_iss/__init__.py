@@ -0,0 +1,7 @@
+"""Python reference model of the CPUy processor"""
+
+from .alu import alu
+from .cpu import Cpu
+from .isa import MNEMONICS, OPERAND_COUNT, CYCLES, rom_image
+from .stack import Stack
+from .timer import Timer
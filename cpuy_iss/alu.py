@@ -0,0 +1,143 @@
+"""Python mirror of alu.v
+
+Every operation takes (op1, op2, cpu_carry) and returns (result_l, result_h, flags)
+with flags packed as in the flags register: carry bit 0, zero bit 1, sign bit 2.
+"""
+
+from .isa import CARRY, ZERO, SIGN
+
+
+def _none(op1, op2, carry):
+    return 0, 0, 0
+
+
+def _add(op1, op2, carry):
+    total = op1 + op2 + carry
+    return total & 0xFF, 0, CARRY if total > 255 else 0
+
+
+def _sub(op1, op2, carry):
+    flags = ZERO if op1 == op2 else 0
+    if op1 < op2:
+        return op2 - op1, 0, flags | SIGN
+    return op1 - op2, 0, flags
+
+
+def _mul(op1, op2, carry):
+    product = op1 * op2
+    return product & 0xFF, product >> 8, ZERO if op1 == 0 or op2 == 0 else 0
+
+
+def _and(op1, op2, carry):
+    result = op1 & op2
+    return result, 0, 0 if result else ZERO
+
+
+def _or(op1, op2, carry):
+    result = op1 | op2
+    return result, 0, 0 if result else ZERO
+
+
+def _xor(op1, op2, carry):
+    result = op1 ^ op2
+    return result, 0, 0 if result else ZERO
+
+
+def _dec(op1, op2, carry):
+    if op1 == 0:
+        return 1, 0, SIGN
+    return op1 - 1, 0, ZERO if op1 == 1 else 0
+
+
+def _inc(op1, op2, carry):
+    if op1 == 0xFF:
+        return 0, 0, CARRY | ZERO
+    return op1 + 1, 0, 0
+
+
+def _not(op1, op2, carry):
+    result = op1 ^ 0xFF
+    return result, 0, 0 if result else ZERO
+
+
+def _setc(op1, op2, carry):
+    return op1, 0, CARRY
+
+
+def _clrc(op1, op2, carry):
+    return op1, 0, 0
+
+
+def _rl(op1, op2, carry):
+    return ((op1 << 1) | (op1 >> 7)) & 0xFF, 0, 0 if op1 else ZERO
+
+
+def _rr(op1, op2, carry):
+    return ((op1 << 7) | (op1 >> 1)) & 0xFF, 0, 0 if op1 else ZERO
+
+
+def _rlc(op1, op2, carry):
+    result = ((op1 << 1) | carry) & 0xFF
+    return result, 0, (op1 >> 7) | (0 if result else ZERO)
+
+
+def _rrc(op1, op2, carry):
+    result = (carry << 7) | (op1 >> 1)
+    return result, 0, (op1 & 1) | (0 if result else ZERO)
+
+
+def _swap(op1, op2, carry):
+    return ((op1 << 4) | (op1 >> 4)) & 0xFF, 0, 0 if op1 else ZERO
+
+
+def _setb(bit):
+    mask = 1 << bit
+
+    def setb(op1, op2, carry):
+        return op1 | mask, 0, 0
+    return setb
+
+
+def _clrb(bit):
+    mask = (1 << bit) ^ 0xFF
+
+    def clrb(op1, op2, carry):
+        result = op1 & mask
+        return result, 0, 0 if result else ZERO
+    return clrb
+
+
+def _operations():
+    operations = [_none] * 256
+
+    # Single operand operations
+    for op, operation in ((0b0000_0001, _dec), (0b0000_0010, _inc), (0b0000_0011, _not), (0b0000_0100, _setc),
+                          (0b0000_0101, _clrc), (0b0000_0110, _rl), (0b0000_0111, _rr), (0b0000_1000, _rlc),
+                          (0b0000_1001, _rrc), (0b0000_1010, _swap)):
+        operations[op] = operation
+
+    for bit in range(8):
+        operations[0b0110_0000 | bit] = _setb(bit)
+        operations[0b0110_1000 | bit] = _clrb(bit)
+
+    # Operations with 2 operands are decoded from operation[6:1]
+    for op in range(0x80, 0x100):
+        operations[op] = {
+            0b00_0100: _add, 0b00_0101: _add,
+            0b00_0110: _sub, 0b00_0111: _sub,
+            0b00_1000: _mul, 0b00_1001: _mul,
+            0b00_1010: _and, 0b00_1011: _and,
+            0b00_1100: _or, 0b00_1101: _or,
+            0b00_1110: _xor, 0b00_1111: _xor,
+        }.get((op >> 1) & 0b11_1111, _none)
+
+    return tuple(operations)
+
+
+# ALU operation selected by every opcode, the ALU is enabled while the CPU runs
+OPERATIONS = _operations()
+
+
+def alu(operation, op1, op2, cpu_carry):
+    """Combinational ALU output for the given inputs: (result_l, result_h, flags)"""
+    return OPERATIONS[operation](op1, op2, cpu_carry)
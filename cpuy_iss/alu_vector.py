@@ -0,0 +1,87 @@
+"""NumPy vectorized mirror of alu.v
+
+alu() evaluates one operation over arrays of op1, op2 and cpu_carry values,
+broadcast against each other, and returns the 5 outputs of the ALU:
+
+    op1, op2, carry = np.meshgrid(np.arange(256), np.arange(256), (0, 1), indexing="ij")
+    result_l, result_h, carry, zero, sign = alu(0x88, op1, op2, carry)
+
+It is written from alu.v, independently of the scalar mirror of cpuy_iss.alu,
+so the two models and the RTL check each other. NumPy is only needed by this
+module and cpuy_iss.batch.
+"""
+
+import numpy as np
+
+# Operations with 2 operands, operation[6:1] as decoded by alu.v
+_ADD = (0b00_0100, 0b00_0101)
+_SUB = (0b00_0110, 0b00_0111)
+_MUL = (0b00_1000, 0b00_1001)
+_AND = (0b00_1010, 0b00_1011)
+_OR = (0b00_1100, 0b00_1101)
+_XOR = (0b00_1110, 0b00_1111)
+
+
+def alu(operation, op1, op2, cpu_carry, enable=True):
+    """(result_l, result_h, carry, zero, sign) of alu.v for one operation, as uint8 and bool arrays"""
+    op1, op2, cpu_carry = (np.asarray(value, np.int32) for value in np.broadcast_arrays(op1, op2, cpu_carry))
+    zeros = np.zeros(op1.shape, np.int32)
+    false = np.zeros(op1.shape, bool)
+    result_l, result_h, carry, zero, sign = zeros, zeros, false, false, false
+
+    if not enable:
+        pass
+    elif operation & 0x80:
+        kind = (operation >> 1) & 0b11_1111
+        if kind in _ADD:
+            total = op1 + op2 + cpu_carry
+            result_l, carry = total, total > 255
+        elif kind in _SUB:
+            zero = op1 == op2
+            sign = op1 < op2
+            result_l = np.abs(op1 - op2)
+        elif kind in _MUL:
+            product = op1 * op2
+            result_l, result_h = product, product >> 8
+            zero = (op1 == 0) | (op2 == 0)
+        elif kind in _AND + _OR + _XOR:
+            result_l = op1 & op2 if kind in _AND else op1 | op2 if kind in _OR else op1 ^ op2
+            zero = result_l == 0
+    elif operation >> 3 == 0b1100: # SetbW N
+        result_l = op1 | (1 << (operation & 7))
+    elif operation >> 3 == 0b1101: # ClrbW N
+        result_l = op1 & ~(1 << (operation & 7))
+        zero = (result_l & 0xFF) == 0
+    elif operation == 0b0000_0001: # Dec
+        zero = op1 == 1
+        sign = op1 == 0
+        result_l = np.where(sign, 1, op1 - 1)
+    elif operation == 0b0000_0010: # Inc
+        carry = zero = op1 == 0xFF
+        result_l = op1 + 1
+    elif operation == 0b0000_0011: # Not
+        result_l = ~op1
+        zero = op1 == 0xFF
+    elif operation in (0b0000_0100, 0b0000_0101): # SetC, ClrC
+        result_l = op1
+        carry = np.full(op1.shape, operation == 0b0000_0100)
+    elif operation == 0b0000_0110: # RL
+        result_l = (op1 << 1) | (op1 >> 7)
+        zero = op1 == 0
+    elif operation == 0b0000_0111: # RR
+        result_l = (op1 << 7) | (op1 >> 1)
+        zero = op1 == 0
+    elif operation == 0b0000_1000: # RLC
+        result_l = (op1 << 1) | cpu_carry
+        carry = op1 >> 7 == 1
+        zero = (result_l & 0xFF) == 0
+    elif operation == 0b0000_1001: # RRC
+        result_l = (cpu_carry << 7) | (op1 >> 1)
+        carry = op1 & 1 == 1
+        zero = result_l == 0
+    elif operation == 0b0000_1010: # Swap
+        result_l = (op1 << 4) | (op1 >> 4)
+        zero = op1 == 0
+
+    return ((result_l & 0xFF).astype(np.uint8), (result_h & 0xFF).astype(np.uint8), np.asarray(carry, bool),
+            np.asarray(zero, bool), np.asarray(sign, bool))
@@ -0,0 +1,251 @@
+"""Assembler of the CPUy instruction set
+
+Source is one statement per line, mnemonics as in the README table and
+cpuy_iss.isa.MNEMONICS (case insensitive), ';' starts a comment:
+
+            .equ  COUNT, 20
+            Jmp   main          ; Reset vector
+            .org  0x20          ; Timer 0 interruption vector
+            MovLW 135
+            Ret
+    main:   MovLW COUNT
+            MovWR0
+    loop:   Jmp   loop
+            .byte 127           ; Raw bytes, e.g. the test sentinel
+
+Instructions with operands take 1 or 2 of them and the count selects bit 0 of
+the opcode, instructions without operands (bit 7 clear) take none. Jumps and
+Call given a single address are emitted with 2 operands, low byte first, as
+their 1 operand form reuses the second operand of a previous instruction.
+
+Run as `python -m cpuy_iss.asm program.s -o program.hex` to write a $readmemh
+image, a .bin output is written as the raw ROM image.
+"""
+
+import argparse
+import re
+import sys
+
+from . import cache
+from .isa import ADDRESS_MASK, CALL, JUMPS, MNEMONICS, ROM_SIZE, rom_image
+
+# Part of the cache key, to be increased whenever the encoding of a source changes
+ASSEMBLER_VERSION = 1
+
+_ADDRESSING = JUMPS | {CALL, CALL + 1}
+
+# Lowercase mnemonic: opcode without operands or with 1 operand
+_OPCODES = {}
+for _op, _name in enumerate(MNEMONICS):
+    if _name is not None:
+        _OPCODES.setdefault(_name.lower(), _op)
+
+# Images assembled or loaded by this process, by cache key
+_memo = {}
+
+_LABEL = re.compile(r"^([A-Za-z_][\w.]*)\s*:\s*(.*)$")
+_SYMBOL = re.compile(r"^[A-Za-z_][\w.]*$")
+_TERM = re.compile(r"\s*([+-]?)\s*([^\s+-]+)")
+
+
+class AssemblerError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def _statements(source):
+    """Yields (line number, label, mnemonic or directive, operand texts)"""
+    for number, line in enumerate(source.splitlines(), 1):
+        line = line.split(";", 1)[0].strip()
+        label = None
+        match = _LABEL.match(line)
+        if match:
+            label, line = match.groups()
+        if not line:
+            if label:
+                yield number, label, None, []
+            continue
+        parts = line.split(None, 1)
+        operands = [operand.strip() for operand in parts[1].split(",")] if len(parts) > 1 else []
+        if any(not operand for operand in operands):
+            raise AssemblerError(number, f"empty operand in '{line}'")
+        yield number, label, parts[0].lower(), operands
+
+
+def _evaluate(number, text, symbols):
+    """Value of a sum of integer literals and symbols, e.g. 'table+2'"""
+    value = 0
+    position = 0
+    for match in _TERM.finditer(text):
+        sign, term = match.groups()
+        if match.start() != position or (position and not sign):
+            break
+        if _SYMBOL.match(term):
+            if term not in symbols:
+                raise AssemblerError(number, f"undefined symbol '{term}'")
+            term_value = symbols[term]
+        else:
+            try:
+                term_value = int(term, 0)
+            except ValueError:
+                raise AssemblerError(number, f"invalid operand '{text}'") from None
+        value += -term_value if sign == "-" else term_value
+        position = match.end()
+    if position != len(text) or not text:
+        raise AssemblerError(number, f"invalid operand '{text}'")
+    return value
+
+
+def _byte(number, text, symbols):
+    value = _evaluate(number, text, symbols)
+    if not 0 <= value <= 0xFF:
+        raise AssemblerError(number, f"operand '{text}' = {value} does not fit in a byte")
+    return value
+
+
+def _encode(number, mnemonic, operands, symbols):
+    """Bytes of one instruction, symbols may be None on the first pass to get its size only"""
+    if mnemonic not in _OPCODES:
+        raise AssemblerError(number, f"unknown mnemonic '{mnemonic}'")
+    op = _OPCODES[mnemonic]
+
+    if not op & 0x80:
+        if operands:
+            raise AssemblerError(number, f"{MNEMONICS[op]} takes no operands, got {len(operands)}")
+        return [op]
+
+    if not 1 <= len(operands) <= 2:
+        raise AssemblerError(number, f"{MNEMONICS[op]} takes 1 or 2 operands, got {len(operands)}")
+
+    if op in _ADDRESSING and len(operands) == 1:
+        if symbols is None:
+            return [op | 1, 0, 0]
+        address = _evaluate(number, operands[0], symbols)
+        if not 0 <= address <= ADDRESS_MASK:
+            raise AssemblerError(number, f"address '{operands[0]}' = {address} out of the ROM")
+        return [op | 1, address & 0xFF, address >> 8]
+
+    if symbols is None:
+        return [op] * (1 + len(operands))
+    return [op | (len(operands) - 1)] + [_byte(number, operand, symbols) for operand in operands]
+
+
+def _assemble(source):
+    statements = list(_statements(source))
+
+    # First pass: addresses of labels, every statement has a size independent of symbols
+    symbols = {}
+    address = 0
+    for number, label, mnemonic, operands in statements:
+        if label:
+            if label in symbols:
+                raise AssemblerError(number, f"symbol '{label}' redefined")
+            symbols[label] = address
+        if mnemonic == ".equ":
+            if len(operands) != 2 or not _SYMBOL.match(operands[0]):
+                raise AssemblerError(number, ".equ takes a name and a value")
+            if operands[0] in symbols:
+                raise AssemblerError(number, f"symbol '{operands[0]}' redefined")
+            symbols[operands[0]] = _evaluate(number, operands[1], symbols)
+        elif mnemonic == ".org":
+            if len(operands) != 1:
+                raise AssemblerError(number, ".org takes an address")
+            address = _evaluate(number, operands[0], symbols)
+        elif mnemonic == ".byte":
+            address += len(operands)
+        elif mnemonic is not None:
+            address += len(_encode(number, mnemonic, operands, None))
+
+    # Second pass: encoding
+    image = bytearray()
+    used = bytearray()
+    address = 0
+    for number, label, mnemonic, operands in statements:
+        if mnemonic is None or mnemonic == ".equ":
+            continue
+        if mnemonic == ".org":
+            address = _evaluate(number, operands[0], symbols)
+            if not 0 <= address < ROM_SIZE:
+                raise AssemblerError(number, f".org {address} out of the ROM")
+            continue
+
+        if mnemonic == ".byte":
+            data = [_byte(number, operand, symbols) for operand in operands]
+        else:
+            data = _encode(number, mnemonic, operands, symbols)
+        end = address + len(data)
+        if end > ROM_SIZE:
+            raise AssemblerError(number, f"code beyond the {ROM_SIZE} bytes ROM")
+        if end > len(image):
+            image.extend(bytes(end - len(image)))
+            used.extend(bytes(end - len(used)))
+        if any(used[address:end]):
+            raise AssemblerError(number, f"code overlaps at address {address:#05x}")
+        image[address:end] = bytes(data)
+        used[address:end] = b"\x01" * len(data)
+        address = end
+
+    return image
+
+
+def assemble(source, use_cache=True):
+    """Program bytes of an assembly source, from address 0 to the last byte emitted.
+
+    Images are cached by content in the cache of cpuy_iss.cache, so sources
+    already assembled by any previous run are just read back.
+    """
+    if not use_cache:
+        return _assemble(source)
+
+    key = cache.digest(str(ASSEMBLER_VERSION), source)
+    image = _memo.get(key)
+    if image is None:
+        image = cache.load("asm", key)
+        if image is None:
+            image = bytes(_assemble(source))
+            cache.store("asm", key, image)
+        _memo[key] = image
+    return bytearray(image)
+
+
+def to_hex(program):
+    """$readmemh text of the ROM image of program, one byte per line"""
+    return "".join(f"{byte:02x}\n" for byte in rom_image(program))
+
+
+def to_bin(program):
+    """Raw ROM image of program"""
+    return bytes(rom_image(program))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_iss.asm", description="CPUy assembler")
+    parser.add_argument("source", help="assembly source file, - for stdin")
+    parser.add_argument("-o", "--output", help=".hex for $readmemh, .bin for raw binary, stdout hex by default")
+    parser.add_argument("--no-cache", action="store_true", help="always assemble, ignoring the image cache")
+    args = parser.parse_args(argv)
+
+    if args.source == "-":
+        source = sys.stdin.read()
+    else:
+        with open(args.source) as stream:
+            source = stream.read()
+
+    try:
+        program = assemble(source, use_cache=not args.no_cache)
+    except AssemblerError as error:
+        parser.exit(1, f"{args.source}: {error}\n")
+
+    if args.output is None:
+        sys.stdout.write(to_hex(program))
+    elif args.output.endswith(".bin"):
+        with open(args.output, "wb") as stream:
+            stream.write(to_bin(program))
+    else:
+        with open(args.output, "w") as stream:
+            stream.write(to_hex(program))
+
+
+if __name__ == "__main__":
+    main()
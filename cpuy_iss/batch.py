@@ -0,0 +1,503 @@
+"""Batched execution of N CPUy machines in lockstep with NumPy
+
+Every lane follows the semantics of cpuy_iss.Cpu: one instruction per step,
+timers advanced over the clock edges of that instruction and interruptions
+checked with the configuration prior to it. Opcodes are grouped in the classes
+of the ucode.v case table and each class is applied to its lanes with masked
+updates; the ALU is a lookup table built from the alu.v mirror.
+
+NumPy is only needed by this module, cpuy_iss itself does not import it.
+"""
+
+import sys
+
+import numpy as np
+
+from .alu import OPERATIONS
+from .cpu import Cpu
+from .isa import (ADDRESS_MASK, CALL, CLRBW, CPU_CFG, CPU_CFG_EXT_IE, CPU_CFG_GIE, CPU_CFG_T0_IE, CPU_CFG_T1_IE,
+                  CYCLES, EI_INTERRUPTION, HALT_ADDRESS, HALT_BUDGET, HALT_FLAG_ADDRESS, HALT_FLAG_SELF_JUMP,
+                  HALT_FLAG_SENTINEL, HALT_SELF_JUMP, HALT_SENTINEL, INTERRUPTION_VECTORS, JMP, JMPC, JMPS, JMPZ,
+                  MOVLM, MOVLW, MOVMW, MOVPW, MOVRW, MOVWM, MOVWP, MOVWR, NO_INTERRUPTION, OPERAND_COUNT,
+                  PORTS_CFG, RAM_OPERAND, RAM_SIZE, REGISTERS, RET, ROM_SIZE, SENTINEL, SETBW, STACK_DEPTH,
+                  T0_INTERRUPTION, T1_INTERRUPTION, TBJC, TBJS, TMR_CFG, XCHWM, rom_image)
+
+# Opcode classes, one per EXECUTING behaviour of ucode.v
+(_NOP, _ALU, _ALU_OPERAND, _ALU_MULTIBYTE, _RET, _PORTS_CFG, _CPU_CFG, _TMR_CFG, _MOV_W_PORT, _MOV_PORT_W,
+ _MOV_W_REGISTER, _MOV_REGISTER_W, _MOV_OPERAND_W, _MOV_W_MEMORY, _MOV_LITERAL_MEMORY, _XCHWM, _JUMP,
+ _CALL) = range(18)
+_CLASSES = 18
+
+# Jump conditions
+_ALWAYS, _CARRY, _ZERO, _SIGN, _BIT_CLEAR, _BIT_SET = range(6)
+
+# ALU kinds of the 2 operands operations, Add has one kind per carry value
+_ADD, _ADD_CARRY, _SUB, _MUL, _AND, _OR, _XOR, _NONE = range(8)
+
+# Halt codes returned by BatchCpu.run, 0 is a lane still running
+RUNNING = 0
+HALT_REASONS = (None, HALT_SENTINEL, HALT_ADDRESS, HALT_SELF_JUMP, HALT_BUDGET)
+
+
+def _decode_tables():
+    op_class = np.full(256, _NOP, np.uint8)
+    condition = np.zeros(256, np.uint8)
+
+    for op in list(range(0x01, 0x0B)) + list(range(SETBW, CLRBW + 8)):
+        op_class[op] = _ALU
+    op_class[0x88:0xA0] = _ALU_OPERAND
+    op_class[0x90:0x94] = _ALU_MULTIBYTE # MulLW, MulMW
+
+    op_class[RET] = _RET
+    op_class[PORTS_CFG] = _PORTS_CFG
+    op_class[CPU_CFG] = _CPU_CFG
+    op_class[TMR_CFG] = _TMR_CFG
+
+    op_class[MOVWP:MOVWP + 2] = _MOV_W_PORT
+    op_class[MOVPW:MOVPW + 2] = _MOV_PORT_W
+    op_class[MOVWR:MOVWR + 8] = _MOV_W_REGISTER
+    op_class[MOVRW:MOVRW + 8] = _MOV_REGISTER_W
+
+    op_class[MOVMW:MOVMW + 2] = _MOV_OPERAND_W
+    op_class[MOVLW:MOVLW + 2] = _MOV_OPERAND_W
+    op_class[MOVWM:MOVWM + 2] = _MOV_W_MEMORY
+    op_class[MOVLM:MOVLM + 2] = _MOV_LITERAL_MEMORY
+    op_class[XCHWM:XCHWM + 2] = _XCHWM
+    op_class[CALL:CALL + 2] = _CALL
+
+    for op, jump_condition in ((JMP, _ALWAYS), (JMPC, _CARRY), (JMPZ, _ZERO), (JMPS, _SIGN)):
+        op_class[op:op + 2] = _JUMP
+        condition[op:op + 2] = jump_condition
+    op_class[TBJC:] = _JUMP
+    condition[TBJC:TBJS] = _BIT_CLEAR
+    condition[TBJS:] = _BIT_SET
+
+    return op_class, condition
+
+
+def _alu_tables():
+    # Single operand operations ignore op2: [result_l | flags, operation, carry, op1]
+    unary = np.zeros((2, 0x80, 2, 256), np.uint8)
+    for op in range(0x80):
+        operation = OPERATIONS[op]
+        for carry in range(2):
+            for op1 in range(256):
+                result_l, _, flags = operation(op1, 0, carry)
+                unary[0, op, carry, op1] = result_l
+                unary[1, op, carry, op1] = flags
+
+    # 2 operands operations: [result_l | result_h | flags, kind, op1, op2]
+    op1 = np.arange(256, dtype=np.int32)[:, None]
+    op2 = np.arange(256, dtype=np.int32)[None, :]
+    binary = np.zeros((3, 8, 256, 256), np.uint8)
+
+    for kind, carry in ((_ADD, 0), (_ADD_CARRY, 1)):
+        total = op1 + op2 + carry
+        binary[0, kind] = total & 0xFF
+        binary[2, kind] = total > 255
+    binary[0, _SUB] = np.abs(op1 - op2)
+    binary[2, _SUB] = (op1 == op2) * 0b010 | (op1 < op2) * 0b100
+    product = op1 * op2
+    binary[0, _MUL] = product & 0xFF
+    binary[1, _MUL] = product >> 8
+    binary[2, _MUL] = ((op1 == 0) | (op2 == 0)) * 0b010
+    for kind, result in ((_AND, op1 & op2), (_OR, op1 | op2), (_XOR, op1 ^ op2)):
+        binary[0, kind] = result
+        binary[2, kind] = (result == 0) * 0b010
+
+    # Decoded from operation[6:1] like alu.v
+    kinds = np.full(256, _NONE, np.uint8)
+    for op in range(0x88, 0xA0):
+        kinds[op] = (_ADD, _SUB, _MUL, _AND, _OR, _XOR)[(op - 0x88) >> 2]
+
+    return unary, binary, kinds
+
+
+_OP_CLASS, _CONDITION = _decode_tables()
+_UNARY, _BINARY, _BINARY_KIND = _alu_tables()
+_OPERAND_COUNT = np.frombuffer(OPERAND_COUNT, np.uint8).astype(np.int32)
+_CYCLES = np.frombuffer(CYCLES, np.uint8).astype(np.int32)
+_RAM_OPERAND = np.frombuffer(RAM_OPERAND, np.uint8).astype(bool)
+_VECTORS = np.array([0] + list(INTERRUPTION_VECTORS[1:]), np.int32)
+
+
+def halt_flags(roms, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True):
+    """cpuy_iss.isa.halt_flags of every row of a (N, ROM_SIZE) array of ROM images"""
+    flags = np.zeros(roms.shape, np.uint8)
+    if sentinel is not None:
+        flags[roms == sentinel] |= HALT_FLAG_SENTINEL
+    for address in halt_at:
+        flags[:, address & ADDRESS_MASK] |= HALT_FLAG_ADDRESS
+    if halt_on_self_jump:
+        addresses = np.arange(ROM_SIZE)
+        target = (roms[:, (addresses + 1) & ADDRESS_MASK].astype(np.int32) |
+                  (roms[:, (addresses + 2) & ADDRESS_MASK].astype(np.int32) << 8)) & ADDRESS_MASK
+        flags[(roms == JMP + 1) & (target == addresses)] |= HALT_FLAG_SELF_JUMP
+    return flags
+
+
+class BatchCpu:
+    """N CPUy machines, lane i holds the state of one cpuy_iss.Cpu.
+
+    Scalar registers are (N,) int32 arrays, registers are (N, 8), ram (N, 256)
+    and the stack (N, 16). Timer state is kept as (2, N) arrays, row 0 for timer 0.
+    Inputs ext_int, p0in and p1in are (N,) arrays sampled when an instruction
+    executes, they may be changed between steps.
+    """
+
+    def __init__(self, programs):
+        if isinstance(programs, np.ndarray):
+            roms = np.zeros((len(programs), ROM_SIZE), np.uint8)
+            roms[:, :programs.shape[1]] = programs
+        else:
+            roms = np.array([np.frombuffer(rom_image(program), np.uint8) for program in programs], np.uint8)
+
+        n = len(roms)
+        self.n = n
+        self.rom = roms
+        self.registers = np.zeros((n, REGISTERS), np.uint8)
+        self.ram = np.zeros((n, RAM_SIZE), np.uint8)
+        self.stack = np.zeros((n, STACK_DEPTH), np.int32)
+        self.ext_int = np.zeros(n, np.int32)
+        self.p0in = np.zeros(n, np.int32)
+        self.p1in = np.zeros(n, np.int32)
+
+        self.counter = np.zeros((2, n), np.int32)
+        self.org_count = np.zeros((2, n), np.int32)
+        self.direction = np.zeros((2, n), bool)
+        self.auto_reload = np.zeros((2, n), bool)
+        self.overflow = np.zeros((2, n), bool)
+        self.run_timer = np.zeros((2, n), bool)
+        self.reset()
+
+    def reset(self):
+        """State of every lane at the first FETCHING_OPCODE after rst, registers and RAM are kept"""
+        n = self.n
+        self.pc = np.zeros(n, np.int32)
+        self.w = np.zeros(n, np.int32)
+        self.w_swap = np.zeros(n, np.int32)
+        self.flags = np.zeros(n, np.int32)
+        self.cpu_cfg = np.zeros(n, np.int32)
+        self.tmr_cfg = np.zeros(n, np.int32)
+        self.ports = np.zeros((n, 2), np.int32)
+        self.ports_cfg = np.zeros((n, 2), np.int32)
+        self.op_code = np.zeros(n, np.int32)
+        self.operands = np.zeros((2, n), np.int32)
+        self.interrupt_source = np.zeros(n, np.int32)
+        self.stack_ptr = np.zeros(n, np.int32)
+        self.stack_out = np.zeros(n, np.int32)
+        # done_ack is high while resetting
+        self.overflow[:] = False
+        self.set_timers = np.zeros((2, n), bool)
+        self.cycles = np.zeros(n, np.int64)
+        self.instructions = np.zeros(n, np.int64)
+
+    def cpu(self, lane):
+        """cpuy_iss.Cpu holding a copy of the state of the given lane"""
+        cpu = Cpu(self.rom[lane].tobytes())
+        for name in ("pc", "w", "w_swap", "flags", "cpu_cfg", "tmr_cfg", "op_code", "interrupt_source",
+                     "ext_int", "p0in", "p1in", "cycles", "instructions"):
+            setattr(cpu, name, int(getattr(self, name)[lane]))
+        cpu.registers = bytearray(self.registers[lane].tobytes())
+        cpu.ram = bytearray(self.ram[lane].tobytes())
+        cpu.ports = bytearray(self.ports[lane].astype(np.uint8).tobytes())
+        cpu.ports_cfg = bytearray(self.ports_cfg[lane].astype(np.uint8).tobytes())
+        cpu.operands = bytearray(self.operands[:, lane].astype(np.uint8).tobytes())
+        cpu.stack.mem = [int(word) for word in self.stack[lane]]
+        cpu.stack.ptr = int(self.stack_ptr[lane])
+        cpu.stack.data_out = int(self.stack_out[lane])
+        cpu.set_t0 = int(self.set_timers[0, lane])
+        cpu.set_t1 = int(self.set_timers[1, lane])
+        for k, timer in enumerate((cpu.tmr0, cpu.tmr1)):
+            timer.counter = int(self.counter[k, lane])
+            timer.org_count = int(self.org_count[k, lane])
+            timer.direction = int(self.direction[k, lane])
+            timer.auto_reload = int(self.auto_reload[k, lane])
+            timer.overflow = int(self.overflow[k, lane])
+            timer.run = int(self.run_timer[k, lane])
+        return cpu
+
+    def _advance_timers(self, lanes, edges):
+        """Closed form Timer.advance of the enabled timers of the given lanes.
+
+        edges broadcasts to (2, len(lanes)), one row per timer. Returns the
+        overflow of both timers as it was before the last of the edges, which
+        is what the CPU samples as done before the EXECUTING edge.
+        """
+        edges = np.broadcast_to(edges, (2, len(lanes)))
+        tmr_cfg = self.tmr_cfg[lanes]
+        sampled = self.overflow[:, lanes]
+        for k in range(2):
+            active = (((tmr_cfg >> (4 * k)) & 1) != 0) & self.run_timer[k, lanes] & (edges[k] > 0)
+            if not active.any():
+                continue
+            chosen = lanes[active]
+            edges_k = edges[k, active]
+
+            counter = self.counter[k, chosen]
+            up = self.direction[k, chosen]
+            auto_reload = self.auto_reload[k, chosen]
+            org_count = self.org_count[k, chosen]
+
+            # Edges before the counter reads zero, the following edge raises overflow
+            to_zero = np.where(up, (-counter) & 0xFFFF, counter)
+            overflow = edges_k > to_zero
+            counting = np.where(up, (counter + edges_k) & 0xFFFF, counter - edges_k)
+            period = np.where(up, (-org_count) & 0xFFFF, org_count) + 1
+            remaining = (edges_k - to_zero - 1) % period
+            reloaded = np.where(up, (org_count + remaining) & 0xFFFF, org_count - remaining)
+            stopped = np.where(up, 0x0001, 0xFFFF)
+
+            self.counter[k, chosen] = np.where(overflow, np.where(auto_reload, reloaded, stopped), counting)
+            self.overflow[k, chosen] |= overflow
+            self.run_timer[k, chosen] &= ~(overflow & ~auto_reload)
+            sampled[k, active] |= edges_k - 1 > to_zero
+        return sampled
+
+    def _load_timers(self, lanes):
+        """Loads the enabled timers with set high, returns the (2, len(lanes)) mask of the loaded ones"""
+        tmr_cfg = self.tmr_cfg[lanes]
+        load = self.set_timers[:, lanes] & (((tmr_cfg >> np.array([[0], [4]])) & 1) != 0)
+        for k in range(2):
+            loaded = lanes[load[k]]
+            if not len(loaded):
+                continue
+            registers = self.registers[loaded].astype(np.int32)
+            cfg = tmr_cfg[load[k]] >> (4 * k)
+            count = (registers[:, 2 * k + 1] << 8) | registers[:, 2 * k]
+            self.counter[k, loaded] = count
+            self.org_count[k, loaded] = count
+            self.direction[k, loaded] = (cfg & 0b010) != 0
+            self.auto_reload[k, loaded] = (cfg & 0b100) != 0
+            self.overflow[k, loaded] = False
+            self.run_timer[k, loaded] = True
+        return load
+
+    def _push(self, lanes, values):
+        room = self.stack_ptr[lanes] != STACK_DEPTH - 1
+        lanes = lanes[room]
+        self.stack[lanes, self.stack_ptr[lanes]] = values[room]
+        self.stack_ptr[lanes] += 1
+
+    def step(self, lanes=None):
+        """Executes one instruction on the given lanes, all of them by default"""
+        if lanes is None:
+            # Views instead of gathers when every lane steps
+            lanes = np.arange(self.n)
+            index = slice(None)
+        else:
+            index = lanes
+
+        # FETCHING_OPCODE and FETCHING_OPERANDS, from the flattened ROM images
+        pc = self.pc[index]
+        rom = self.rom.reshape(-1)
+        base = lanes * ROM_SIZE
+        op = rom.take(base + pc)
+        self.op_code[index] = op
+        count = _OPERAND_COUNT[op]
+        first = rom.take(base + ((pc + 1) & ADDRESS_MASK))
+        second = rom.take(base + ((pc + 2) & ADDRESS_MASK))
+
+        operands = self.operands[:, index]
+        ram_operand = self.ram.reshape(-1).take(lanes * RAM_SIZE + first)
+        operands[0] = np.where(count > 0, np.where(_RAM_OPERAND[op], ram_operand, first), operands[0])
+        operands[1] = np.where(count == 2, second, operands[1])
+        self.operands[:, index] = operands
+        self.pc[index] = (pc + 1 + count) & ADDRESS_MASK
+
+        # Lanes grouped by opcode class, classes[c] indexes the lanes of class c
+        op_class = _OP_CLASS[op]
+        order = np.argsort(op_class, kind="stable")
+        bounds = np.cumsum(np.bincount(op_class, minlength=_CLASSES))
+        classes = [order[start:end] for start, end in zip(np.concatenate(([0], bounds[:-1])), bounds)]
+
+        exchange = lanes[classes[_XCHWM]]
+        self.w_swap[exchange] = self.w[exchange]
+
+        # Lanes that may be interrupted, checked with the configuration prior to this instruction
+        cpu_cfg = self.cpu_cfg[index]
+        candidates = np.flatnonzero(cpu_cfg & CPU_CFG_GIE)
+        candidates = candidates[self.interrupt_source[lanes[candidates]] == NO_INTERRUPTION]
+        cpu_cfg = cpu_cfg[candidates]
+        done = self.overflow[:, lanes[candidates]]
+
+        # Timers see every clock edge, done is sampled before the EXECUTING edge. A timer
+        # loaded by the fetch edge counts the remaining edges of the instruction
+        cycles = _CYCLES[op]
+        timers = np.flatnonzero(self.tmr_cfg[index] & 0x11)
+        if len(timers):
+            timer_lanes = lanes[timers]
+            loaded = self._load_timers(timer_lanes)
+            self.set_timers[:, timer_lanes] = False
+            sampled = self._advance_timers(timer_lanes, cycles[timers] - loaded)
+            if len(candidates):
+                position = np.searchsorted(timers, candidates)
+                with_timers = timers[np.minimum(position, len(timers) - 1)] == candidates
+                done[:, with_timers] = sampled[:, position[with_timers]]
+
+        # POPPING_STACK
+        popping = lanes[classes[_RET]]
+        popping = popping[self.stack_ptr[popping] != 0]
+        self.stack_ptr[popping] -= 1
+        self.stack_out[popping] = self.stack[popping, self.stack_ptr[popping]]
+
+        # EXECUTING
+        self._execute(lanes, op, operands, classes)
+        self.cycles[index] += cycles
+        self.instructions[index] += 1
+
+        if len(candidates):
+            external = ((cpu_cfg & CPU_CFG_EXT_IE) != 0) & (self.ext_int[lanes[candidates]] != 0)
+            timer0 = ((cpu_cfg & CPU_CFG_T0_IE) != 0) & done[0]
+            timer1 = ((cpu_cfg & CPU_CFG_T1_IE) != 0) & done[1]
+            source = np.select([external, timer0, timer1], [EI_INTERRUPTION, T0_INTERRUPTION, T1_INTERRUPTION],
+                               NO_INTERRUPTION)
+            interrupted = source != NO_INTERRUPTION
+            if interrupted.any():
+                self._interrupt(lanes[candidates[interrupted]], source[interrupted])
+
+    def _interrupt(self, lanes, source):
+        # INTERRUPT_REDIRECTION: pushes the next PC and acknowledges the timer
+        self.interrupt_source[lanes] = source
+        self._push(lanes, self.pc[lanes])
+        self.overflow[0, lanes[source == T0_INTERRUPTION]] = False
+        self.overflow[1, lanes[source == T1_INTERRUPTION]] = False
+        timer_lanes = lanes[(self.tmr_cfg[lanes] & 0x11) != 0]
+        if len(timer_lanes):
+            self._advance_timers(timer_lanes, 1 - self._load_timers(timer_lanes))
+        self.pc[lanes] = _VECTORS[source]
+        self.cycles[lanes] += 1
+
+    def _execute(self, lanes, op, operands, classes):
+        # Reads see the state prior to the EXECUTING edge, every class writes its own lanes
+        selected = classes[_ALU]
+        if len(selected):
+            chosen = lanes[selected]
+            flags = self.flags[chosen]
+            index = op[selected], flags & 1, self.w[chosen]
+            self.w[chosen] = _UNARY[0][index]
+            self.flags[chosen] = (flags & 0xF8) | _UNARY[1][index]
+
+        for alu_class in (_ALU_OPERAND, _ALU_MULTIBYTE):
+            selected = classes[alu_class]
+            if not len(selected):
+                continue
+            chosen = lanes[selected]
+            flags = self.flags[chosen]
+            kind = _BINARY_KIND[op[selected]]
+            index = kind + ((kind == _ADD) & ((flags & 1) != 0)), self.w[chosen], operands[0, selected]
+            self.w[chosen] = _BINARY[0][index]
+            self.flags[chosen] = (flags & 0xF8) | _BINARY[2][index]
+            if alu_class == _ALU_MULTIBYTE:
+                self.ram[chosen, operands[1, selected]] = _BINARY[1][index]
+
+        chosen = lanes[classes[_RET]]
+        self.pc[chosen] = self.stack_out[chosen]
+        self.interrupt_source[chosen] = NO_INTERRUPTION
+
+        chosen = lanes[classes[_PORTS_CFG]]
+        self.ports_cfg[chosen, 0] = self.registers[chosen, 0]
+        self.ports_cfg[chosen, 1] = self.registers[chosen, 1] & 0x0F
+
+        chosen = lanes[classes[_CPU_CFG]]
+        self.cpu_cfg[chosen] = self.w[chosen]
+
+        chosen = lanes[classes[_TMR_CFG]]
+        w = self.w[chosen]
+        self.tmr_cfg[chosen] = w
+        self.set_timers[0, chosen] = (w & 0x01) != 0
+        self.set_timers[1, chosen] = (w & 0x10) != 0
+
+        selected = classes[_MOV_W_PORT]
+        chosen = lanes[selected]
+        self.ports[chosen, op[selected] & 1] = self.w[chosen]
+
+        selected = classes[_MOV_PORT_W]
+        if len(selected):
+            chosen = lanes[selected]
+            ports = self.ports[chosen]
+            ports_cfg = self.ports_cfg[chosen]
+            p0 = (self.p0in[chosen] & ports_cfg[:, 0]) | (ports[:, 0] & ~ports_cfg[:, 0] & 0xFF)
+            p1 = (self.p1in[chosen] & 0x0F & ports_cfg[:, 1]) | (ports[:, 1] & 0x0F & ~ports_cfg[:, 1])
+            self.w[chosen] = np.where((op[selected] & 1) != 0, p1, p0)
+
+        selected = classes[_MOV_W_REGISTER]
+        chosen = lanes[selected]
+        self.registers[chosen, op[selected] & 7] = self.w[chosen]
+
+        selected = classes[_MOV_REGISTER_W]
+        chosen = lanes[selected]
+        self.w[chosen] = self.registers[chosen, op[selected] & 7]
+
+        selected = classes[_MOV_OPERAND_W] # MovLW, and MovMW as the RAM was read while fetching operands
+        self.w[lanes[selected]] = operands[0, selected]
+
+        selected = classes[_MOV_W_MEMORY]
+        chosen = lanes[selected]
+        self.ram[chosen, operands[0, selected]] = self.w[chosen]
+
+        selected = classes[_MOV_LITERAL_MEMORY]
+        self.ram[lanes[selected], operands[0, selected]] = operands[1, selected]
+
+        selected = classes[_XCHWM]
+        if len(selected):
+            chosen = lanes[selected]
+            address = operands[0, selected]
+            self.w[chosen] = self.ram[chosen, address]
+            self.ram[chosen, address] = self.w_swap[chosen]
+
+        selected = classes[_JUMP]
+        if len(selected):
+            chosen = lanes[selected]
+            condition = _CONDITION[op[selected]]
+            flags = self.flags[chosen]
+            bit = (self.w[chosen] >> ((op[selected] >> 1) & 7)) & 1
+            taken = np.select(
+                [condition == _ALWAYS, condition == _CARRY, condition == _ZERO, condition == _SIGN,
+                 condition == _BIT_CLEAR],
+                [True, (flags & 0b001) != 0, (flags & 0b010) != 0, (flags & 0b100) != 0, bit == 0],
+                bit == 1)
+            selected = selected[taken]
+            self.pc[chosen[taken]] = ((operands[1, selected] << 8) | operands[0, selected]) & ADDRESS_MASK
+
+        selected = classes[_CALL]
+        if len(selected):
+            chosen = lanes[selected]
+            self._push(chosen, self.pc[chosen])
+            self.pc[chosen] = ((operands[1, selected] << 8) | operands[0, selected]) & ADDRESS_MASK
+
+    def run(self, max_cycles=None, max_instructions=None, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True):
+        """Steps every lane until it meets a halt condition of Cpu.run.
+
+        Returns an (N,) array of halt codes, HALT_REASONS maps them to the HALT_* reasons.
+        Both budgets apply to each lane.
+        """
+        flags = halt_flags(self.rom, sentinel, halt_at, halt_on_self_jump)
+        cycles_limit = sys.maxsize if max_cycles is None else self.cycles + max_cycles
+        remaining = sys.maxsize if max_instructions is None else max_instructions
+        halted = np.zeros(self.n, np.int8)
+        lanes = np.arange(self.n)
+
+        while len(lanes):
+            pc = self.pc[lanes]
+            flag = flags[lanes, pc]
+            if remaining <= 0:
+                budget = np.ones(len(lanes), bool)
+            else:
+                budget = self.cycles[lanes] >= (cycles_limit if np.isscalar(cycles_limit) else cycles_limit[lanes])
+            halted[lanes] = np.select([(flag & HALT_FLAG_SENTINEL) != 0, (flag & HALT_FLAG_ADDRESS) != 0, budget],
+                                      [1, 2, 4], RUNNING)
+
+            running = halted[lanes] == RUNNING
+            lanes, pc, flag = lanes[running], pc[running], flag[running]
+            if not len(lanes):
+                break
+
+            self.step(lanes)
+            remaining -= 1
+
+            self_jump = ((flag & HALT_FLAG_SELF_JUMP) != 0) & (self.pc[lanes] == pc)
+            halted[lanes[self_jump]] = 3
+            lanes = lanes[~self_jump]
+
+        return halted
@@ -0,0 +1,247 @@
+"""Basic block translation of the instruction set simulator
+
+CPUy executes from a read-only ROM, so the straight-line runs of instructions
+between branches are fixed for the lifetime of a program. BlockCpu decodes
+each run once, from its first address up to and including a Jmp, JmpC, JmpZ,
+JmpS, TbXjc, TbXjs, Call or Ret, or a CpuCfg or TmrCfg that changes what the
+next instructions may be interrupted by, into the source of a Python function
+with W, the flags and the operands in locals. Functions are cached by start
+address, and dispatch goes back to Cpu.step only at the points an
+interruption may be taken:
+
+- a block runs as a whole while no interruption can be taken before its end:
+  interruptions disabled, in an interruption routine, or the next overflow of
+  an enabled timer beyond its cycles with ext_int low
+- timers advance over the cycles of the block in closed form, the
+  instructions of a block never read them
+- addresses holding a halt flag of run() are always stepped, and budgets step
+  the instructions they may stop in
+
+so cycles, instructions and the architectural state are those of Cpu.
+"""
+
+import sys
+
+from .alu import OPERATIONS
+from .cpu import (_EXECUTE, Cpu, _alu, _alu_multibyte, _exchange_w_memory, _mov_literal_memory, _mov_operand_w,
+                  _mov_register_w, _mov_w_memory, _mov_w_register, _nop)
+from .isa import (ADDRESS_MASK, CALL, CPU_CFG, CPU_CFG_EXT_IE, CPU_CFG_GIE, CPU_CFG_T0_IE, CPU_CFG_T1_IE, CYCLES,
+                  HALT_ADDRESS, HALT_BUDGET, HALT_FLAG_ADDRESS, HALT_FLAG_SELF_JUMP, HALT_FLAG_SENTINEL,
+                  HALT_SELF_JUMP, HALT_SENTINEL, JMP, NO_INTERRUPTION, OPERAND_COUNT, RAM_OPERAND, RET, ROM_SIZE,
+                  SENTINEL, TBJC, TMR_CFG, XCHWM, halt_flags)
+
+# Instructions a block holds at most
+MAX_BLOCK = 64
+
+# Programs whose blocks are kept, the cache is cleared when it holds more
+MAX_PROGRAMS = 256
+
+# Last instruction of a block: branches, and configuration changing the interruptions of the next ones
+EXITS = bytes(JMP <= op <= CALL + 1 or op >= TBJC or op in (RET, CPU_CFG, TMR_CFG) for op in range(256))
+
+# Inlined EXECUTING states, o0 and o1 the expressions of the operands registers
+_INLINE = {
+    _nop: None,
+    _alu: "w, _, result = alu_{op:02x}(w, {o0}, flags & 1); flags = (flags & 0xF8) | result",
+    _alu_multibyte: "w, ram[{o1}], result = alu_{op:02x}(w, {o0}, flags & 1); flags = (flags & 0xF8) | result",
+    _mov_operand_w: "w = {o0}",
+    _mov_w_memory: "ram[{o0}] = w",
+    _mov_literal_memory: "ram[{o0}] = {o1}",
+    _exchange_w_memory: "w = ram[{o0}]; ram[{o0}] = cpu.w_swap",
+    _mov_w_register: "registers[{register}] = w",
+    _mov_register_w: "w = registers[{register}]",
+}
+
+
+class Block:
+    """Translated run of instructions: its function, clock cycles and instruction count"""
+
+    __slots__ = ("address", "run", "cycles", "instructions", "source")
+
+    def __init__(self, address, run, cycles, instructions, source):
+        self.address = address
+        self.run = run
+        self.cycles = cycles
+        self.instructions = instructions
+        self.source = source
+
+
+def decode_block(rom, address, flags=None, max_instructions=MAX_BLOCK):
+    """(address, op, operand bytes) of the instructions of the block at address, empty when its first
+    address holds a halt flag"""
+    instructions = []
+    pc = address
+    while len(instructions) < max_instructions:
+        if flags is not None and flags[pc]:
+            break
+        op = rom[pc]
+        operands = [rom[(pc + 1 + index) & ADDRESS_MASK] for index in range(OPERAND_COUNT[op])]
+        instructions.append((pc, op, operands))
+        pc = (pc + 1 + len(operands)) & ADDRESS_MASK
+        if EXITS[op]:
+            break
+    return instructions
+
+
+def _source(address, instructions):
+    """Source of the function running instructions, timers and interruption checks left to the caller"""
+    lines = [f"def block_{address:03x}(cpu):",
+             "    ram = cpu.ram",
+             "    registers = cpu.registers",
+             "    operands = cpu.operands",
+             "    w = cpu.w",
+             "    flags = cpu.flags",
+             "    o0 = operands[0]",
+             "    o1 = operands[1]"]
+    emit = lines.append
+    o0, o1 = "o0", "o1" # Expressions of the operands registers
+    temporary = 0
+
+    def spill():
+        emit(f"    cpu.w = w; cpu.flags = flags; operands[0] = {o0}; operands[1] = {o1}")
+
+    for index, (pc, op, operand_bytes) in enumerate(instructions):
+        next_pc = (pc + 1 + len(operand_bytes)) & ADDRESS_MASK
+        emit(f"    # {pc:#05x}: {op:#04x} {' '.join(f'{byte:#04x}' for byte in operand_bytes)}")
+
+        # FETCHING_OPERANDS
+        if operand_bytes:
+            if RAM_OPERAND[op]:
+                temporary += 1
+                emit(f"    r{temporary} = ram[{operand_bytes[0]}]")
+                o0 = f"r{temporary}"
+            else:
+                o0 = str(operand_bytes[0])
+            if len(operand_bytes) == 2:
+                o1 = str(operand_bytes[1])
+        if op | 1 == XCHWM | 1:
+            emit("    cpu.w_swap = w")
+
+        # EXECUTING
+        if index == len(instructions) - 1 and EXITS[op]:
+            spill()
+            emit(f"    cpu.pc = {next_pc}")
+            emit(f"    cpu.op_code = {op}")
+            if op == RET:
+                emit("    cpu.stack.pop()")
+            emit(f"    execute[{op}](cpu, {op})")
+            return "\n".join(lines) + "\n"
+        execute = _EXECUTE[op]
+        if execute in _INLINE:
+            if _INLINE[execute] is not None:
+                emit("    " + _INLINE[execute].format(op=op, o0=o0, o1=o1, register=op & 7))
+        else: # Ports and configuration, rare enough for the interpreter
+            spill()
+            emit(f"    execute[{op}](cpu, {op})")
+            emit("    w = cpu.w; flags = cpu.flags")
+
+    # Ended by its length or a halt flag
+    spill()
+    emit(f"    cpu.pc = {next_pc}")
+    emit(f"    cpu.op_code = {op}")
+    return "\n".join(lines) + "\n"
+
+
+def translate(rom, address, flags=None):
+    """Block of the instructions at address, None when its first address holds a halt flag"""
+    instructions = decode_block(rom, address, flags)
+    if not instructions:
+        return None
+    source = _source(address, instructions)
+    namespace = {"execute": _EXECUTE}
+    namespace.update((f"alu_{op:02x}", OPERATIONS[op]) for _, op, _ in instructions if OPERATIONS[op] is not None)
+    exec(compile(source, f"<block {address:#05x}>", "exec"), namespace)
+    return Block(address, namespace[f"block_{address:03x}"], sum(CYCLES[op] for _, op, _ in instructions),
+                 len(instructions), source)
+
+
+_translations = {}
+
+
+def program_blocks(rom, flags):
+    """Block table, by start address, shared by the runs of a ROM image with the same halt flags"""
+    key = (bytes(rom), bytes(flags))
+    blocks = _translations.get(key)
+    if blocks is None:
+        if len(_translations) >= MAX_PROGRAMS:
+            _translations.clear()
+        blocks = _translations[key] = [None] * ROM_SIZE
+    return blocks
+
+
+class BlockCpu(Cpu):
+    """Cpu running translated basic blocks in run(), step() still executes one instruction.
+
+    Blocks are translated on first use and shared by every BlockCpu running
+    the same ROM image with the same halt flags. A stimulus given to run()
+    changes the inputs between any two instructions, so it runs on the
+    interpreter.
+    """
+    __slots__ = ("blocks",)
+
+    def __init__(self, program=b""):
+        super().__init__(program)
+        self.blocks = None
+
+    def _quiet(self, cycles):
+        """True when no interruption can be taken in the next cycles clock cycles"""
+        if self.set_t0 or self.set_t1:
+            return False # The first edge loads a timer, left to step()
+        cpu_cfg = self.cpu_cfg
+        if not cpu_cfg & CPU_CFG_GIE or self.interrupt_source != NO_INTERRUPTION:
+            return True
+        if cpu_cfg & CPU_CFG_EXT_IE and self.ext_int:
+            return False
+        tmr_cfg = self.tmr_cfg
+        for timer, enable, interruption in ((self.tmr0, 0x01, CPU_CFG_T0_IE), (self.tmr1, 0x10, CPU_CFG_T1_IE)):
+            if cpu_cfg & interruption:
+                if timer.overflow:
+                    return False
+                if tmr_cfg & enable and timer.run and timer.edges_to_overflow() <= cycles:
+                    return False
+        return True
+
+    def run(self, max_cycles=None, max_instructions=None, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True,
+            stimulus=None):
+        if stimulus is not None:
+            return super().run(max_cycles, max_instructions, sentinel, halt_at, halt_on_self_jump, stimulus)
+
+        rom = self.rom
+        flags = halt_flags(rom, sentinel, halt_at, halt_on_self_jump)
+        blocks = self.blocks = program_blocks(rom, flags)
+        cycles_limit = sys.maxsize if max_cycles is None else self.cycles + max_cycles
+        remaining = sys.maxsize if max_instructions is None else max_instructions
+        step = self.step
+        quiet = self._quiet
+
+        while True:
+            pc = self.pc
+            flag = flags[pc]
+            if flag & HALT_FLAG_SENTINEL:
+                return HALT_SENTINEL
+            if flag & HALT_FLAG_ADDRESS:
+                return HALT_ADDRESS
+            if remaining <= 0 or self.cycles >= cycles_limit:
+                return HALT_BUDGET
+
+            block = blocks[pc]
+            if block is None and not flag:
+                block = blocks[pc] = translate(rom, pc, flags)
+            if (block is not None and block.instructions <= remaining and
+                    self.cycles + block.cycles <= cycles_limit and quiet(block.cycles)):
+                tmr_cfg = self.tmr_cfg
+                if tmr_cfg & 0x01:
+                    self.tmr0.advance(block.cycles)
+                if tmr_cfg & 0x10:
+                    self.tmr1.advance(block.cycles)
+                block.run(self)
+                self.cycles += block.cycles
+                self.instructions += block.instructions
+                remaining -= block.instructions
+                continue
+
+            step()
+            remaining -= 1
+
+            if flag & HALT_FLAG_SELF_JUMP and self.pc == pc:
+                return HALT_SELF_JUMP
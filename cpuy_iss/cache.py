@@ -0,0 +1,54 @@
+"""Content-addressed on-disk cache shared by the cpuy tools
+
+Entries live in $CPUY_CACHE (~/.cache/cpuy by default) under a directory per
+kind of artifact and are named after the SHA-256 of everything they depend on,
+so a stale entry is never looked up again instead of having to be invalidated.
+"""
+
+import hashlib
+import os
+import tempfile
+
+
+def root():
+    return os.environ.get("CPUY_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "cpuy")
+
+
+def digest(*parts):
+    """SHA-256 hex digest of the given str or bytes parts"""
+    sha = hashlib.sha256()
+    for part in parts:
+        data = part.encode() if isinstance(part, str) else bytes(part)
+        # Length prefixed so ("ab", "c") and ("a", "bc") differ
+        sha.update(len(data).to_bytes(8, "little"))
+        sha.update(data)
+    return sha.hexdigest()
+
+
+def path(kind, key):
+    return os.path.join(root(), kind, key[:2], key)
+
+
+def load(kind, key):
+    """Cached bytes for key, None on a miss"""
+    try:
+        with open(path(kind, key), "rb") as entry:
+            return entry.read()
+    except OSError:
+        return None
+
+
+def store(kind, key, data):
+    """Atomically writes an entry, concurrent writers of the same key are harmless"""
+    entry = path(kind, key)
+    directory = os.path.dirname(entry)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            stream.write(data)
+        os.replace(temporary, entry)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return entry
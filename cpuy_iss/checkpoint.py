@@ -0,0 +1,152 @@
+"""Architectural snapshots of cpuy, to replay a run from its last good state
+
+A Snapshot packs the state Cpu.step depends on, PC, W, flags, configuration,
+operands, registers, RAM, ports, the stack and both timers, into one bytes
+object, with the instructions and cycles run so far. record() takes them every
+N instructions of a Cpu run, cpuy_tb.checkpoint.CheckpointRecorder of an RTL
+run, and first_divergence() finds the first one the two runs disagree on, so
+only the instructions since the previous one need to be replayed:
+
+    cpu = Cpu(program)
+    rtl[0].restore(cpu) # State the RTL run started from
+    expected = rtl[:1] + record(cpu, [snapshot.instructions for snapshot in rtl[1:]])
+    index = first_divergence(rtl, expected)
+    cpu = Cpu(program)
+    expected[index - 1].restore(cpu) # Good state at the start of the interval
+
+Snapshots of a run are written to a file with write() and read back with
+read(), a 16 bytes header followed by fixed size entries, all little endian.
+"""
+
+import struct
+
+from .isa import RAM_SIZE, REGISTERS, STACK_DEPTH
+
+MAGIC = b"CPUYCKP\0"
+VERSION = 1
+HEADER = struct.Struct("<8sII") # Magic, version, entry size
+
+# Fields of a snapshot: (name, struct format), arrays are reported by element when they differ
+FIELDS = (("pc", "H"), ("w", "B"), ("w_swap", "B"), ("flags", "B"), ("cpu_cfg", "B"), ("tmr_cfg", "B"),
+          ("op_code", "B"), ("operands", "2s"), ("interrupt_source", "B"), ("set_t0", "B"), ("set_t1", "B"),
+          ("ports", "2s"), ("ports_cfg", "2s"), ("registers", f"{REGISTERS}s"), ("ram", f"{RAM_SIZE}s"),
+          ("stack_ptr", "B"), ("stack_out", "H"), ("stack", f"{STACK_DEPTH}H"),
+          ("tmr0", "HHBBBB"), ("tmr1", "HHBBBB"))
+STATE = struct.Struct("<" + "".join(fmt for _, fmt in FIELDS))
+ENTRY = struct.Struct("<QQ") # Instructions, cycles, followed by the state
+
+TIMER_FIELDS = ("counter", "org_count", "direction", "auto_reload", "overflow", "run")
+
+# Fields packed as several struct items
+_ITEMS = {"stack": STACK_DEPTH, "tmr0": len(TIMER_FIELDS), "tmr1": len(TIMER_FIELDS)}
+
+
+class Snapshot:
+    """State of a Cpu after instructions instructions and cycles clock cycles"""
+
+    __slots__ = ("instructions", "cycles", "data")
+
+    def __init__(self, instructions, cycles, data):
+        self.instructions = instructions
+        self.cycles = cycles
+        self.data = data
+
+    def __eq__(self, other):
+        return (self.instructions, self.cycles, self.data) == (other.instructions, other.cycles, other.data)
+
+    def __repr__(self):
+        return f"Snapshot({self.instructions} instructions, {self.cycles} cycles)"
+
+    def fields(self):
+        """{name: value} of every field, arrays as sequences"""
+        values = iter(STATE.unpack(self.data))
+        fields = {}
+        for name, _ in FIELDS:
+            count = _ITEMS.get(name)
+            fields[name] = next(values) if count is None else tuple(next(values) for _ in range(count))
+        return fields
+
+    def restore(self, cpu):
+        """Writes the state into cpu, its ROM and inputs unchanged"""
+        fields = self.fields()
+        for name in ("pc", "w", "w_swap", "flags", "cpu_cfg", "tmr_cfg", "op_code", "interrupt_source", "set_t0",
+                     "set_t1"):
+            setattr(cpu, name, fields[name])
+        for name in ("operands", "ports", "ports_cfg", "registers", "ram"):
+            getattr(cpu, name)[:] = fields[name]
+        cpu.stack.ptr = fields["stack_ptr"]
+        cpu.stack.data_out = fields["stack_out"]
+        cpu.stack.mem[:] = fields["stack"]
+        for timer, values in ((cpu.tmr0, fields["tmr0"]), (cpu.tmr1, fields["tmr1"])):
+            for name, value in zip(TIMER_FIELDS, values):
+                setattr(timer, name, value)
+        cpu.instructions = self.instructions
+        cpu.cycles = self.cycles
+
+
+def snapshot(cpu):
+    """Snapshot of the current state of cpu"""
+    stack = cpu.stack
+    timers = [getattr(timer, name) for timer in (cpu.tmr0, cpu.tmr1) for name in TIMER_FIELDS]
+    data = STATE.pack(cpu.pc, cpu.w, cpu.w_swap, cpu.flags, cpu.cpu_cfg, cpu.tmr_cfg, cpu.op_code, bytes(cpu.operands),
+                      cpu.interrupt_source, cpu.set_t0, cpu.set_t1, bytes(cpu.ports), bytes(cpu.ports_cfg),
+                      bytes(cpu.registers), bytes(cpu.ram), stack.ptr, stack.data_out, *stack.mem, *timers)
+    return Snapshot(cpu.instructions, cpu.cycles, data)
+
+
+def differences(a, b):
+    """Names of the fields a and b differ in, RAM cells, registers and stack words by index"""
+    names = [name for name in ("instructions", "cycles") if getattr(a, name) != getattr(b, name)]
+    fields_a, fields_b = a.fields(), b.fields()
+    for name, _ in FIELDS:
+        value_a, value_b = fields_a[name], fields_b[name]
+        if value_a == value_b:
+            continue
+        if isinstance(value_a, (bytes, tuple)) and name not in ("tmr0", "tmr1"):
+            names += [f"{name}[{index:#04x}]" for index, (x, y) in enumerate(zip(value_a, value_b)) if x != y]
+        else:
+            names.append(name)
+    return names
+
+
+def record(cpu, counts, **halt):
+    """Runs cpu and returns a Snapshot when it has run every instruction count of counts, in increasing
+    order; halt holds the other Cpu.run() halt conditions. A run halted early returns the snapshots
+    taken so far and one of the halted state"""
+    snapshots = []
+    for count in counts:
+        if cpu.instructions < count:
+            cpu.run(max_instructions=count - cpu.instructions, **halt)
+        snapshots.append(snapshot(cpu))
+        if cpu.instructions < count:
+            break
+    return snapshots
+
+
+def first_divergence(a, b):
+    """Index of the first snapshot a and b differ in, None if they are equal. When one list is a prefix
+    of the other, the first snapshot missing from the shorter one"""
+    for index, (snapshot_a, snapshot_b) in enumerate(zip(a, b)):
+        if snapshot_a != snapshot_b:
+            return index
+    return None if len(a) == len(b) else min(len(a), len(b))
+
+
+def write(path, snapshots):
+    with open(path, "wb") as stream:
+        stream.write(HEADER.pack(MAGIC, VERSION, ENTRY.size + STATE.size))
+        for entry in snapshots:
+            stream.write(ENTRY.pack(entry.instructions, entry.cycles) + entry.data)
+
+
+def read(path):
+    with open(path, "rb") as stream:
+        data = stream.read()
+    magic, version, size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or size != ENTRY.size + STATE.size:
+        raise ValueError(f"{path} is not a version {VERSION} checkpoint file")
+    snapshots = []
+    for offset in range(HEADER.size, len(data) - size + 1, size):
+        instructions, cycles = ENTRY.unpack_from(data, offset)
+        snapshots.append(Snapshot(instructions, cycles, data[offset + ENTRY.size:offset + size]))
+    return snapshots
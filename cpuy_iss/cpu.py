@@ -0,0 +1,370 @@
+"""Instruction set simulator of cpuy.v
+
+The simulator executes one instruction per step() and accounts for the clock
+cycles the RTL state machine spends on it, so timers and interrupts see the
+same clock edges they see in the RTL.
+"""
+
+import sys
+
+from .alu import OPERATIONS
+from .isa import (ADDRESS_MASK, CALL, CLRBW, CPU_CFG, CPU_CFG_EXT_IE, CPU_CFG_GIE, CPU_CFG_T0_IE,
+                  CPU_CFG_T1_IE, CYCLES, EI_INTERRUPTION, HALT_ADDRESS, HALT_BUDGET, HALT_FLAG_ADDRESS,
+                  HALT_FLAG_SELF_JUMP, HALT_FLAG_SENTINEL, HALT_SELF_JUMP, HALT_SENTINEL, INTERRUPTION_VECTORS,
+                  JMP, JMPC, JMPS, JMPZ, MOVLM, MOVLW, MOVMW, MOVPW, MOVRW, MOVWM, MOVWP, MOVWR,
+                  NO_INTERRUPTION, OPERAND_COUNT, PORTS_CFG, RAM_OPERAND, RAM_SIZE, REGISTERS, RESET_VECTOR,
+                  RET, SENTINEL, SETBW, T0_INTERRUPTION, T1_INTERRUPTION, TBJC, TBJS, TMR_CFG, XCHWM,
+                  halt_flags, rom_image)
+from .stack import Stack
+from .timer import Timer
+
+
+class Cpu:
+    """Architectural state of cpuy plus the cycles and instructions executed since reset.
+
+    Inputs ext_int, p0in and p1in are plain attributes sampled when an instruction
+    executes. Like cpuy.v, reset() clears neither the registers nor the RAM.
+    """
+    __slots__ = ("rom", "pc", "w", "w_swap", "flags", "cpu_cfg", "tmr_cfg", "registers", "ram", "ports",
+                 "ports_cfg", "op_code", "operands", "interrupt_source", "stack", "tmr0", "tmr1", "set_t0",
+                 "set_t1", "ext_int", "p0in", "p1in", "cycles", "instructions")
+
+    def __init__(self, program=b""):
+        self.rom = rom_image(program)
+        self.registers = bytearray(REGISTERS)
+        self.ram = bytearray(RAM_SIZE)
+        self.stack = Stack()
+        self.tmr0 = Timer()
+        self.tmr1 = Timer()
+        self.ext_int = 0
+        self.p0in = 0
+        self.p1in = 0
+        self.reset()
+
+    def load(self, program):
+        self.rom = rom_image(program)
+
+    def reset(self):
+        """State at the first FETCHING_OPCODE after rst is released"""
+        self.pc = RESET_VECTOR
+        self.w = 0
+        self.w_swap = 0
+        self.flags = 0
+        self.cpu_cfg = 0
+        self.tmr_cfg = 0
+        self.ports = bytearray(2)
+        self.ports_cfg = bytearray(2)
+        self.op_code = 0
+        self.operands = bytearray(2)
+        self.interrupt_source = NO_INTERRUPTION
+        self.stack.reset()
+        # done_ack is high while resetting
+        self.tmr0.overflow = 0
+        self.tmr1.overflow = 0
+        self.set_t0 = 0
+        self.set_t1 = 0
+        self.cycles = 0
+        self.instructions = 0
+
+    @property
+    def p0out(self):
+        return self.ports[0]
+
+    @property
+    def p1out(self):
+        return self.ports[1] & 0x0F
+
+    @property
+    def p0cfg(self):
+        return self.ports_cfg[0]
+
+    @property
+    def p1cfg(self):
+        return self.ports_cfg[1]
+
+    def _timers_edge(self, ack):
+        """One clock edge of both timers with the current set inputs, ack is the interruption acknowledged"""
+        tmr_cfg = self.tmr_cfg
+        registers = self.registers
+
+        tmr0 = self.tmr0
+        if ack == T0_INTERRUPTION:
+            tmr0.overflow = 0
+        if tmr_cfg & 0x01:
+            if self.set_t0:
+                tmr0.load((registers[1] << 8) | registers[0], (tmr_cfg >> 1) & 1, (tmr_cfg >> 2) & 1)
+            else:
+                tmr0.advance(1)
+
+        tmr1 = self.tmr1
+        if ack == T1_INTERRUPTION:
+            tmr1.overflow = 0
+        if tmr_cfg & 0x10:
+            if self.set_t1:
+                tmr1.load((registers[3] << 8) | registers[2], (tmr_cfg >> 5) & 1, (tmr_cfg >> 6) & 1)
+            else:
+                tmr1.advance(1)
+
+    def _advance_timers(self, edges):
+        tmr_cfg = self.tmr_cfg
+        if tmr_cfg & 0x01:
+            self.tmr0.advance(edges)
+        if tmr_cfg & 0x10:
+            self.tmr1.advance(edges)
+
+    def step(self):
+        """Executes one instruction, including the interruption redirection it may trigger"""
+        rom = self.rom
+        pc = self.pc
+
+        # FETCHING_OPCODE
+        op = rom[pc]
+        pc = (pc + 1) & ADDRESS_MASK
+        self.op_code = op
+
+        # FETCHING_OPERANDS
+        count = OPERAND_COUNT[op]
+        if count:
+            operands = self.operands
+            operand = rom[pc]
+            pc = (pc + 1) & ADDRESS_MASK
+            operands[0] = self.ram[operand] if RAM_OPERAND[op] else operand
+            if count == 2:
+                operands[1] = rom[pc]
+                pc = (pc + 1) & ADDRESS_MASK
+            if op | 1 == XCHWM | 1:
+                self.w_swap = self.w
+        self.pc = pc
+
+        # Timers see every clock edge, done is sampled before the EXECUTING edge. TmrCfg sets the
+        # set inputs to the enable bits, so nothing is pending while both timers are disabled
+        cycles = CYCLES[op]
+        timers = self.tmr_cfg & 0x11
+        if timers:
+            self._timers_edge(NO_INTERRUPTION)
+            self.set_t0 = self.set_t1 = 0
+            if cycles > 2:
+                self._advance_timers(cycles - 2)
+            done_t0 = self.tmr0.overflow
+            done_t1 = self.tmr1.overflow
+            self._advance_timers(1)
+
+        # POPPING_STACK
+        if op == RET:
+            self.stack.pop()
+
+        # EXECUTING, interruptions are checked with the configuration prior to this instruction
+        cpu_cfg = self.cpu_cfg
+        interrupt_source = self.interrupt_source
+        _EXECUTE[op](self, op)
+        self.cycles += cycles
+        self.instructions += 1
+
+        if cpu_cfg & CPU_CFG_GIE and interrupt_source == NO_INTERRUPTION:
+            if not timers:
+                done_t0 = self.tmr0.overflow
+                done_t1 = self.tmr1.overflow
+
+            if cpu_cfg & CPU_CFG_EXT_IE and self.ext_int:
+                self._interrupt(EI_INTERRUPTION)
+            elif cpu_cfg & CPU_CFG_T0_IE and done_t0:
+                self._interrupt(T0_INTERRUPTION)
+            elif cpu_cfg & CPU_CFG_T1_IE and done_t1:
+                self._interrupt(T1_INTERRUPTION)
+
+    def _interrupt(self, source):
+        # INTERRUPT_REDIRECTION: pushes the next PC and acknowledges the timer
+        self.interrupt_source = source
+        self.stack.push(self.pc)
+        self._timers_edge(source)
+        self.pc = INTERRUPTION_VECTORS[source]
+        self.cycles += 1
+
+    def run(self, max_cycles=None, max_instructions=None, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True,
+            stimulus=None):
+        """Steps until a halt condition is met and returns its HALT_* reason.
+
+        Halt conditions are the ones of the ROM model: reaching an address holding
+        sentinel or listed in halt_at, executing a Jmp to itself, or exhausting a
+        budget of cycles or instructions. stimulus, like cpuy_iss.stimulus.Player,
+        is called with the Cpu before every step to set its inputs.
+        """
+        flags = halt_flags(self.rom, sentinel, halt_at, halt_on_self_jump)
+        cycles_limit = sys.maxsize if max_cycles is None else self.cycles + max_cycles
+        remaining = sys.maxsize if max_instructions is None else max_instructions
+        step = self.step
+
+        while True:
+            pc = self.pc
+            flag = flags[pc]
+            if flag & HALT_FLAG_SENTINEL:
+                return HALT_SENTINEL
+            if flag & HALT_FLAG_ADDRESS:
+                return HALT_ADDRESS
+            if remaining <= 0 or self.cycles >= cycles_limit:
+                return HALT_BUDGET
+
+            if stimulus is not None:
+                stimulus(self)
+            step()
+            remaining -= 1
+
+            if flag & HALT_FLAG_SELF_JUMP and self.pc == pc:
+                return HALT_SELF_JUMP
+
+
+# EXECUTING state of every opcode, as decoded by ucode.v
+
+def _nop(cpu, op):
+    pass
+
+
+def _alu(cpu, op):
+    result_l, result_h, flags = OPERATIONS[op](cpu.w, cpu.operands[0], cpu.flags & 1)
+    cpu.w = result_l
+    cpu.flags = (cpu.flags & 0xF8) | flags
+
+
+def _alu_multibyte(cpu, op):
+    operands = cpu.operands
+    result_l, result_h, flags = OPERATIONS[op](cpu.w, operands[0], cpu.flags & 1)
+    cpu.w = result_l
+    cpu.flags = (cpu.flags & 0xF8) | flags
+    cpu.ram[operands[1]] = result_h
+
+
+def _ret(cpu, op):
+    cpu.pc = cpu.stack.data_out
+    cpu.interrupt_source = NO_INTERRUPTION
+
+
+def _ports_cfg(cpu, op):
+    registers = cpu.registers
+    cpu.ports_cfg[0] = registers[0]
+    cpu.ports_cfg[1] = registers[1] & 0x0F
+
+
+def _cpu_cfg(cpu, op):
+    cpu.cpu_cfg = cpu.w
+
+
+def _tmr_cfg(cpu, op):
+    w = cpu.w
+    cpu.tmr_cfg = w
+    cpu.set_t0 = w & 1
+    cpu.set_t1 = (w >> 4) & 1
+
+
+def _mov_w_port(cpu, op):
+    cpu.ports[op & 1] = cpu.w
+
+
+def _mov_port_w(cpu, op):
+    ports = cpu.ports
+    ports_cfg = cpu.ports_cfg
+    if op & 1:
+        cpu.w = (cpu.p1in & 0x0F & ports_cfg[1]) | (ports[1] & 0x0F & ~ports_cfg[1])
+    else:
+        cpu.w = (cpu.p0in & ports_cfg[0]) | (ports[0] & ~ports_cfg[0] & 0xFF)
+
+
+def _mov_w_register(cpu, op):
+    cpu.registers[op & 7] = cpu.w
+
+
+def _mov_register_w(cpu, op):
+    cpu.w = cpu.registers[op & 7]
+
+
+def _mov_operand_w(cpu, op): # MovLW, and MovMW as the RAM was read while fetching operands
+    cpu.w = cpu.operands[0]
+
+
+def _mov_w_memory(cpu, op):
+    cpu.ram[cpu.operands[0]] = cpu.w
+
+
+def _mov_literal_memory(cpu, op):
+    operands = cpu.operands
+    cpu.ram[operands[0]] = operands[1]
+
+
+def _exchange_w_memory(cpu, op):
+    ram = cpu.ram
+    address = cpu.operands[0]
+    cpu.w = ram[address]
+    ram[address] = cpu.w_swap
+
+
+def _jump_target(cpu):
+    operands = cpu.operands
+    return ((operands[1] << 8) | operands[0]) & ADDRESS_MASK
+
+
+def _jmp(cpu, op):
+    cpu.pc = _jump_target(cpu)
+
+
+def _jmp_flag(mask):
+    def jmp_flag(cpu, op):
+        if cpu.flags & mask:
+            cpu.pc = _jump_target(cpu)
+    return jmp_flag
+
+
+def _test_bit_jump_clear(cpu, op):
+    if not (cpu.w >> ((op >> 1) & 7)) & 1:
+        cpu.pc = _jump_target(cpu)
+
+
+def _test_bit_jump_set(cpu, op):
+    if (cpu.w >> ((op >> 1) & 7)) & 1:
+        cpu.pc = _jump_target(cpu)
+
+
+def _call(cpu, op):
+    cpu.stack.push(cpu.pc)
+    cpu.pc = _jump_target(cpu)
+
+
+def _execute_table():
+    table = [_nop] * 256
+
+    for op in list(range(0x01, 0x0B)) + list(range(SETBW, CLRBW + 8)) + list(range(0x88, 0xA0)):
+        table[op] = _alu
+    for op in range(0x90, 0x94): # MulLW, MulMW
+        table[op] = _alu_multibyte
+
+    table[RET] = _ret
+    table[PORTS_CFG] = _ports_cfg
+    table[CPU_CFG] = _cpu_cfg
+    table[TMR_CFG] = _tmr_cfg
+
+    for x in range(2):
+        table[MOVWP + x] = _mov_w_port
+        table[MOVPW + x] = _mov_port_w
+    for x in range(8):
+        table[MOVWR + x] = _mov_w_register
+        table[MOVRW + x] = _mov_register_w
+
+    for x in range(2):
+        table[MOVMW + x] = _mov_operand_w
+        table[MOVLW + x] = _mov_operand_w
+        table[MOVWM + x] = _mov_w_memory
+        table[MOVLM + x] = _mov_literal_memory
+        table[XCHWM + x] = _exchange_w_memory
+        table[JMP + x] = _jmp
+        table[JMPC + x] = _jmp_flag(0b001)
+        table[JMPZ + x] = _jmp_flag(0b010)
+        table[JMPS + x] = _jmp_flag(0b100)
+        table[CALL + x] = _call
+
+    for op in range(TBJC, TBJS):
+        table[op] = _test_bit_jump_clear
+    for op in range(TBJS, 0x100):
+        table[op] = _test_bit_jump_set
+
+    return tuple(table)
+
+
+_EXECUTE = _execute_table()
@@ -0,0 +1,316 @@
+"""Coverage-guided fuzzer of CPUy programs
+
+Candidates are instruction streams generated and mutated one instruction at a
+time, so operand counts are respected and jump and call targets stay in the
+10-bit address space, mostly inside the program. Every candidate runs in the
+ISS, which records one coverage point per executed instruction:
+
+    opcode x S, Z, C flags x interruption source x stack depth
+
+Only candidates reaching a point the corpus does not reach yet are kept,
+trimmed to the instruction reaching their last new point and written to the
+corpus directory. test/test_cpuy_fuzz_corpus.py replays the corpus on the RTL
+in lockstep with the ISS, so RTL time is only spent on programs exercising
+something new:
+
+    python -m cpuy_iss.fuzz -n 20000 [--corpus DIR] [--seed N]
+    make fuzz
+
+After a campaign the corpus is minimized, an entry is kept only when it is
+the cheapest one reaching some coverage point.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+from . import cache
+from .cpu import Cpu
+from .isa import (CALL, CPU_CFG, CYCLES, JUMPS, MNEMONICS, MOVLW, MOVWR, OPERAND_COUNT, RET, ROM_SIZE,
+                  TMR_CFG)
+
+DEFAULT_CORPUS = os.environ.get("CPUY_FUZZ_CORPUS") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fuzz", "corpus")
+
+# Instructions a candidate runs while it is triaged, before being trimmed
+MAX_INSTRUCTIONS = 500
+
+# Coverage points: opcode << 9 | flags << 6 | interruption source << 4 | stack depth
+COVERAGE_POINTS = 256 << 9
+
+_ADDRESSING = JUMPS | {CALL, CALL + 1}
+_DEFINED = tuple(op for op, name in enumerate(MNEMONICS) if name is not None)
+_UNDEFINED = tuple(op for op, name in enumerate(MNEMONICS) if name is None)
+_INTERESTING = (0x00, 0x01, 0x0F, 0x10, 0x7F, 0x80, 0xFE, 0xFF)
+
+# Sequences configuring interruptions and timers, which random streams seldom get right
+_SNIPPETS = (
+    bytes((MOVLW, 0xF0, CPU_CFG)), # GIE, ExtIE, T0IE and T1IE
+    bytes((MOVLW, 0xA0, CPU_CFG)), # GIE and T0IE
+    bytes((MOVLW, 12, MOVWR, MOVLW, 0, MOVWR + 1, MOVLW, 0x05, TMR_CFG)), # Timer 0 counts 12 down, autoreload
+    bytes((MOVLW, 9, MOVWR + 2, MOVLW, 0, MOVWR + 3, MOVLW, 0x70, TMR_CFG)), # Timer 1 counts 9 up, autoreload
+    bytes((RET,)),
+)
+
+
+def coverage_point(op, flags, source, depth):
+    return op << 9 | (flags & 7) << 6 | source << 4 | depth
+
+
+def describe_point(point):
+    """e.g. 'Ret flags=0b010 source=2 depth=0'"""
+    op = point >> 9
+    name = MNEMONICS[op] or f"NOP ({op:#04x})"
+    return f"{name} flags={(point >> 6) & 7:#05b} source={(point >> 4) & 3} depth={point & 15}"
+
+
+class Candidate:
+    """A program, the window of clock cycles ext_int is high in and the instructions to run.
+
+    ext_int is None or (start, end), cycles counted from the first FETCHING_OPCODE
+    after reset, the input is high while start <= cycle < end.
+    """
+    __slots__ = ("program", "ext_int", "max_instructions")
+
+    def __init__(self, program, ext_int=None, max_instructions=MAX_INSTRUCTIONS):
+        self.program = bytes(program)
+        self.ext_int = tuple(ext_int) if ext_int is not None else None
+        self.max_instructions = max_instructions
+
+    def __repr__(self):
+        return f"Candidate({self.key()})"
+
+    def key(self):
+        return cache.digest(self.program, repr(self.ext_int), str(self.max_instructions))[:16]
+
+    def to_json(self):
+        return {"program": self.program.hex(), "ext_int": self.ext_int, "max_instructions": self.max_instructions}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(bytes.fromhex(data["program"]), data["ext_int"], data["max_instructions"])
+
+
+def decode(program):
+    """Splits program into instructions, the last one may lack operands"""
+    instructions = []
+    address = 0
+    while address < len(program):
+        size = 1 + OPERAND_COUNT[program[address]]
+        instructions.append(program[address:address + size])
+        address += size
+    return instructions
+
+
+def encode(instructions):
+    return b"".join(instructions)[:ROM_SIZE]
+
+
+def _operand(rng):
+    draw = rng.random()
+    if draw < 0.25:
+        return rng.choice(_INTERESTING)
+    if draw < 0.6: # RAM addresses shared by the memory instructions
+        return rng.randrange(16)
+    return rng.randrange(256)
+
+
+def random_instruction(rng, size):
+    """An instruction for a program of size bytes, jumps mostly land inside the program"""
+    op = rng.choice(_DEFINED) if rng.random() >= 1 / 32 else rng.choice(_UNDEFINED)
+    count = OPERAND_COUNT[op]
+    if op in _ADDRESSING and count == 2:
+        target = rng.randrange(max(size, 1)) if rng.random() < 0.9 else rng.randrange(ROM_SIZE)
+        return bytes((op, target & 0xFF, target >> 8))
+    return bytes([op] + [_operand(rng) for _ in range(count)])
+
+
+def _insertion(rng, size):
+    return rng.choice(_SNIPPETS) if rng.random() < 0.15 else random_instruction(rng, size)
+
+
+def _ext_int(rng):
+    if rng.random() < 0.5:
+        return None
+    start = rng.randrange(400)
+    return start, start + rng.randrange(1, 50)
+
+
+def generate(rng, max_instructions=MAX_INSTRUCTIONS):
+    """A new candidate of 16 to 96 random instructions and snippets"""
+    size = rng.randrange(16, 97) * 2 # Rough size in bytes for the jump targets
+    instructions = []
+    while sum(map(len, instructions)) < size:
+        instructions.append(_insertion(rng, size))
+    return Candidate(encode(instructions), _ext_int(rng), max_instructions)
+
+
+def mutate(candidate, rng, donors=(), max_instructions=MAX_INSTRUCTIONS):
+    """A candidate derived from candidate by 1 to 4 random mutations, donors are spliced in"""
+    instructions = decode(candidate.program)
+    ext_int = candidate.ext_int
+
+    for _ in range(rng.randint(1, 4)):
+        size = sum(map(len, instructions))
+        index = rng.randrange(len(instructions))
+        mutation = rng.randrange(7)
+        if mutation == 0:
+            instructions[index] = random_instruction(rng, size)
+        elif mutation == 1:
+            instructions.insert(index, _insertion(rng, size))
+        elif mutation == 2 and len(instructions) > 1:
+            del instructions[index]
+        elif mutation == 3 and len(instructions[index]) > 1:
+            # New operand, a new target for jumps
+            instruction = bytearray(instructions[index])
+            if instruction[0] in _ADDRESSING and len(instruction) == 3:
+                target = rng.randrange(max(size, 1))
+                instruction[1:] = bytes((target & 0xFF, target >> 8))
+            else:
+                instruction[rng.randrange(1, len(instruction))] = _operand(rng)
+            instructions[index] = bytes(instruction)
+        elif mutation == 4:
+            end = rng.randrange(index, min(index + 8, len(instructions))) + 1
+            instructions[end:end] = instructions[index:end]
+        elif mutation == 5 and donors:
+            donor = decode(rng.choice(donors).program)
+            start = rng.randrange(len(donor))
+            instructions[index:] = donor[start:start + rng.randint(1, 32)]
+        else:
+            ext_int = _ext_int(rng)
+
+    return Candidate(encode(instructions) or bytes(1), ext_int, max_instructions)
+
+
+def trace(candidate):
+    """Runs candidate in the ISS, returns the Cpu and {coverage point: first instruction reaching it}"""
+    cpu = Cpu(candidate.program)
+    rom = cpu.rom
+    stack = cpu.stack
+    step = cpu.step
+    start, end = candidate.ext_int or (0, 0)
+    points = {}
+
+    for index in range(candidate.max_instructions):
+        op = rom[cpu.pc]
+        # Sampled by the EXECUTING edge, the last cycle of the instruction
+        cpu.ext_int = int(start <= cpu.cycles + CYCLES[op] - 1 < end)
+        point = op << 9 | (cpu.flags & 7) << 6 | cpu.interrupt_source << 4 | stack.ptr
+        if point not in points:
+            points[point] = index
+        step()
+
+    return cpu, points
+
+
+class Corpus:
+    """Candidates reaching distinct coverage, one JSON file each in directory when given"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.entries = {} # key: (candidate, coverage points, cycles)
+        self.coverage = set()
+        if directory is not None and os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".json"):
+                    with open(os.path.join(directory, name)) as stream:
+                        candidate = Candidate.from_json(json.load(stream))
+                    cpu, points = trace(candidate)
+                    self._insert(candidate, points, cpu.cycles)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidates(self):
+        return [candidate for candidate, _, _ in self.entries.values()]
+
+    def _insert(self, candidate, points, cycles):
+        self.entries[candidate.key()] = (candidate, frozenset(points), cycles)
+        self.coverage.update(points)
+
+    def add(self, candidate, points, cycles):
+        self._insert(candidate, points, cycles)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, candidate.key() + ".json"), "w") as stream:
+                json.dump(candidate.to_json(), stream)
+
+    def minimize(self):
+        """Keeps the cheapest entry of every coverage point, returns the number of entries dropped"""
+        cheapest = {}
+        for key, (candidate, points, cycles) in sorted(self.entries.items(), key=lambda item: (item[1][2], item[0])):
+            for point in points:
+                cheapest.setdefault(point, key)
+        kept = set(cheapest.values())
+
+        dropped = [key for key in self.entries if key not in kept]
+        for key in dropped:
+            del self.entries[key]
+            if self.directory is not None:
+                os.unlink(os.path.join(self.directory, key + ".json"))
+        return len(dropped)
+
+
+def fuzz(corpus, iterations, rng, max_instructions=MAX_INSTRUCTIONS):
+    """Triages iterations candidates in the ISS, adds the ones reaching new coverage to corpus"""
+    added = []
+    for _ in range(iterations):
+        parents = corpus.candidates()
+        if parents and rng.random() < 0.9:
+            candidate = mutate(rng.choice(parents), rng, parents, max_instructions)
+        else:
+            candidate = generate(rng, max_instructions)
+
+        cpu, points = trace(candidate)
+        new = [index for point, index in points.items() if point not in corpus.coverage]
+        if not new:
+            continue
+
+        # Trimmed to its last new point, the RTL does not run the rest
+        candidate = Candidate(candidate.program, candidate.ext_int, max(new) + 1)
+        cpu, points = trace(candidate)
+        corpus.add(candidate, points, cpu.cycles)
+        added.append(candidate)
+    return added
+
+
+def report(corpus):
+    """Summary of the coverage reached by corpus"""
+    coverage = corpus.coverage
+    opcodes = {point >> 9 for point in coverage}
+    sources = {(point >> 4) & 3 for point in coverage}
+    depth = max((point & 15 for point in coverage), default=0)
+    cycles = sum(cycles for _, _, cycles in corpus.entries.values())
+    lines = [f"{len(corpus)} entries, {cycles} cycles, {len(coverage)} coverage points",
+             f"{len(opcodes & set(_DEFINED))} of {len(_DEFINED)} defined opcodes, "
+             f"{len(opcodes & set(_UNDEFINED))} undefined ones",
+             f"interruption sources {sorted(sources)}, stack depth up to {depth}"]
+    missing = sorted({MNEMONICS[op] for op in _DEFINED} - {MNEMONICS[op] for op in opcodes if MNEMONICS[op]})
+    if missing:
+        lines.append("never executed: " + ", ".join(missing))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_iss.fuzz", description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=10000, help="candidates to triage")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help=f"corpus directory ({DEFAULT_CORPUS})")
+    parser.add_argument("--seed", type=int, help="random seed, e.g. to reproduce a campaign")
+    parser.add_argument("--max-instructions", type=int, default=MAX_INSTRUCTIONS,
+                        help="instructions a candidate runs while triaged")
+    args = parser.parse_args(argv)
+
+    corpus = Corpus(args.corpus)
+    before = len(corpus.coverage)
+    added = fuzz(corpus, args.iterations, random.Random(args.seed), args.max_instructions)
+    dropped = corpus.minimize()
+    print(f"{len(added)} new entries reaching {len(corpus.coverage) - before} new coverage points, "
+          f"{dropped} redundant entries dropped")
+    print(report(corpus))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
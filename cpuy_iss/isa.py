@@ -0,0 +1,228 @@
+"""CPUy instruction set constants, as implemented by cpuy.v and ucode.v"""
+
+ROM_SIZE = 1024 # 10-bits address bus
+ADDRESS_MASK = ROM_SIZE - 1
+RAM_SIZE = 256
+REGISTERS = 8
+STACK_DEPTH = 16
+
+RESET_VECTOR = 0x000
+EI_INTERRUPTION_VECTOR = 0x010 # External Interruption
+T0_INTERRUPTION_VECTOR = 0x020 # Timer 0
+T1_INTERRUPTION_VECTOR = 0x030 # Timer 1
+
+# CPU State machine statuses
+RESETTING = 0
+FETCHING_OPCODE = 1
+FETCHING_OPERANDS = 2
+POPPING_STACK = 3
+EXECUTING = 4
+INTERRUPT_REDIRECTION = 5
+STATE_NAMES = ("RESETTING", "FETCHING_OPCODE", "FETCHING_OPERANDS", "POPPING_STACK", "EXECUTING",
+               "INTERRUPT_REDIRECTION")
+
+# Interruption sources
+NO_INTERRUPTION = 0
+EI_INTERRUPTION = 1
+T0_INTERRUPTION = 2
+T1_INTERRUPTION = 3
+INTERRUPTION_VECTORS = (None, EI_INTERRUPTION_VECTOR, T0_INTERRUPTION_VECTOR, T1_INTERRUPTION_VECTOR)
+
+# Flags register: X X X X - X S Z C
+CARRY = 0b001
+ZERO = 0b010
+SIGN = 0b100
+
+# CPU configuration register: [GIE] [ExtIE] [T0IE] [T1IE] _ [X] [X] [X] [X]
+CPU_CFG_GIE = 0x80
+CPU_CFG_EXT_IE = 0x40
+CPU_CFG_T0_IE = 0x20
+CPU_CFG_T1_IE = 0x10
+
+# Timers configuration register: [x] [T1AR] [T1DIR] [T1E] _ [x] [T0AR] [T0DIR] [T0E]
+TMR_CFG_T0_ENABLE = 0x01
+TMR_CFG_T0_DIRECTION = 0x02
+TMR_CFG_T0_AUTORELOAD = 0x04
+TMR_CFG_T1_ENABLE = 0x10
+TMR_CFG_T1_DIRECTION = 0x20
+TMR_CFG_T1_AUTORELOAD = 0x40
+
+# Instructions without operands
+NOP = 0b0000_0000
+DEC = 0b0000_0001
+INC = 0b0000_0010
+NOT = 0b0000_0011
+SETC = 0b0000_0100
+CLRC = 0b0000_0101
+RL = 0b0000_0110
+RR = 0b0000_0111
+RLC = 0b0000_1000
+RRC = 0b0000_1001
+SWAP = 0b0000_1010
+RET = 0b0011_1100
+PORTS_CFG = 0b0011_1101
+CPU_CFG = 0b0011_1110
+TMR_CFG = 0b0011_1111
+MOVWP = 0b0100_0000 # + port
+MOVPW = 0b0100_1000 # + port
+MOVWR = 0b0101_0000 # + register
+MOVRW = 0b0101_1000 # + register
+SETBW = 0b0110_0000 # + bit
+CLRBW = 0b0110_1000 # + bit
+
+# Instructions with operands, bit 0 set means a second operand is fetched
+MOVMW = 0b1000_0000
+MOVWM = 0b1000_0010
+MOVLW = 0b1000_0100
+MOVLM = 0b1000_0110
+ADDLW = 0b1000_1000
+ADDMW = 0b1000_1010
+SUBLW = 0b1000_1100
+SUBMW = 0b1000_1110
+MULLW = 0b1001_0000
+MULMW = 0b1001_0010
+ANDLW = 0b1001_0100
+ANDMW = 0b1001_0110
+ORLW = 0b1001_1000
+ORMW = 0b1001_1010
+XORLW = 0b1001_1100
+XORMW = 0b1001_1110
+XCHWM = 0b1010_0000
+JMP = 0b1010_0010
+JMPC = 0b1010_0100
+JMPZ = 0b1010_0110
+JMPS = 0b1010_1000
+CALL = 0b1010_1010
+TBJC = 0b1110_0000 # + 2 * bit
+TBJS = 0b1111_0000 # + 2 * bit
+
+JUMPS = frozenset(op | n for op in (JMP, JMPC, JMPZ, JMPS) for n in (0, 1)) | \
+    frozenset(range(TBJC, 0x100))
+
+
+def _mnemonics():
+    names = [None] * 256
+
+    for op, name in ((NOP, "NOP"), (DEC, "Dec"), (INC, "Inc"), (NOT, "Not"), (SETC, "SetC"), (CLRC, "ClrC"),
+                     (RL, "RL"), (RR, "RR"), (RLC, "RLC"), (RRC, "RRC"), (SWAP, "Swap"), (RET, "Ret"),
+                     (PORTS_CFG, "PortsCfg"), (CPU_CFG, "CpuCfg"), (TMR_CFG, "TmrCfg")):
+        names[op] = name
+
+    for x in range(2):
+        names[MOVWP + x] = f"MovWP{x}"
+        names[MOVPW + x] = f"MovP{x}W"
+
+    for x in range(8):
+        names[MOVWR + x] = f"MovWR{x}"
+        names[MOVRW + x] = f"MovR{x}W"
+        names[SETBW + x] = f"Setb{x}W"
+        names[CLRBW + x] = f"Clrb{x}W"
+        names[TBJC + 2 * x] = names[TBJC + 2 * x + 1] = f"Tb{x}jc"
+        names[TBJS + 2 * x] = names[TBJS + 2 * x + 1] = f"Tb{x}js"
+
+    for op, name in ((MOVMW, "MovMW"), (MOVWM, "MovWM"), (MOVLW, "MovLW"), (MOVLM, "MovLM"),
+                     (ADDLW, "AddLW"), (ADDMW, "AddMW"), (SUBLW, "SubLW"), (SUBMW, "SubMW"),
+                     (MULLW, "MulLW"), (MULMW, "MulMW"), (ANDLW, "AndLW"), (ANDMW, "AndMW"),
+                     (ORLW, "OrLW"), (ORMW, "OrMW"), (XORLW, "XorLW"), (XORMW, "XorMW"),
+                     (XCHWM, "XchWM"), (JMP, "Jmp"), (JMPC, "JmpC"), (JMPZ, "JmpZ"), (JMPS, "JmpS"),
+                     (CALL, "Call")):
+        names[op] = names[op + 1] = name
+
+    return tuple(names)
+
+
+# Mnemonic of every opcode, None for opcodes ucode.v decodes as NOP
+MNEMONICS = _mnemonics()
+
+# Operands fetched after each opcode: none when bit 7 is clear, else bit 0 + 1
+OPERAND_COUNT = bytes((op & 1) + 1 if op & 0x80 else 0 for op in range(256))
+
+# Clock cycles from FETCHING_OPCODE to the end of EXECUTING, Ret goes through POPPING_STACK
+CYCLES = bytes(2 + OPERAND_COUNT[op] + (op == RET) for op in range(256))
+
+# Opcodes whose first operand is a RAM address replaced by its content while fetching operands
+RAM_OPERAND = bytes(op in (MOVMW, MOVMW + 1, ADDMW, ADDMW + 1, SUBMW, SUBMW + 1, MULMW, MULMW + 1,
+                           ANDMW, ANDMW + 1, ORMW, ORMW + 1, XORMW, XORMW + 1) for op in range(256))
+
+# Halt reasons shared by the ROM model and the instruction set simulator
+HALT_SENTINEL = "sentinel"
+HALT_ADDRESS = "address"
+HALT_SELF_JUMP = "self_jump"
+HALT_BUDGET = "budget"
+
+SENTINEL = 127 # Legacy "program ends" marker used by the test programs
+
+# NOPs before the Jmp of an idle loop, the whole loop fits the 8 bytes of the idle ROM of tb.v
+IDLE_NOPS = 5
+
+# Per-address halt flags
+HALT_FLAG_SENTINEL = 1
+HALT_FLAG_ADDRESS = 2
+HALT_FLAG_SELF_JUMP = 4
+
+
+def jump_target(rom, address):
+    """Target of the 2 operands jump or call at address"""
+    return rom[(address + 1) & ADDRESS_MASK] | ((rom[(address + 2) & ADDRESS_MASK] << 8) & ADDRESS_MASK)
+
+
+def disassemble(rom, address):
+    """Text of the instruction at address, e.g. 'MovLM 0x05, 0x17', and its size in bytes"""
+    op = rom[address & ADDRESS_MASK]
+    count = OPERAND_COUNT[op]
+    operands = [rom[(address + 1 + index) & ADDRESS_MASK] for index in range(count)]
+    name = MNEMONICS[op] or f"NOP ({op:#04x})"
+    if (op in JUMPS or op | 1 == CALL | 1) and count == 2:
+        return f"{name} {jump_target(rom, address):#05x}", 1 + count
+    return " ".join([name, ", ".join(f"{operand:#04x}" for operand in operands)]).strip(), 1 + count
+
+
+def halt_flags(rom, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True):
+    """Returns a bytearray with the HALT_FLAG_* bits of every ROM address"""
+    flags = bytearray(len(rom))
+
+    if sentinel is not None:
+        for address, word in enumerate(rom):
+            if word == sentinel:
+                flags[address] |= HALT_FLAG_SENTINEL
+
+    for address in halt_at:
+        flags[address & ADDRESS_MASK] |= HALT_FLAG_ADDRESS
+
+    if halt_on_self_jump:
+        for address, word in enumerate(rom):
+            if word == JMP + 1 and jump_target(rom, address) == address:
+                flags[address] |= HALT_FLAG_SELF_JUMP
+
+    return flags
+
+
+def idle_loops(rom, flags=None):
+    """Returns a bytearray with the length of the idle loop starting at every address, 0 elsewhere.
+
+    An idle loop is up to IDLE_NOPS NOPs and a 2 operands Jmp back to its
+    first byte, the CPU spins there until an interruption. Loops holding a
+    halt flag are not idle, the run ends in them.
+    """
+    lengths = bytearray(len(rom))
+    for address in range(len(rom)):
+        for nops in range(IDLE_NOPS + 1):
+            jump = (address + nops) & ADDRESS_MASK
+            if rom[jump] == JMP + 1 and jump_target(rom, jump) == address:
+                length = nops + 3
+                if flags is None or not any(flags[(address + offset) & ADDRESS_MASK] for offset in range(length)):
+                    lengths[address] = length
+                break
+            if rom[jump] != NOP:
+                break
+    return lengths
+
+
+def rom_image(program):
+    """Returns a zero padded ROM_SIZE bytearray holding program"""
+    if len(program) > ROM_SIZE:
+        raise ValueError(f"Program of {len(program)} bytes does not fit in a {ROM_SIZE} bytes ROM")
+
+    image = bytearray(ROM_SIZE)
+    image[:len(program)] = bytes(program)
+    return image
@@ -0,0 +1,287 @@
+"""Profile of the firmware a Cpu runs: hot addresses, routines and opcodes
+
+ProfiledCpu counts the executions of every ROM address and follows Call, Ret
+and the interruption redirections with the semantics of stack.v: 16 words of
+which 15 are usable, a push when full or a pop when empty is ignored. The
+cycles between two of those events are charged to the stack of routines
+active in between, so every routine gets its inclusive and exclusive cycles:
+
+    cpu = ProfiledCpu(program)
+    cpu.run(max_cycles=100000)
+    print(cpu.profile.report())
+    cpu.profile.write_collapsed("program.folded") # flamegraph.pl, speedscope...
+
+Routines are named by their entry address, sub_050, the interruption routines
+isr_ext_int, isr_tmr0 and isr_tmr1 and the code running from reset main; names
+maps addresses to other names. A Call or interruption ignored by a full stack
+charges the routine to its caller, and the Ret ending it leaves the caller, as
+in the RTL; overflows and underflows count them.
+
+`python -m cpuy_iss.profile program.s|.hex|.bin` runs a program and prints its
+profile.
+"""
+
+import argparse
+import collections
+import sys
+from array import array
+
+from .cpu import Cpu
+from .isa import (ADDRESS_MASK, CALL, CYCLES, HALT_ADDRESS, HALT_BUDGET, HALT_FLAG_ADDRESS, HALT_FLAG_SELF_JUMP,
+                  HALT_FLAG_SENTINEL, HALT_SELF_JUMP, HALT_SENTINEL, INTERRUPTION_VECTORS, MNEMONICS,
+                  NO_INTERRUPTION, RET, ROM_SIZE, SENTINEL, STACK_DEPTH, halt_flags)
+
+ROOT = "main"
+ISR_NAMES = (None, "isr_ext_int", "isr_tmr0", "isr_tmr1")
+
+# Opcodes changing the routine that runs
+_FRAME_OPS = bytes(op | 1 == CALL | 1 or op == RET for op in range(256))
+
+
+class Profile:
+    """Executions by address and cycles by stack of routines of one program"""
+
+    def __init__(self, rom, names=None):
+        self.rom = rom
+        self.names = {} if names is None else names
+        self.hits = array("Q", bytes(8 * ROM_SIZE)) # Executions by address
+        self.interruptions = [0] * len(ISR_NAMES) # Redirections by source
+        self.stacks = collections.Counter() # Exclusive cycles by collapsed stack, "main;sub_050"
+        self.calls = collections.Counter() # Entries by routine
+        self.overflows = 0
+        self.underflows = 0
+        self._keys = [ROOT] # Collapsed stack of every active routine, the root first
+        self._mark = 0 # Cycle charged up to
+        self._names = {}
+
+    def name(self, address):
+        name = self._names.get(address)
+        if name is None:
+            name = self._names[address] = self.names.get(address, f"sub_{address:03x}")
+        return name
+
+    def active(self):
+        """Collapsed stack of the routines running"""
+        return self._keys[-1]
+
+    def charge(self, cycle):
+        """Charges the cycles up to cycle to the current stack"""
+        if cycle > self._mark:
+            self.stacks[self._keys[-1]] += cycle - self._mark
+            self._mark = cycle
+
+    def _push(self, name):
+        keys = self._keys
+        if len(keys) == STACK_DEPTH: # stack.v is full at DEPTH - 1 entries, the root is not one
+            self.overflows += 1
+            return
+        keys.append(keys[-1] + ";" + name)
+        self.calls[name] += 1
+
+    def transition(self, cpu, op, cycle, source):
+        """Follows the stack after an instruction with opcode op started at cycle, source the
+        interruption source before it"""
+        self.charge(cycle + CYCLES[op])
+        if op == RET:
+            if len(self._keys) == 1:
+                self.underflows += 1
+            else:
+                self._keys.pop()
+        elif _FRAME_OPS[op]:
+            operands = cpu.operands
+            self._push(self.name(((operands[1] << 8) | operands[0]) & ADDRESS_MASK))
+
+        taken = cpu.interrupt_source
+        if source == NO_INTERRUPTION and taken != NO_INTERRUPTION:
+            # The redirection cycle belongs to the interruption routine
+            self.interruptions[taken] += 1
+            self._push(self.names.get(INTERRUPTION_VECTORS[taken], ISR_NAMES[taken]))
+
+    def restart(self, cycle):
+        """Charges the cycles up to cycle and goes back to the root, as after a reset"""
+        self.charge(cycle)
+        self._keys = [ROOT]
+        self._mark = 0
+
+    @property
+    def cycles(self):
+        return sum(self.stacks.values())
+
+    @property
+    def instructions(self):
+        return sum(self.hits)
+
+    def collapsed(self):
+        """Lines of the collapsed stack format, the stack and its exclusive cycles"""
+        return [f"{key} {cycles}" for key, cycles in sorted(self.stacks.items()) if cycles]
+
+    def write_collapsed(self, path):
+        with open(path, "w") as stream:
+            stream.write("".join(line + "\n" for line in self.collapsed()))
+
+    def routines(self):
+        """{name: (entries, inclusive cycles, exclusive cycles)}, a recursive routine counted once per stack"""
+        inclusive = collections.Counter()
+        exclusive = collections.Counter()
+        for key, cycles in self.stacks.items():
+            frames = key.split(";")
+            exclusive[frames[-1]] += cycles
+            for name in set(frames):
+                inclusive[name] += cycles
+        return {name: (self.calls[name], inclusive[name], exclusive[name]) for name in inclusive}
+
+    def opcodes(self):
+        """[executions, cycles] by opcode, the ROM being read-only"""
+        opcodes = [[0, 0] for _ in range(256)]
+        rom = self.rom
+        for address, count in enumerate(self.hits):
+            if count:
+                op = rom[address]
+                opcodes[op][0] += count
+                opcodes[op][1] += count * CYCLES[op]
+        return opcodes
+
+    def hot(self, limit=None):
+        """(address, executions, cycles) of the addresses taking most cycles"""
+        rom = self.rom
+        hot = sorted(((address, count, count * CYCLES[rom[address]]) for address, count in enumerate(self.hits)
+                      if count), key=lambda entry: (-entry[2], entry[0]))
+        return hot if limit is None else hot[:limit]
+
+    def report(self, limit=10):
+        """Text tables of the routines, the hot addresses and the opcodes taking most cycles"""
+        total = max(self.cycles, 1)
+        redirections = sum(self.interruptions)
+        lines = [f"{self.instructions} instructions, {self.cycles} cycles, {redirections} interruptions, "
+                 f"{self.overflows} stack overflows, {self.underflows} underflows", "",
+                 f"{'Routine':<16} {'Entries':>8} {'Inclusive':>10} {'%':>6} {'Exclusive':>10} {'%':>6}"]
+        routines = sorted(self.routines().items(), key=lambda item: (-item[1][1], item[0]))
+        for name, (entries, inclusive, exclusive) in routines[:limit]:
+            lines.append(f"{name:<16} {entries:>8} {inclusive:>10} {100 * inclusive / total:6.1f} {exclusive:>10} "
+                         f"{100 * exclusive / total:6.1f}")
+
+        lines += ["", f"{'Address':<8} {'Instruction':<16} {'Count':>10} {'Cycles':>10} {'%':>6}"]
+        for address, count, cycles in self.hot(limit):
+            op = self.rom[address]
+            lines.append(f"0x{address:03x}    {MNEMONICS[op] or 'NOP':<7} ({op:#04x}) {count:>10} {cycles:>10} "
+                         f"{100 * cycles / total:6.1f}")
+
+        lines += ["", f"{'Opcode':<16} {'Count':>10} {'Cycles':>10} {'%':>6}"]
+        opcodes = self.opcodes()
+        ranked = sorted((op for op in range(256) if opcodes[op][0]), key=lambda op: -opcodes[op][1])
+        for op in ranked[:limit]:
+            count, cycles = opcodes[op]
+            lines.append(f"{MNEMONICS[op] or 'NOP':<7} ({op:#04x}) {count:>10} {cycles:>10} {100 * cycles / total:6.1f}")
+        if redirections:
+            lines.append(f"{'Redirection':<16} {redirections:>10} {redirections:>10} {100 * redirections / total:6.1f}")
+        return "\n".join(lines)
+
+
+class ProfiledCpu(Cpu):
+    """Cpu recording a Profile of every instruction it steps, in run() too"""
+
+    __slots__ = ("profile", "_hits")
+
+    def __init__(self, program=b"", names=None):
+        super().__init__(program)
+        self.profile = Profile(self.rom, names)
+        self._hits = self.profile.hits
+
+    def load(self, program):
+        """Loads program and starts a new profile"""
+        super().load(program)
+        self.profile = Profile(self.rom, self.profile.names)
+        self._hits = self.profile.hits
+
+    def reset(self):
+        if hasattr(self, "profile"): # Not yet while Cpu.__init__ resets
+            self.profile.restart(self.cycles)
+        super().reset()
+
+    def step(self):
+        pc = self.pc
+        op = self.rom[pc]
+        self._hits[pc] += 1
+        source = self.interrupt_source
+        cycle = self.cycles
+        Cpu.step(self)
+        if _FRAME_OPS[op] or self.interrupt_source != source:
+            self.profile.transition(self, op, cycle, source)
+
+    def run(self, max_cycles=None, max_instructions=None, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True,
+            stimulus=None):
+        # Cpu.run with step() inlined, keeping the overhead of profiling per instruction low
+        flags = halt_flags(self.rom, sentinel, halt_at, halt_on_self_jump)
+        cycles_limit = sys.maxsize if max_cycles is None else self.cycles + max_cycles
+        remaining = sys.maxsize if max_instructions is None else max_instructions
+        step = super().step
+        rom = self.rom
+        hits = self._hits
+        transition = self.profile.transition
+
+        while True:
+            pc = self.pc
+            flag = flags[pc]
+            if flag & HALT_FLAG_SENTINEL:
+                reason = HALT_SENTINEL
+                break
+            if flag & HALT_FLAG_ADDRESS:
+                reason = HALT_ADDRESS
+                break
+            cycle = self.cycles
+            if remaining <= 0 or cycle >= cycles_limit:
+                reason = HALT_BUDGET
+                break
+
+            if stimulus is not None:
+                stimulus(self)
+            op = rom[pc]
+            hits[pc] += 1
+            source = self.interrupt_source
+            step()
+            remaining -= 1
+            if _FRAME_OPS[op] or self.interrupt_source != source:
+                transition(self, op, cycle, source)
+
+            if flag & HALT_FLAG_SELF_JUMP and self.pc == pc:
+                reason = HALT_SELF_JUMP
+                break
+
+        self.profile.charge(self.cycles)
+        return reason
+
+
+def read_program(path):
+    """Program of an assembly source, a raw .bin image or a $readmemh .hex image"""
+    if path.endswith(".s") or path.endswith(".asm"):
+        from .asm import assemble
+        with open(path) as stream:
+            return assemble(stream.read())
+    if path.endswith(".bin"):
+        with open(path, "rb") as stream:
+            return stream.read()
+    with open(path) as stream:
+        return bytes(int(word, 16) for line in stream for word in line.split("//")[0].split())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_iss.profile", description=__doc__.splitlines()[0])
+    parser.add_argument("program", help="assembly source (.s), raw image (.bin) or $readmemh image")
+    parser.add_argument("--max-cycles", type=int, default=1000000, help="cycles budget of the run")
+    parser.add_argument("--ext-int", type=int, default=0, choices=(0, 1), help="level of ext_int during the run")
+    parser.add_argument("--collapsed", help="collapsed stacks file to write, for flamegraph tools")
+    parser.add_argument("--limit", type=int, default=10, help="rows of every table")
+    args = parser.parse_args(argv)
+
+    cpu = ProfiledCpu(read_program(args.program))
+    cpu.ext_int = args.ext_int
+    reason = cpu.run(max_cycles=args.max_cycles)
+    print(f"Halted on {reason} at 0x{cpu.pc:03x}")
+    print(cpu.profile.report(args.limit))
+    if args.collapsed:
+        cpu.profile.write_collapsed(args.collapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
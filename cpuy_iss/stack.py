@@ -0,0 +1,42 @@
+"""Python mirror of stack.v"""
+
+from .isa import STACK_DEPTH
+
+
+class Stack:
+    """16 words LIFO, a push when full or a pop when empty is ignored like in the RTL.
+
+    As stack.v flags full at stack_ptr == DEPTH - 1, only 15 levels are usable.
+    """
+    __slots__ = ("mem", "ptr", "data_out")
+
+    def __init__(self):
+        self.mem = [0] * STACK_DEPTH
+        self.ptr = 0
+        self.data_out = 0
+
+    def reset(self):
+        self.ptr = 0
+        self.data_out = 0
+
+    @property
+    def full(self):
+        return self.ptr == STACK_DEPTH - 1
+
+    @property
+    def empty(self):
+        return self.ptr == 0
+
+    def push(self, data_in):
+        ptr = self.ptr
+        if ptr != STACK_DEPTH - 1:
+            self.mem[ptr] = data_in
+            self.ptr = ptr + 1
+
+    def pop(self):
+        ptr = self.ptr
+        if ptr:
+            ptr -= 1
+            self.ptr = ptr
+            self.data_out = self.mem[ptr]
+        return self.data_out
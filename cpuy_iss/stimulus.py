@@ -0,0 +1,106 @@
+"""Cycle-stamped schedules of the inputs of cpuy.v
+
+A Schedule holds events (cycle, input, value) sorted by cycle in three arrays.
+Cycles count clock cycles from the release of reset, input is one of EXT_INT,
+P0IN and P1IN. The same schedule drives the RTL through cpuy_tb.stimulus and
+the ISS through Player, which Cpu.run calls before every instruction.
+"""
+
+from array import array
+from bisect import bisect_right
+
+from .isa import CYCLES
+
+EXT_INT = 0
+P0IN = 1
+P1IN = 2
+INPUTS = ("ext_int", "p0in", "p1in") # Cpu attributes, the tb.v registers add a _tb suffix
+WIDTHS = (1, 8, 4)
+
+# RTL cycle of the first FETCHING_OPCODE, the CPU spends it and one more in RESETTING
+RESET_CYCLES = 2
+
+
+class Schedule:
+    """Events sorted by cycle, events of the same cycle keep the order they were added in"""
+
+    __slots__ = ("cycles", "inputs", "values")
+
+    def __init__(self, events=()):
+        self.cycles = array("Q")
+        self.inputs = array("B")
+        self.values = array("B")
+        for cycle, input, value in events:
+            self.add(cycle, input, value)
+
+    def add(self, cycle, input, value):
+        """Adds an event, input given by index or by INPUTS name with or without the _tb suffix of
+        recorded traces"""
+        if isinstance(input, str):
+            name = input[:-3] if input.endswith("_tb") else input
+            if name not in INPUTS:
+                raise ValueError(f"Unknown input {input!r}")
+            input = INPUTS.index(name)
+        elif not 0 <= input < len(INPUTS):
+            raise ValueError(f"Unknown input {input}")
+        if not 0 <= value < 1 << WIDTHS[input]:
+            raise ValueError(f"Value {value} does not fit {INPUTS[input]}")
+        cycles = self.cycles
+        if not cycles or cycle >= cycles[-1]:
+            cycles.append(cycle)
+            self.inputs.append(input)
+            self.values.append(value)
+        else:
+            index = bisect_right(cycles, cycle)
+            cycles.insert(index, cycle)
+            self.inputs.insert(index, input)
+            self.values.insert(index, value)
+
+    def pulse(self, cycle, width=1, input=EXT_INT):
+        """Raises input at cycle and clears it width cycles later"""
+        self.add(cycle, input, 1)
+        self.add(cycle + width, input, 0)
+
+    def shifted(self, cycles):
+        """Copy of the schedule with every event cycles later"""
+        schedule = Schedule()
+        schedule.cycles = array("Q", (cycle + cycles for cycle in self.cycles))
+        schedule.inputs = array("B", self.inputs)
+        schedule.values = array("B", self.values)
+        return schedule
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def __iter__(self):
+        return zip(self.cycles, self.inputs, self.values)
+
+    def __repr__(self):
+        return f"Schedule({len(self)} events)"
+
+
+class Player:
+    """Applies a schedule to the inputs of a Cpu.
+
+    Called before every step, it applies the events up to the EXECUTING edge of
+    the instruction about to execute, where cpuy.v samples ext_int, p0in and p1in.
+    """
+
+    __slots__ = ("schedule", "offset", "index")
+
+    def __init__(self, schedule, offset=RESET_CYCLES):
+        self.schedule = schedule
+        self.offset = offset
+        self.index = 0
+
+    def __call__(self, cpu):
+        schedule = self.schedule
+        cycles = schedule.cycles
+        index = self.index
+        if index == len(cycles):
+            return
+        sampled = cpu.cycles + CYCLES[cpu.rom[cpu.pc]] + self.offset
+        while index < len(cycles) and cycles[index] < sampled:
+            setattr(cpu, INPUTS[schedule.inputs[index]], schedule.values[index])
+            index += 1
+        self.index = index
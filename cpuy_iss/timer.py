@@ -0,0 +1,61 @@
+"""Python mirror of timer.v"""
+
+
+class Timer:
+    """16-bits timer advanced in closed form instead of one clock at a time.
+
+    The enable input is not kept here, the CPU only advances a timer while its
+    tmr_cfg enable bit is set.
+    """
+    __slots__ = ("counter", "org_count", "direction", "auto_reload", "overflow", "run")
+
+    def __init__(self):
+        self.counter = 0
+        self.org_count = 0
+        self.direction = 0 # 1 counts upwards
+        self.auto_reload = 0
+        self.overflow = 0
+        self.run = 0
+
+    def load(self, count, direction, auto_reload):
+        """Clock edge with the set input high"""
+        self.direction = direction
+        self.auto_reload = auto_reload
+        self.counter = count
+        self.org_count = count
+        self.overflow = 0
+        self.run = 1
+
+    def period(self):
+        """Clock edges between two overflows when autoreload is set"""
+        org_count = self.org_count
+        return ((-org_count) & 0xFFFF if self.direction else org_count) + 1
+
+    def edges_to_overflow(self):
+        """Clock edges until the edge that raises overflow, None if the timer is stopped"""
+        if not self.run:
+            return None
+        counter = self.counter
+        return ((-counter) & 0xFFFF if self.direction else counter) + 1
+
+    def advance(self, edges):
+        """Applies the given number of clock edges with set and done_ack low"""
+        if not self.run or edges <= 0:
+            return
+
+        counter = self.counter
+        # Edges before the counter reads zero, the following edge raises overflow
+        to_zero = (-counter) & 0xFFFF if self.direction else counter
+        if edges <= to_zero:
+            self.counter = (counter + edges) & 0xFFFF if self.direction else counter - edges
+            return
+
+        self.overflow = 1
+        remaining = edges - to_zero - 1
+        if self.auto_reload:
+            org_count = self.org_count
+            remaining %= self.period()
+            self.counter = (org_count + remaining) & 0xFFFF if self.direction else org_count - remaining
+        else:
+            self.counter = 0x0001 if self.direction else 0xFFFF
+            self.run = 0
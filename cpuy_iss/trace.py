@@ -0,0 +1,241 @@
+"""Binary traces of the port outputs and retired instructions of cpuy
+
+A trace holds two streams of (cycle, value) events: PORTS, every change of
+p0out, p1out, p0cfg and p1cfg, and RETIREMENTS, the state after every retired
+instruction. TraceWriter buffers events in arrays and appends them to the file
+in chunks, so a run of millions of cycles holds at most one chunk per stream
+in memory. Trace maps a file and reads its chunks in place:
+
+    with Trace("run.trace") as trace:
+        for cycle, port, value in trace.ports():
+            ...
+
+The file is a 16 bytes header, MAGIC and VERSION, followed by chunks: the
+stream and the count of events as 32 bits words padded to 16 bytes, then
+count 64 bits cycles and count 64 bits values, all little endian. A run
+killed while writing keeps the chunks written before.
+
+`python -m cpuy_iss.trace A [B]` prints the events of a trace, or the first
+event two traces differ in.
+"""
+
+import argparse
+import itertools
+import mmap
+import struct
+import sys
+import weakref
+from array import array
+
+from .isa import MNEMONICS
+
+MAGIC = b"CPUYTRC\0"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+CHUNK = struct.Struct("<II8x") # 8 bytes aligned cycles
+CHUNK_EVENTS = 4096
+
+PORTS = 0
+RETIREMENTS = 1
+STREAM_NAMES = ("ports", "retirements")
+
+PORT_NAMES = ("p0out", "p1out", "p0cfg", "p1cfg")
+
+
+def port_event(port, value):
+    return port << 8 | value
+
+
+def retirement_event(pc, op_code, w, flags):
+    return pc | op_code << 10 | w << 18 | flags << 26
+
+
+def decode_retirement(value):
+    """(pc, op_code, w, flags) of a RETIREMENTS value"""
+    return value & 0x3FF, value >> 10 & 0xFF, value >> 18 & 0xFF, value >> 26 & 0xFF
+
+
+class TraceWriter:
+    """Appends events to a trace file, one chunk per chunk_events events of a stream"""
+
+    def __init__(self, path, chunk_events=CHUNK_EVENTS):
+        self.path = path
+        self.chunk_events = chunk_events
+        self.events = [0] * len(STREAM_NAMES)
+        self._buffers = [(array("Q"), array("Q")) for _ in STREAM_NAMES]
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0))
+
+    def add(self, stream, cycle, value):
+        cycles, values = self._buffers[stream]
+        cycles.append(cycle)
+        values.append(value)
+        if len(cycles) >= self.chunk_events:
+            self._write(stream)
+
+    def _write(self, stream):
+        cycles, values = self._buffers[stream]
+        if not cycles:
+            return
+        if sys.byteorder != "little":
+            cycles.byteswap()
+            values.byteswap()
+        self._file.write(CHUNK.pack(stream, len(cycles)))
+        cycles.tofile(self._file)
+        values.tofile(self._file)
+        self.events[stream] += len(cycles)
+        del cycles[:]
+        del values[:]
+
+    def flush(self):
+        for stream in range(len(STREAM_NAMES)):
+            self._write(stream)
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trace:
+    """Memory-mapped trace file, its chunks read in place"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as stream:
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = {} # Weak references to the views of the mapping handed out, by id, released by close()
+        magic, version, _ = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} trace")
+
+        # (stream, offset of the cycles, count) of every complete chunk
+        self._chunks = []
+        offset = HEADER.size
+        size = len(self._map)
+        while offset + CHUNK.size <= size:
+            stream, count = CHUNK.unpack_from(self._map, offset)
+            end = offset + CHUNK.size + 16 * count
+            if end > size:
+                break
+            self._chunks.append((stream, offset + CHUNK.size, count))
+            offset = end
+
+    def close(self):
+        """Unmaps the file, views of chunks still held are released"""
+        for ref in list(self._views.values()):
+            view = ref()
+            if view is not None:
+                view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return sum(count for _, _, count in self._chunks)
+
+    def count(self, stream):
+        return sum(count for chunk_stream, _, count in self._chunks if chunk_stream == stream)
+
+    def chunks(self, stream):
+        """(cycles, values) of every chunk of stream, views of the mapping on little endian hosts, valid
+        until close()"""
+        for chunk_stream, offset, count in self._chunks:
+            if chunk_stream != stream:
+                continue
+            with memoryview(self._map) as mapping, mapping[offset:offset + 16 * count] as data:
+                if sys.byteorder == "little":
+                    cycles, values = data[:8 * count].cast("Q"), data[8 * count:].cast("Q")
+                    views = self._views
+                    for view in (cycles, values):
+                        views[id(view)] = weakref.ref(view, lambda _, key=id(view): views.pop(key, None))
+                else:
+                    cycles, values = array("Q", data[:8 * count]), array("Q", data[8 * count:])
+                    cycles.byteswap()
+                    values.byteswap()
+            yield cycles, values
+
+    def events(self, stream):
+        """(cycle, value) events of stream, in the order they were recorded"""
+        for cycles, values in self.chunks(stream):
+            yield from zip(cycles, values)
+
+    def ports(self):
+        """(cycle, port name, value) of every port change"""
+        for cycle, value in self.events(PORTS):
+            yield cycle, PORT_NAMES[value >> 8], value & 0xFF
+
+    def retirements(self):
+        """(cycle, pc, op_code, w, flags) of every retired instruction"""
+        for cycle, value in self.events(RETIREMENTS):
+            yield (cycle,) + decode_retirement(value)
+
+    def schedule(self, inputs):
+        """cpuy_iss.stimulus.Schedule replaying the port changes, inputs maps port names to the inputs
+        they drive, as {"p0out": "p0in"}"""
+        from .stimulus import Schedule
+        return Schedule((cycle, inputs[port], value) for cycle, port, value in self.ports() if port in inputs)
+
+
+def first_difference(a, b, stream):
+    """Index and events of a and b at the first event of stream they differ in, None if they are equal"""
+    for index, (event_a, event_b) in enumerate(itertools.zip_longest(a.events(stream), b.events(stream))):
+        if event_a != event_b:
+            return index, event_a, event_b
+    return None
+
+
+def _format(stream, event):
+    if event is None:
+        return "end of trace"
+    cycle, value = event
+    if stream == PORTS:
+        return f"cycle {cycle} {PORT_NAMES[value >> 8]} = 0x{value & 0xFF:02x}"
+    pc, op_code, w, flags = decode_retirement(value)
+    return (f"cycle {cycle} 0x{pc:03x} after {MNEMONICS[op_code] or 'NOP'} (0x{op_code:02x}) "
+            f"W 0x{w:02x} flags 0x{flags:02x}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_iss.trace", description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="trace to print")
+    parser.add_argument("other", nargs="?", help="trace to compare it with")
+    parser.add_argument("--limit", type=int, default=50, help="events printed per stream")
+    args = parser.parse_args(argv)
+
+    with Trace(args.trace) as trace:
+        if args.other is None:
+            for stream, name in enumerate(STREAM_NAMES):
+                print(f"{name}: {trace.count(stream)} events")
+                for event in itertools.islice(trace.events(stream), args.limit):
+                    print("  " + _format(stream, event))
+            return 0
+
+        with Trace(args.other) as other:
+            status = 0
+            for stream, name in enumerate(STREAM_NAMES):
+                difference = first_difference(trace, other, stream)
+                if difference is None:
+                    print(f"{name}: {trace.count(stream)} events, equal")
+                    continue
+                index, event_a, event_b = difference
+                print(f"{name}: event {index} differs\n  {args.trace}: {_format(stream, event_a)}\n"
+                      f"  {args.other}: {_format(stream, event_b)}")
+                status = 1
+            return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
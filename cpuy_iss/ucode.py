@@ -0,0 +1,163 @@
+"""Packed decode table of ucode.v, extracted from the RTL
+
+The table holds one 32 bits word per opcode in an array("I"): the outputs of
+ucode.v but jump_condition, in FIELDS order from bit 0, then jump_condition as
+a CONDITION_* kind and the bit of W it tests. cpuy_tb.ucode extracts it by
+simulating every opcode x W x flags on tb_ucode.v and caches it in the ucode
+kind of cpuy_iss.cache, keyed on ucode.v and VERSION, so a table is never read
+for microcode it was not extracted from:
+
+    table = load_table() # None until python -m cpuy_tb.ucode extracted it
+    if field(table[op], "ram_operand"): ...
+    taken = jump_condition(table[op], w, flags)
+"""
+
+import os
+import sys
+from array import array
+
+from . import cache
+from .isa import CARRY, SIGN, ZERO
+
+VERSION = 1
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ucode.v")
+
+# (output, width) of ucode.v from bit 0, the order tb_ucode.v packs them in
+FIELDS = (("alu_operation", 1), ("alu_multibyte_result", 1), ("jump_operation", 1), ("mov_operation", 1),
+          ("destination_w", 1), ("destination_flags", 1), ("destination_memory", 1),
+          ("destination_registers", 1), ("destination_ports", 1), ("destination_index", 3), ("ram_operand", 1),
+          ("duplicate_w", 1), ("source_ports", 1), ("source_registers", 1), ("stack_operation", 1),
+          ("stack_direction", 1), ("destination_cpu_config", 1), ("destination_timer_config", 1),
+          ("destination_ports_config", 1), ("source_operands", 1))
+
+
+def _layout():
+    shifts, shift = {}, 0
+    for name, width in FIELDS:
+        shifts[name] = shift
+        shift += width
+    return shifts, shift
+
+
+SHIFTS, CONTROLS_WIDTH = _layout()
+MASKS = {name: (1 << width) - 1 for name, width in FIELDS}
+CONTROLS_MASK = (1 << CONTROLS_WIDTH) - 1
+
+# jump_condition of an opcode, as a function of W and the flags
+CONDITION_NEVER = 0
+CONDITION_ALWAYS = 1
+CONDITION_CARRY = 2
+CONDITION_ZERO = 3
+CONDITION_SIGN = 4
+CONDITION_W_CLEAR = 5 # The bit of W in the word is 0
+CONDITION_W_SET = 6
+CONDITION_NAMES = ("never", "always", "carry", "zero", "sign", "w clear", "w set")
+CONDITION_SHIFT = CONTROLS_WIDTH
+CONDITION_BIT_SHIFT = CONDITION_SHIFT + 3
+
+# Inputs of jump_condition swept for every opcode, indexed by W << 3 | flags
+INPUTS = 256 * 8
+
+
+def condition(kind, bit, w, flags):
+    """jump_condition of a CONDITION_* kind for W and the CARRY/ZERO/SIGN flags"""
+    if kind == CONDITION_NEVER:
+        return False
+    if kind == CONDITION_ALWAYS:
+        return True
+    if kind == CONDITION_CARRY:
+        return bool(flags & CARRY)
+    if kind == CONDITION_ZERO:
+        return bool(flags & ZERO)
+    if kind == CONDITION_SIGN:
+        return bool(flags & SIGN)
+    return bool((w >> bit) & 1) == (kind == CONDITION_W_SET)
+
+
+def truth_table(kind, bit=0):
+    """jump_condition of kind for every input, bit n of an int is input n"""
+    return sum(condition(kind, bit, index >> 3, index & 7) << index for index in range(INPUTS))
+
+
+def _conditions():
+    kinds = [(kind, 0) for kind in (CONDITION_NEVER, CONDITION_ALWAYS, CONDITION_CARRY, CONDITION_ZERO,
+                                     CONDITION_SIGN)]
+    kinds += [(kind, bit) for kind in (CONDITION_W_CLEAR, CONDITION_W_SET) for bit in range(8)]
+    return {truth_table(kind, bit): (kind, bit) for kind, bit in kinds}
+
+
+_CONDITIONS = _conditions()
+
+
+def classify(truth):
+    """(kind, bit) of the jump_condition truth table of an opcode, ValueError if no CONDITION_* matches"""
+    try:
+        return _CONDITIONS[truth]
+    except KeyError:
+        raise ValueError(f"jump_condition {truth:#x} is not a CONDITION_* of W and the flags, "
+                         f"bump cpuy_iss.ucode.VERSION with a new kind") from None
+
+
+def pack(controls, truth):
+    """Decode word of an opcode from its packed outputs and jump_condition truth table"""
+    if controls & ~CONTROLS_MASK:
+        raise ValueError(f"Outputs {controls:#x} wider than the {CONTROLS_WIDTH} bits of FIELDS")
+    kind, bit = classify(truth)
+    return controls | kind << CONDITION_SHIFT | bit << CONDITION_BIT_SHIFT
+
+
+def field(word, name):
+    """Value of a FIELDS output in a decode word"""
+    return (word >> SHIFTS[name]) & MASKS[name]
+
+
+def fields(word):
+    """Dict of the FIELDS outputs of a decode word"""
+    return {name: field(word, name) for name, _ in FIELDS}
+
+
+def jump_kind(word):
+    """(CONDITION_* kind, bit of W) of a decode word"""
+    return (word >> CONDITION_SHIFT) & 0b111, (word >> CONDITION_BIT_SHIFT) & 0b111
+
+
+def jump_condition(word, w, flags):
+    """jump_condition of ucode.v for the opcode of word, W and the CARRY/ZERO/SIGN flags"""
+    return condition(*jump_kind(word), w, flags)
+
+
+def to_bytes(table):
+    """Little endian 32 bits words of a table"""
+    words = array("I", table)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return words.tobytes()
+
+
+def from_bytes(data):
+    """Table, an array("I") of 256 words, of to_bytes output"""
+    if len(data) != 256 * 4:
+        raise ValueError(f"Decode table of {len(data)} bytes, desired {256 * 4}")
+    words = array("I")
+    words.frombytes(data)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return words
+
+
+def key(source=SOURCE):
+    """Cache key of the table of the microcode in source"""
+    with open(source, "rb") as stream:
+        return cache.digest("ucode", str(VERSION), stream.read())
+
+
+def load_table(source=SOURCE):
+    """Cached table of the microcode in source, None when it was not extracted yet"""
+    data = cache.load("ucode", key(source))
+    return None if data is None else from_bytes(data)
+
+
+def store_table(table, source=SOURCE):
+    """Caches the table of the microcode in source, returns its path"""
+    return cache.store("ucode", key(source), to_bytes(table))
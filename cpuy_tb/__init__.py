@@ -0,0 +1,4 @@
+from .rom import ROM_SIZE, SENTINEL, RomDriver, RomResult, rom_image
+from .inject import fast_forward, inject
+from .native import NativeRom
+from .table import Program, run_programs
@@ -0,0 +1,173 @@
+"""Simulation builds cached by content
+
+A build is keyed on the SHA-256 of the Verilog sources, defines, toplevels,
+simulator version and compile commands, and lives in the build kind of the
+cpuy_iss.cache directory. Runs and workers needing the same design share the
+compiled simulation, so changes to the tests alone never recompile the RTL:
+
+    python -m cpuy_tb.build --waves    # Prints the build directory
+
+Builds with waves include waves.v, the windowed waveform capture driven by
+cpuy_tb.waves, and Verilator builds then compile in FST (or VCD) tracing.
+`--toplevel tb_rom` builds the native toplevel of cpuy_tb.native instead of tb,
+`--toplevel tb_alu` the ALU toplevel of test/test_cpuy_alu.py and `--toplevel
+tb_ucode` the microcode toplevel of cpuy_tb.ucode.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import cocotb
+import cocotb.config
+
+from cpuy_iss import cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPLEVEL = "tb"
+# tb with its clock and ROM in the HDL, see cpuy_tb.native
+NATIVE_TOPLEVEL = "tb_rom"
+# 256 alu instances of the exhaustive ALU sweep
+ALU_TOPLEVEL = "tb_alu"
+# 256 ucode instances decoding every opcode, see cpuy_tb.ucode
+UCODE_TOPLEVEL = "tb_ucode"
+VERILOG_SOURCES = ("tb_rom.v", "tb_alu.v", "tb_ucode.v", "tb.v", "cpuy.v", "alu.v", "stack.v", "timer.v",
+                   "ucode.v")
+# Verilator configuration waiving the known RTL warnings, any other warning fails the build
+LINT_WAIVERS = "cpuy.vlt"
+# Waveform capture: the module, the define instantiating it in tb.v and the Verilator tracing switch
+WAVES_SOURCE = "waves.v"
+WAVES_DEFINE = "CPUY_WAVES"
+WAVES_VCD_DEFINE = "CPUY_WAVES_VCD"
+WAVES_VERILATOR = "waves.cpp"
+
+# Placeholder of the build directory in the commands hashed into the key
+_BUILD_DIR = "{build_dir}"
+
+_VERSION_COMMANDS = {"icarus": ["iverilog", "-V"], "verilator": ["verilator", "--version"]}
+
+
+def build_command(sim, build_dir, sources, toplevels=(TOPLEVEL,), defines=()):
+    """Commands compiling sources into build_dir"""
+    define_args = [f"-D{define}" for define in defines]
+    if sim == "icarus":
+        toplevel_args = [arg for toplevel in toplevels for arg in ("-s", toplevel)]
+        return [["iverilog", "-o", os.path.join(build_dir, "sim.vvp"), *toplevel_args, "-g2012", *define_args,
+                 *sources]]
+    if sim == "verilator":
+        if len(toplevels) != 1:
+            raise ValueError(f"Verilator builds a single toplevel, got {', '.join(toplevels)}")
+        verilator_cpp = os.path.join(cocotb.config.share_dir, "lib", "verilator", "verilator.cpp")
+        libs_dir = cocotb.config.libs_dir
+        trace_args = []
+        if WAVES_DEFINE in defines:
+            trace_args = ["--trace" if WAVES_VCD_DEFINE in defines else "--trace-fst"]
+        return [["verilator", "-cc", "--exe", "-Mdir", build_dir, "-DCOCOTB_SIM=1", "--top-module", toplevels[0],
+                 "--vpi", "--public-flat-rw", "--prefix", "Vtop", "-o", "Vtop", "--timing", *trace_args,
+                 "-LDFLAGS", f"-Wl,-rpath,{libs_dir} -L{libs_dir} -lcocotbvpi_verilator", *define_args,
+                 verilator_cpp, *sources],
+                ["make", "-s", "-C", build_dir, "-f", "Vtop.mk", f"-j{os.cpu_count()}"]]
+    raise ValueError(f"Unsupported simulator {sim}")
+
+
+def test_command(sim, build_dir):
+    """Command running the simulation compiled in build_dir"""
+    if sim == "icarus":
+        return ["vvp", "-M", cocotb.config.libs_dir, "-m", "libcocotbvpi_icarus",
+                os.path.join(build_dir, "sim.vvp"), "-fst"]
+    return [os.path.join(build_dir, "Vtop")]
+
+
+def simulator_version(sim):
+    """First line of the simulator version output, empty when it is not installed"""
+    try:
+        output = subprocess.run(_VERSION_COMMANDS[sim], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True).stdout
+    except OSError:
+        return ""
+    return output.splitlines()[0] if output else ""
+
+
+def with_waves(sources=VERILOG_SOURCES, defines=(), waves="fst"):
+    """Sources and defines of a build with the waveform capture, writing waves, fst or vcd (Verilator only)"""
+    return ((WAVES_SOURCE,) + tuple(sources),
+            tuple(defines) + (WAVES_DEFINE,) + ((WAVES_VCD_DEFINE,) if waves == "vcd" else ()))
+
+
+def simulator_sources(sim, sources, defines=()):
+    """Files compiled by sim for sources, the lint waivers come first in Verilator builds"""
+    if sim != "verilator":
+        return tuple(sources)
+    return (LINT_WAIVERS,) + tuple(sources) + ((WAVES_VERILATOR,) if WAVES_DEFINE in defines else ())
+
+
+def build_key(sim, sources=VERILOG_SOURCES, toplevels=(TOPLEVEL,), defines=()):
+    """Cache key of the build of sources, relative to the repository root"""
+    sources = simulator_sources(sim, sources, defines)
+    parts = [sim, simulator_version(sim), cocotb.__version__,
+             repr(build_command(sim, _BUILD_DIR, sources, toplevels, defines))]
+    for source in sources:
+        with open(os.path.join(ROOT, source), "rb") as stream:
+            parts += [source, stream.read()]
+    return cache.digest(*parts)
+
+
+def build(sim="icarus", sources=VERILOG_SOURCES, toplevels=(TOPLEVEL,), defines=(), force=False):
+    """Directory of the compiled simulation, compiled only when no identical build is cached.
+
+    The build runs in a temporary directory renamed to its cache entry when it
+    succeeds, so a concurrent run never picks up a partial build, and the loser
+    of two identical concurrent builds discards its own.
+    """
+    toplevels, defines = tuple(toplevels), tuple(defines)
+    build_dir = cache.path("build", build_key(sim, sources, toplevels, defines))
+    if os.path.isdir(build_dir):
+        if not force:
+            return build_dir
+        shutil.rmtree(build_dir)
+
+    parent = os.path.dirname(build_dir)
+    os.makedirs(parent, exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=parent, prefix=".tmp")
+    try:
+        with open(os.path.join(temporary, "build.log"), "w") as log:
+            for command in build_command(sim, temporary, [os.path.join(ROOT, source)
+                                                          for source in simulator_sources(sim, sources, defines)],
+                                         toplevels, defines):
+                if subprocess.run(command, cwd=temporary, stdout=log, stderr=subprocess.STDOUT).returncode:
+                    failed = os.path.join(ROOT, "sim_build", "build.log")
+                    os.makedirs(os.path.dirname(failed), exist_ok=True)
+                    shutil.copyfile(log.name, failed)
+                    raise SystemExit(f"Build failed, see {failed}")
+        try:
+            os.rename(temporary, build_dir)
+        except OSError:
+            if not os.path.isdir(build_dir):
+                raise
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+    return build_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_tb.build", description=__doc__.splitlines()[0])
+    parser.add_argument("--sim", default=os.environ.get("SIM", "icarus"), choices=("icarus", "verilator"))
+    parser.add_argument("--waves", nargs="?", const="fst", choices=("fst", "vcd"),
+                        help="add the waveform capture of cpuy_tb.waves, in FST by default (VCD: Verilator only)")
+    parser.add_argument("--toplevel", default=TOPLEVEL, choices=(TOPLEVEL, NATIVE_TOPLEVEL, ALU_TOPLEVEL,
+                                                                     UCODE_TOPLEVEL))
+    parser.add_argument("-D", dest="defines", action="append", default=[], help="Verilog define, e.g. -DNAME=1")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the build is cached")
+    args = parser.parse_args(argv)
+
+    sources, defines = VERILOG_SOURCES, args.defines
+    if args.waves:
+        sources, defines = with_waves(sources, defines, args.waves)
+    print(build(args.sim, sources, (args.toplevel,), defines, args.force))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
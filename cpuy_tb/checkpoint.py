@@ -0,0 +1,189 @@
+"""Checkpoints of RTL runs, and replay of the interval where they leave cpuy_iss
+
+A CheckpointRecorder reads the architectural state of cpuy into a
+cpuy_iss.checkpoint.Snapshot when it starts, RAM included as a reset leaves it
+unchanged, then every `interval` retired instructions. It reads
+the state when the retired instructions ring of tb.v wakes it up, once per 8
+instructions, so the run itself is simulated at full speed; the wakeup comes
+one clock edge after the last retirement, so a snapshot waits for the
+instruction in flight to retire. Snapshots can be written to a file when a
+long run fails:
+
+    recorder = CheckpointRecorder(dut, program, interval=1024)
+    recorder.start()            # While in reset, or between instructions
+    await RomDriver(dut, program).run()
+    recorder.stop()
+    write("run.ckp", recorder.snapshots)
+
+replay_divergence() runs the ISS from the first snapshot to the instruction
+counts of the others and finds the first snapshot that differs. It then injects the last matching
+state into the RTL and replays only the instructions up to that snapshot,
+with the lockstep scoreboard, and optionally a waveform capture and a
+retirement trace, so the cost of finding the first divergent instruction is
+that of one interval:
+
+    divergence = await replay_divergence(dut, program, read("run.ckp"))
+    if divergence is not None:
+        print(divergence.message)
+"""
+
+import cocotb
+from cocotb.triggers import ReadOnly, RisingEdge
+
+from cpuy_iss import Cpu
+from cpuy_iss.checkpoint import differences, first_divergence, record, snapshot
+from cpuy_iss.isa import FETCHING_OPCODE, RESETTING
+
+from .inject import capture, inject
+from .retired import CYCLE_MASK, CYCLE_SHIFT, RetiredRing
+from .rom import RomDriver
+from .scoreboard import Scoreboard, ScoreboardError
+from .table import reset
+from .trace import TraceRecorder
+
+# Cycles a replay runs past the end of its interval
+REPLAY_MARGIN = 64
+
+
+class CheckpointRecorder:
+    """Snapshots of the RTL every interval retired instructions, counted from start()"""
+
+    def __init__(self, dut, program, interval=1024):
+        self.dut = dut
+        self.interval = interval
+        self.snapshots = []
+        self.retired = 0
+        self.cycles = 0
+
+        # Cpu the state is captured into
+        self._program = program
+        self._cpu = Cpu(program)
+        self._ring = RetiredRing(dut)
+        self._cpu_state = dut.cpuy.cpu_state
+        self._rising_edge = RisingEdge(dut.clk_tb)
+        self._task = None
+
+    def start(self):
+        """Starts recording, the RTL must be in reset or between instructions. The first snapshot is the
+        state the run starts from, in reset the reset state with the RAM, registers and timers of the RTL"""
+        state = self._cpu_state.value
+        if not state.is_resolvable or state.integer not in (RESETTING, FETCHING_OPCODE):
+            raise ValueError(f"Checkpoints started with cpu_state {state}, not between instructions")
+        cpu = self._cpu
+        capture(self.dut, cpu)
+        if state.integer == RESETTING:
+            # RAM, registers and timers survive a reset, tmr_cfg is cleared so the timers hold still
+            cpu, captured = Cpu(self._program), cpu
+            cpu.ram[:] = captured.ram
+            cpu.registers[:] = captured.registers
+            cpu.tmr0, cpu.tmr1 = captured.tmr0, captured.tmr1
+            self._cpu = cpu
+        cpu.instructions = 0
+        cpu.cycles = 0
+        self.snapshots = [snapshot(cpu)]
+        self.retired = 0
+        self.cycles = 0
+        self._next = self.interval
+        self._last_cycle = None # Of the last entry read, the first one recorded is the starting state
+        self._ring.sync()
+        self._task = cocotb.start_soon(self._monitor())
+
+    def stop(self):
+        """Stops recording, the instructions retired since the last wakeup get no snapshot"""
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+
+    async def _monitor(self):
+        while True:
+            await self._ring.wait()
+            self._drain()
+            # The instruction in flight completes the interval
+            if self.retired + 1 >= self._next:
+                await self._capture()
+
+    def _drain(self):
+        for entry in self._ring.read():
+            if not entry.is_resolvable:
+                continue
+            cycle = (entry.integer >> CYCLE_SHIFT) & CYCLE_MASK
+            if self._last_cycle is not None:
+                self.retired += 1
+                self.cycles += (cycle - self._last_cycle) & CYCLE_MASK
+            self._last_cycle = cycle
+
+    async def _capture(self):
+        """Snapshot once the instruction in flight retires, the RTL holds its state in FETCHING_OPCODE"""
+        cycles = 1 # The edge leaving FETCHING_OPCODE ends the instruction
+        while True:
+            await self._rising_edge
+            await ReadOnly()
+            cycles += 1
+            if self._cpu_state.value.integer == FETCHING_OPCODE:
+                break
+        cpu = self._cpu
+        capture(self.dut, cpu)
+        cpu.instructions = self.retired + 1
+        cpu.cycles = self.cycles + cycles
+        self.snapshots.append(snapshot(cpu))
+        self._next = cpu.instructions - cpu.instructions % self.interval + self.interval
+
+
+class Divergence:
+    """First snapshot of an RTL run differing from the ISS and the result of replaying its interval"""
+
+    __slots__ = ("index", "start", "end", "fields", "message", "retired")
+
+    def __init__(self, index, start, end, fields, message, retired):
+        self.index = index # Of the first differing snapshot
+        self.start = start # Last matching Snapshot
+        self.end = end # First differing Snapshot of the RTL
+        self.fields = fields # Fields it differs in
+        self.message = message # Of the scoreboard, at the first divergent instruction
+        self.retired = retired # Instructions replayed
+
+    def __repr__(self):
+        return (f"Divergence(snapshot {self.index}, instructions {self.start.instructions} to "
+                f"{self.end.instructions}: {self.message})")
+
+
+async def replay_divergence(dut, program, snapshots, reference=None, ext_int=0, waves=None, trace=None, **halt):
+    """Divergence of the snapshots of an RTL run of program, None when the ISS reaches the same states.
+    The ISS starts from the first snapshot and runs reference, program by default, with ext_int held
+    and halt, the halt conditions of the run (sentinel, halt_at, halt_on_self_jump). The interval is
+    replayed on the RTL with the scoreboard, waves a cpuy_tb.waves.Waves capturing its first divergence
+    and trace the path of a cpuy_iss.trace file of its retirements"""
+    model = program if reference is None else reference
+    cpu = Cpu(model)
+    cpu.ext_int = ext_int
+    snapshots[0].restore(cpu)
+    expected = snapshots[:1] + record(cpu, [entry.instructions for entry in snapshots[1:]], **halt)
+    index = first_divergence(snapshots, expected)
+    if index is None:
+        return None
+    start = expected[index - 1]
+    end = snapshots[index]
+    fields = differences(end, expected[index]) if index < len(expected) else ["instructions"]
+
+    await reset(dut)
+    dut.ext_int_tb.value = ext_int
+    cpu = Cpu(model)
+    cpu.ext_int = ext_int
+    start.restore(cpu)
+    await inject(dut, cpu)
+    scoreboard = Scoreboard(dut, cpu, waves)
+    scoreboard.start()
+    recorder = None
+    if trace is not None:
+        recorder = TraceRecorder(dut, trace, retirements=True)
+        recorder.start()
+    await RomDriver(dut, program, max_cycles=end.cycles - start.cycles + REPLAY_MARGIN, **halt).run()
+    if recorder is not None:
+        recorder.stop()
+    try:
+        scoreboard.finish()
+    except ScoreboardError as error:
+        message = str(error)
+    else:
+        message = f"No divergent instruction replaying, snapshot {index} differs in {', '.join(fields)}"
+    return Divergence(index, start, end, fields, message, scoreboard.retired)
@@ -0,0 +1,316 @@
+"""Functional coverage of the cpuy instance
+
+The collector reads the retired instructions recorded by tb.v through
+cpuy_tb.retired, so it costs one wakeup per 8 instructions, and counts them
+into preallocated NumPy bins:
+
+- opcode x cpu_state: the states of cpuy.v every opcode went through
+- cpu_state transitions
+- opcode x S, Z, C flags, for the ALU operations
+- timer overflows by timer, count direction and autoreload
+- stack depth when an instruction retires
+- interruptions taken, by source
+
+With $CPUY_COVERAGE set to a directory, the first reset of a simulation starts
+a collector that writes a <uuid>.cov file there when the simulation ends.
+`python -m cpuy_tb.regress --coverage DIR` sets it for every shard, and this
+module merges any number of files and reports the coverage holes:
+
+    python -m cpuy_tb.coverage sim_build/coverage [-o merged.cov]
+
+NumPy is only needed by this module, cpuy_tb itself does not import it.
+"""
+
+import argparse
+import atexit
+import functools
+import glob
+import os
+import sys
+import time
+import uuid
+
+import cocotb
+import numpy as np
+
+from cpuy_iss.alu import OPERATIONS
+from cpuy_iss.isa import (EXECUTING, FETCHING_OPCODE, FETCHING_OPERANDS, INTERRUPT_REDIRECTION, MNEMONICS, NOP,
+                          OPERAND_COUNT, POPPING_STACK, RESETTING, RET, STACK_DEPTH, STATE_NAMES)
+
+from .retired import ALU_SHIFT, OP_CODE_SHIFT, OVERFLOWS_SHIFT, STATE_FIELDS, STATES_SHIFT, RetiredRing
+
+# Name and shape of every group of bins, in file order
+BINS = (("opcode_state", (256, len(STATE_NAMES))),
+        ("transitions", (len(STATE_NAMES), len(STATE_NAMES))),
+        ("alu_flags", (256, 8)),
+        ("timer_overflow", (2, 2, 2)), # Timer, direction, autoreload
+        ("stack_depth", (STACK_DEPTH,)),
+        ("interrupts", (4,)))
+SIZE = sum(int(np.prod(shape)) for _, shape in BINS)
+
+MAGIC = b"CPUYCOV1"
+
+# Transitions of the state machine of cpuy.v
+TRANSITIONS = ((RESETTING, FETCHING_OPCODE), (FETCHING_OPCODE, FETCHING_OPERANDS), (FETCHING_OPCODE, POPPING_STACK),
+               (FETCHING_OPCODE, EXECUTING), (FETCHING_OPERANDS, EXECUTING), (POPPING_STACK, EXECUTING),
+               (EXECUTING, FETCHING_OPCODE), (EXECUTING, INTERRUPT_REDIRECTION),
+               (INTERRUPT_REDIRECTION, FETCHING_OPCODE))
+
+
+def _field_shifts():
+    shifts = {}
+    shift = 0
+    for name, width in STATE_FIELDS:
+        shifts[name] = shift
+        shift += width
+    return shifts
+
+
+_SHIFTS = _field_shifts()
+_FLAGS_SHIFT = _SHIFTS["flags"]
+_TMR_CFG_SHIFT = _SHIFTS["tmr_cfg"]
+_SOURCE_SHIFT = _SHIFTS["interrupt_source"]
+
+
+def _visits():
+    """States and transitions of every mask of visited states, the states of an instruction come in order"""
+    visits = []
+    for mask in range(1 << len(STATE_NAMES)):
+        states = tuple(state for state in range(len(STATE_NAMES)) if mask >> state & 1)
+        visits.append((states, tuple(zip(states, states[1:] + (FETCHING_OPCODE,)))))
+    return tuple(visits)
+
+
+_VISITS = _visits()
+
+
+def _format_flags(flags):
+    return "".join(letter if flags >> bit & 1 else "-" for bit, letter in ((2, "S"), (1, "Z"), (0, "C")))
+
+
+def _opcode(op):
+    return f"{MNEMONICS[op] or 'NOP'} ({op:#04x})"
+
+
+@functools.lru_cache(maxsize=None)
+def reachable_alu_flags():
+    """{opcode: S, Z, C flag values the ALU model of cpuy_iss can produce} of the ALU operations"""
+    flags_of = {}
+    reachable = {}
+    for op, operation in enumerate(OPERATIONS):
+        if operation is OPERATIONS[NOP]:
+            continue
+        if operation not in flags_of:
+            # Only the 2 operands operations read op2
+            second = range(256) if op & 0x80 else (0,)
+            flags_of[operation] = frozenset(operation(op1, op2, carry)[2] & 7 for op1 in range(256)
+                                            for op2 in second for carry in (0, 1))
+        reachable[op] = flags_of[operation]
+    return reachable
+
+
+class Coverage:
+    """Counters of every bin, one array of SIZE counts viewed as the BINS arrays"""
+
+    def __init__(self, counts=None):
+        self.counts = np.zeros(SIZE, np.uint64) if counts is None else counts
+        offset = 0
+        for name, shape in BINS:
+            size = int(np.prod(shape))
+            setattr(self, name, self.counts[offset:offset + size].reshape(shape))
+            offset += size
+
+    def __iadd__(self, other):
+        self.counts += other.counts
+        return self
+
+    def add(self, entry):
+        """Counts one entry of the ring of retired instructions"""
+        states = (entry >> STATES_SHIFT) & 0x3F
+        if states & (1 << RESETTING):
+            self.transitions[RESETTING, FETCHING_OPCODE] += 1
+            return
+
+        op = (entry >> OP_CODE_SHIFT) & 0xFF
+        visited, transitions = _VISITS[states]
+        for state in visited:
+            self.opcode_state[op, state] += 1
+        for transition in transitions:
+            self.transitions[transition] += 1
+
+        if entry >> ALU_SHIFT & 1:
+            self.alu_flags[op, (entry >> _FLAGS_SHIFT) & 7] += 1
+
+        overflows = (entry >> OVERFLOWS_SHIFT) & 3
+        if overflows:
+            tmr_cfg = (entry >> _TMR_CFG_SHIFT) & 0xFF
+            for timer in range(2):
+                if overflows >> timer & 1:
+                    config = tmr_cfg >> (4 * timer)
+                    self.timer_overflow[timer, (config >> 1) & 1, (config >> 2) & 1] += 1
+
+        self.stack_depth[entry & (STACK_DEPTH - 1)] += 1
+        if states & (1 << INTERRUPT_REDIRECTION):
+            self.interrupts[(entry >> _SOURCE_SHIFT) & 3] += 1
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as stream:
+            stream.write(MAGIC)
+            stream.write(self.counts.astype("<u8").tobytes())
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "rb") as stream:
+            data = stream.read()
+        if data[:len(MAGIC)] != MAGIC or len(data) != len(MAGIC) + 8 * SIZE:
+            raise ValueError(f"{path} is not a coverage file of this version")
+        return cls(np.frombuffer(data, "<u8", offset=len(MAGIC)).astype(np.uint64))
+
+    @classmethod
+    def merge(cls, paths):
+        merged = cls()
+        for path in paths:
+            merged += cls.read(path)
+        return merged
+
+    def holes(self):
+        """{group of bins: (bins hit, bins reachable, descriptions of the reachable bins never hit)}"""
+        holes = {}
+
+        missing = []
+        hit = total = 0
+        for state, name in enumerate(STATE_NAMES):
+            if state == RESETTING:
+                continue
+            ops = [op for op in range(256) if state != FETCHING_OPERANDS or OPERAND_COUNT[op]]
+            ops = [op for op in ops if state != POPPING_STACK or op == RET]
+            never = [op for op in ops if not self.opcode_state[op, state]]
+            hit += len(ops) - len(never)
+            total += len(ops)
+            missing.extend(f"{name}: {_opcode(op)}" for op in never)
+        holes["opcode_state"] = (hit, total, missing)
+
+        missing = [f"{STATE_NAMES[a]} -> {STATE_NAMES[b]}" for a, b in TRANSITIONS if not self.transitions[a, b]]
+        holes["transitions"] = (len(TRANSITIONS) - len(missing), len(TRANSITIONS), missing)
+
+        missing = []
+        total = 0
+        for op, reachable in reachable_alu_flags().items():
+            total += len(reachable)
+            missing.extend(f"{_opcode(op)}: {_format_flags(flags)}" for flags in sorted(reachable)
+                           if not self.alu_flags[op, flags])
+        holes["alu_flags"] = (total - len(missing), total, missing)
+
+        missing = [f"Timer {timer} {('down', 'up')[direction]}, {('no autoreload', 'autoreload')[autoreload]}"
+                   for timer in range(2) for direction in range(2) for autoreload in range(2)
+                   if not self.timer_overflow[timer, direction, autoreload]]
+        holes["timer_overflow"] = (8 - len(missing), 8, missing)
+
+        missing = [f"depth {depth}" for depth in range(STACK_DEPTH) if not self.stack_depth[depth]]
+        holes["stack_depth"] = (STACK_DEPTH - len(missing), STACK_DEPTH, missing)
+
+        missing = [f"source {source}" for source in range(1, 4) if not self.interrupts[source]]
+        holes["interrupts"] = (3 - len(missing), 3, missing)
+        return holes
+
+    def report(self, limit=20):
+        """Bins hit per group and up to limit holes of each"""
+        lines = [f"{int(self.opcode_state[:, FETCHING_OPCODE].sum())} instructions"]
+        for name, (hit, total, missing) in self.holes().items():
+            lines.append(f"{name:<16} {hit:>5} / {total:<5} {100 * hit / total:5.1f}%")
+            for hole in missing[:limit]:
+                lines.append(f"    {hole}")
+            if len(missing) > limit:
+                lines.append(f"    ... {len(missing) - limit} more")
+        return "\n".join(lines)
+
+
+class Collector:
+    """Counts the instructions the RTL retires into a Coverage"""
+
+    def __init__(self, dut, coverage=None):
+        self.coverage = Coverage() if coverage is None else coverage
+        self._ring = RetiredRing(dut)
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._ring.sync()
+        self._task = cocotb.start_soon(self._monitor())
+
+    def stop(self):
+        """Stops the collector, counting the instructions retired since its last wakeup"""
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+            self._drain()
+
+    def _drain(self):
+        add = self.coverage.add
+        for entry in self._ring.read():
+            if entry.is_resolvable:
+                add(entry.integer)
+
+    async def _monitor(self):
+        while True:
+            await self._ring.wait()
+            self._drain()
+
+
+_collector = None
+
+
+def collect(dut, directory=None):
+    """Starts the collector of this simulation, writing to directory ($CPUY_COVERAGE) at exit.
+
+    cocotb kills it at the end of every test, so every test calls it again, which counts the last
+    retirements of the previous test; those of the last test of the simulation are lost.
+    """
+    global _collector
+    directory = directory or os.environ.get("CPUY_COVERAGE")
+    if not directory:
+        return None
+    if _collector is None:
+        _collector = Collector(dut)
+        atexit.register(_collector.coverage.write, os.path.join(directory, uuid.uuid4().hex + ".cov"))
+    if not _collector.running:
+        # Killed at the end of the previous test, its retirements since the last wakeup are in the ring
+        _collector.stop()
+        _collector.start()
+    return _collector
+
+
+def coverage_files(paths):
+    """.cov files of the given files and directories"""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.cov"))) if os.path.isdir(path) else [path])
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_tb.coverage", description="Merges coverage files and "
+                                     "reports the coverage holes")
+    parser.add_argument("paths", nargs="+", help=".cov files, or directories holding them")
+    parser.add_argument("-o", "--output", help="merged coverage file to write")
+    parser.add_argument("--limit", type=int, default=20, help="holes listed per group of bins")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    files = coverage_files(args.paths)
+    if not files:
+        parser.exit(1, "No coverage files found\n")
+    merged = Coverage.merge(files)
+    if args.output:
+        merged.write(args.output)
+    print(f"{len(files)} coverage files merged in {time.perf_counter() - start:.2f} s")
+    print(merged.report(args.limit))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
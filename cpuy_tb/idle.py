@@ -0,0 +1,81 @@
+"""Idle loop fast-forward of RomDriver
+
+Interruption tests spend most of their cycles spinning in a Jmp to itself, or
+a few NOPs and a Jmp back (cpuy_iss.isa.idle_loops), while a timer counts its
+16 bits down. When the Jmp of such a loop brings the CPU back to its first
+byte, RomDriver asks wake_cycles() how long it can spin without an
+interruption, hands the loop bytes to the idle ROM of tb.v and sleeps with one
+Timer instead of waking up on every fetch (ClockCycles would wake up on every
+rising edge):
+
+- no skip while an interruption is pending or a TmrCfg has not loaded a timer
+- until WAKE_MARGIN cycles before the next overflow of a timer whose
+  interruption is enabled, from its counter, direction and autoreload
+- until the end of the run when no interruption can be taken
+- an edge of ext_int_tb always wakes the driver up
+
+The RTL still runs every cycle, only Python sleeps, so cycles, retirements
+and results are those of the simulation fed one fetch at a time.
+"""
+
+from cocotb.triggers import Edge, First, Timer
+
+from cpuy_iss.isa import (CPU_CFG_EXT_IE, CPU_CFG_GIE, CPU_CFG_T0_IE, CPU_CFG_T1_IE, FETCHING_OPCODE,
+                          TMR_CFG_T0_ENABLE, TMR_CFG_T1_ENABLE)
+from cpuy_iss.timer import Timer as TimerModel
+
+WAKE_MARGIN = 4 # Cycles before an overflow the driver feeds the ROM again
+MIN_SKIP = 16 # Shorter waits cost more than feeding the loop
+
+
+def _timer(timer):
+    model = TimerModel()
+    model.counter = timer.counter.value.integer
+    model.org_count = timer.org_count.value.integer
+    model.direction = timer.tmr_dir.value.integer
+    model.auto_reload = timer.tmr_auto.value.integer
+    model.overflow = timer.overflow.value.integer
+    model.run = timer.run.value.integer
+    return model
+
+
+def wake_cycles(dut):
+    """Cycles the CPU can spin before an interruption may be taken, None if none can, 0 if one is pending"""
+    core = dut.cpuy
+    if core.cpu_state.value.integer != FETCHING_OPCODE: # Redirected by the Jmp to the loop
+        return 0
+    cpu_cfg = core.cpu_cfg.value.integer
+    if not cpu_cfg & CPU_CFG_GIE or core.interrupt_source.value.integer:
+        return None
+    if core.set_t0.value.integer or core.set_t1.value.integer:
+        return 0
+    if cpu_cfg & CPU_CFG_EXT_IE and dut.ext_int_tb.value.integer:
+        return 0
+
+    tmr_cfg = core.tmr_cfg.value.integer
+    cycles = None
+    for timer, enable, interruption in ((core.tmr0, TMR_CFG_T0_ENABLE, CPU_CFG_T0_IE),
+                                        (core.tmr1, TMR_CFG_T1_ENABLE, CPU_CFG_T1_IE)):
+        if not cpu_cfg & interruption:
+            continue
+        model = _timer(timer)
+        if model.overflow:
+            return 0
+        edges = model.edges_to_overflow() if tmr_cfg & enable else None
+        if edges is not None:
+            cycles = edges if cycles is None else min(cycles, edges)
+    return None if cycles is None else max(0, cycles - WAKE_MARGIN)
+
+
+async def skip(dut, address, loop, cycles, clock_period=10, clock_units="us"):
+    """Feeds the loop bytes at address from the idle ROM of tb.v and sleeps for cycles clock cycles, forever
+    with None, or until ext_int_tb changes. The caller clears idle_tb at the next change of the address bus"""
+    dut.idle_address_tb.value = address
+    dut.idle_length_tb.value = len(loop)
+    dut.idle_rom_tb.value = int.from_bytes(loop, "little")
+    dut.idle_tb.value = 1
+
+    triggers = [Edge(dut.ext_int_tb)]
+    if cycles is not None:
+        triggers.append(Timer(cycles * clock_period, units=clock_units))
+    await First(*triggers)
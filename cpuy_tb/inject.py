@@ -0,0 +1,138 @@
+"""Fast-forward by state injection
+
+Runs the prefix of a program in the cpuy_iss model and deposits the resulting
+architectural state into the cpuy instance, so the RTL simulation only pays
+for the part of the program that matters:
+
+    await reset(dut)
+    cpu = await fast_forward(dut, program, halt_at=[0x4E])
+    result = await RomDriver(dut, program).run()
+
+The ISS stops between instructions, which is the FETCHING_OPCODE state of the
+RTL. The RTL is brought to that state (the clock must be running and rst_tb
+released), every register, memory, stack and timer is overwritten, and the
+next clock edge fetches the opcode at the injected PC. capture() reads the
+same state back into a Cpu.
+"""
+
+from cocotb.triggers import ReadOnly, RisingEdge, Timer
+
+from cpuy_iss import Cpu
+from cpuy_iss.isa import FETCHING_OPCODE, RAM_SIZE, REGISTERS, STACK_DEPTH
+
+
+def deposit(dut, cpu):
+    """Writes the state of cpu into dut.cpuy, the RTL must be in FETCHING_OPCODE"""
+    core = dut.cpuy
+
+    core.cpu_state.value = FETCHING_OPCODE
+    core.pc.value = cpu.pc
+    core.w.value = cpu.w
+    core.w_swap.value = cpu.w_swap
+    core.flags.value = cpu.flags
+    core.cpu_cfg.value = cpu.cpu_cfg
+    core.tmr_cfg.value = cpu.tmr_cfg
+    core.interrupt_source.value = cpu.interrupt_source
+    core.op_code.value = cpu.op_code
+    core.operands_count.value = 0
+    core.current_operand.value = 0
+    for index in range(2):
+        core.operands[index].value = cpu.operands[index]
+        core.ports[index].value = cpu.ports[index]
+        core.ports_cfg[index].value = cpu.ports_cfg[index]
+
+    registers = core.registers
+    for index in range(REGISTERS):
+        registers[index].value = cpu.registers[index]
+    ram = core.ram
+    for address in range(RAM_SIZE):
+        ram[address].value = cpu.ram[address]
+
+    # Control signals as left by EXECUTING or INTERRUPT_REDIRECTION, a TmrCfg leaves set_tX pending
+    core.enable_alu.value = 1
+    core.enable_stack.value = 0
+    core.operation_stack.value = 0
+    core.rst_stack.value = 0
+    core.set_t0.value = cpu.set_t0
+    core.set_t1.value = cpu.set_t1
+    core.done_ack_t0.value = 0
+    core.done_ack_t1.value = 0
+
+    stack = core.stack
+    for index in range(STACK_DEPTH):
+        stack.stack_mem[index].value = cpu.stack.mem[index]
+    stack.stack_ptr.value = cpu.stack.ptr
+    stack.data_out.value = cpu.stack.data_out
+
+    for timer, model in ((core.tmr0, cpu.tmr0), (core.tmr1, cpu.tmr1)):
+        timer.counter.value = model.counter
+        timer.org_count.value = model.org_count
+        timer.tmr_dir.value = model.direction
+        timer.tmr_auto.value = model.auto_reload
+        timer.overflow.value = model.overflow
+        timer.run.value = model.run
+
+
+def _value(handle):
+    value = handle.value
+    return value.integer if value.is_resolvable else 0
+
+
+def capture(dut, cpu):
+    """Reads the state of dut.cpuy into cpu, the inverse of deposit(), X and Z bits read as 0"""
+    core = dut.cpuy
+
+    for name in ("pc", "w", "w_swap", "flags", "cpu_cfg", "tmr_cfg", "interrupt_source", "op_code", "set_t0",
+                 "set_t1"):
+        setattr(cpu, name, _value(getattr(core, name)))
+    for index in range(2):
+        cpu.operands[index] = _value(core.operands[index])
+        cpu.ports[index] = _value(core.ports[index])
+        cpu.ports_cfg[index] = _value(core.ports_cfg[index])
+
+    registers = core.registers
+    for index in range(REGISTERS):
+        cpu.registers[index] = _value(registers[index])
+    ram = core.ram
+    for address in range(RAM_SIZE):
+        cpu.ram[address] = _value(ram[address])
+
+    stack = core.stack
+    for index in range(STACK_DEPTH):
+        cpu.stack.mem[index] = _value(stack.stack_mem[index])
+    cpu.stack.ptr = _value(stack.stack_ptr)
+    cpu.stack.data_out = _value(stack.data_out)
+
+    for timer, model in ((core.tmr0, cpu.tmr0), (core.tmr1, cpu.tmr1)):
+        model.counter = _value(timer.counter)
+        model.org_count = _value(timer.org_count)
+        model.direction = _value(timer.tmr_dir)
+        model.auto_reload = _value(timer.tmr_auto)
+        model.overflow = _value(timer.overflow)
+        model.run = _value(timer.run)
+
+
+async def inject(dut, cpu):
+    """Waits for the RTL to reach FETCHING_OPCODE and deposits the state of cpu into it"""
+    state = dut.cpuy.cpu_state
+    rising_edge = RisingEdge(dut.clk_tb)
+    while True:
+        await rising_edge
+        await ReadOnly()
+        if not dut.rst_tb.value and state.value.is_resolvable and state.value.integer == FETCHING_OPCODE:
+            break
+
+    # Out of the read only phase, far from the next edge
+    await Timer(1, units="ns")
+    deposit(dut, cpu)
+    await Timer(1, units="ns")
+
+
+async def fast_forward(dut, program, ext_int=0, **halt):
+    """Runs program in the ISS until a Cpu.run() halt condition, e.g. halt_at=[address] or
+    max_instructions=n, injects the state into the RTL and returns the Cpu"""
+    cpu = Cpu(program)
+    cpu.ext_int = ext_int
+    cpu.run(**halt)
+    await inject(dut, cpu)
+    return cpu
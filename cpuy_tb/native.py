@@ -0,0 +1,106 @@
+"""Programs run at native simulator speed on the tb_rom toplevel
+
+tb_rom.v wraps tb with a clock and a ROM in the HDL, Python only loads the ROM
+image, releases reset and sleeps until the HDL halts or the cycle budget runs
+out. NativeRom has the interface of RomDriver, the tb instance (dut.tb) is the
+dut of the rest of cpuy_tb, e.g. Scoreboard(dut.tb, cpu) and Profiler(dut.tb):
+
+    rom = NativeRom(dut, program, max_cycles=1_000_000)
+    await reset(dut)
+    result = await rom.run()
+    assert dut.tb.cpuy.w.value == 3
+
+The image, cpuy_rom.hex in the working directory, holds the ROM word and its
+halt flags (cpuy_iss.isa.halt_flags) for every address. Build the toplevel
+with `python -m cpuy_tb.build --toplevel tb_rom`, test modules declaring
+TOPLEVEL = "tb_rom" run on it in the regression.
+"""
+
+from cocotb.triggers import First, RisingEdge, Timer
+from cocotb.utils import get_sim_time
+
+from cpuy_iss.isa import (HALT_ADDRESS, HALT_BUDGET, HALT_FLAG_ADDRESS, HALT_FLAG_SELF_JUMP, HALT_FLAG_SENTINEL,
+                          HALT_SELF_JUMP, HALT_SENTINEL, SENTINEL, halt_flags, rom_image)
+
+from .rom import RomResult, cycles_since
+
+IMAGE = "cpuy_rom.hex"
+
+_REASONS = {HALT_FLAG_SENTINEL: HALT_SENTINEL, HALT_FLAG_ADDRESS: HALT_ADDRESS, HALT_FLAG_SELF_JUMP: HALT_SELF_JUMP}
+
+
+def is_native(dut):
+    """Whether dut is the tb_rom toplevel"""
+    return hasattr(dut, "image")
+
+
+def to_image(rom, flags):
+    """$readmemh text of tb_rom.image: halt flags and ROM word of every address"""
+    return "".join(f"{flag:02x}{word:02x}\n" for word, flag in zip(rom, flags))
+
+
+class NativeRom:
+    """ROM of the tb_rom toplevel, loaded through an image file"""
+
+    def __init__(self, dut, program, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True,
+                 max_cycles=None, clock_period=10, clock_units="us"):
+        if not is_native(dut):
+            raise RuntimeError("NativeRom needs the tb_rom toplevel, build it with python -m cpuy_tb.build "
+                               "--toplevel tb_rom")
+        self.dut = dut
+        self.sentinel = sentinel
+        self.halt_at = tuple(halt_at)
+        self.halt_on_self_jump = halt_on_self_jump
+        self.max_cycles = max_cycles
+        self.clock_period = clock_period
+        self.clock_units = clock_units
+        self._reason = None
+        self.load(program)
+
+    def load(self, program):
+        """Writes the image of program and loads it, the CPU sees it from the next delta cycle"""
+        self.rom = rom_image(program)
+        flags = halt_flags(self.rom, self.sentinel, self.halt_at, self.halt_on_self_jump)
+        with open(IMAGE, "w") as stream:
+            stream.write(to_image(self.rom, flags))
+        load = self.dut.load
+        load.value = not load.value.integer
+
+    def _current_address(self):
+        try:
+            return int(self.dut.addr_bus_tb.value)
+        except ValueError: # Address bus unresolved before reset
+            return None
+
+    def halt(self, reason=HALT_BUDGET):
+        """Ends the run() in progress, for tests deciding by themselves when a program is over"""
+        self._reason = reason
+        self.dut.halted.value = 1
+
+    async def run(self):
+        """Runs until the HDL halts or max_cycles elapse and returns a RomResult"""
+        dut = self.dut
+        dut.halted.value = 0
+        dut.halt_flag.value = 0
+        dut.running.value = 1
+        self._reason = None
+        start = get_sim_time()
+
+        triggers = [RisingEdge(dut.halted)]
+        if self.max_cycles is not None:
+            triggers.append(Timer(self.max_cycles * self.clock_period, units=self.clock_units))
+        await First(*triggers)
+        dut.running.value = 0
+
+        cycles = cycles_since(start, self.clock_period, self.clock_units)
+        flag = dut.halt_flag.value
+        if self._reason is not None:
+            result = RomResult(self._reason, self._current_address(), cycles)
+        elif dut.halted.value and flag.is_resolvable and flag.integer in _REASONS:
+            result = RomResult(_REASONS[flag.integer], dut.halt_address.value.integer, cycles)
+        else:
+            result = RomResult(HALT_BUDGET, self._current_address(), cycles)
+
+        # Let the edge that triggered the halt settle before results are checked
+        await Timer(1, units="ns")
+        return result
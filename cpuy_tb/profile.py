@@ -0,0 +1,294 @@
+"""Cycle profile of the cpuy state machine
+
+The profiler reads the retired instructions recorded by tb.v through
+cpuy_tb.retired, once per 8 instructions, so it is cheap enough to leave on.
+It attributes the clock cycles between two retirements to the opcode of the
+instruction and to the cpu_state values it went through, and collects the
+latency of every interruption, from the rise of its request (ext_int, done_t0,
+done_t1) to the fetch at its vector:
+
+    profiler = Profiler(dut)
+    profiler.start()
+    await RomDriver(dut, program).run()
+    profiler.stop()
+    print(profiler.profile.report())
+
+Every state lasts one cycle except FETCHING_OPERANDS, one per operand, which
+is charged the cycles of an instruction not spent in the other states.
+
+With $CPUY_PROFILE set to a directory, the first reset of a simulation starts
+a profiler that writes a <uuid>.json file there when the simulation ends.
+`python -m cpuy_tb.regress --profile DIR` sets it for every shard, and this
+module merges the files into one JSON profile and a text histogram:
+
+    python -m cpuy_tb.profile sim_build/profile [-o profile.json]
+"""
+
+import argparse
+import atexit
+import collections
+import glob
+import json
+import os
+import sys
+import uuid
+
+import cocotb
+
+from cpuy_iss.isa import (FETCHING_OPCODE, FETCHING_OPERANDS, INTERRUPT_REDIRECTION, MNEMONICS, POPPING_STACK,
+                          RESETTING, STATE_NAMES)
+
+from .retired import (CYCLE_MASK, CYCLE_SHIFT, LATENCY_MASK, LATENCY_SHIFT, OP_CODE_SHIFT, STATE_FIELDS, STATES_SHIFT,
+                      RetiredRing)
+
+VERSION = 1
+
+SOURCE_NAMES = (None, "external", "timer 0", "timer 1")
+
+_SOURCE_SHIFT = sum(width for _, width in STATE_FIELDS[:[name for name, _ in STATE_FIELDS].index("interrupt_source")])
+
+# Cycles of every state but FETCHING_OPERANDS, the remainder, for every mask of visited states
+_FIXED_STATES = tuple(tuple(state for state in range(len(STATE_NAMES)) if mask >> state & 1 and state != FETCHING_OPERANDS)
+                      for mask in range(1 << len(STATE_NAMES)))
+
+
+def _opcode(op):
+    return MNEMONICS[op] or "NOP"
+
+
+class Profile:
+    """Cycles by opcode and cpu_state, cycles per instruction and interruption latencies"""
+
+    def __init__(self):
+        self.instructions = 0
+        self.cycles = 0
+        self.opcodes = [[0, 0] for _ in range(256)] # Instructions, cycles
+        self.states = [[0] * len(STATE_NAMES) for _ in range(256)] # Cycles by opcode and state
+        self.cpi = collections.Counter() # Instructions by cycles
+        self.latency = [collections.Counter() for _ in SOURCE_NAMES] # Interruptions by latency, by source
+
+    def __iadd__(self, other):
+        self.instructions += other.instructions
+        self.cycles += other.cycles
+        for op in range(256):
+            for index in range(2):
+                self.opcodes[op][index] += other.opcodes[op][index]
+            for state in range(len(STATE_NAMES)):
+                self.states[op][state] += other.states[op][state]
+        self.cpi.update(other.cpi)
+        for mine, theirs in zip(self.latency, other.latency):
+            mine.update(theirs)
+        return self
+
+    def add(self, op, states, cycles, source=0, latency=0):
+        """Counts one instruction of op that went through the states mask in cycles cycles"""
+        self.instructions += 1
+        self.cycles += cycles
+        counts = self.opcodes[op]
+        counts[0] += 1
+        counts[1] += cycles
+        self.cpi[cycles] += 1
+
+        by_state = self.states[op]
+        fixed = _FIXED_STATES[states]
+        for state in fixed:
+            by_state[state] += 1
+        if states >> FETCHING_OPERANDS & 1:
+            by_state[FETCHING_OPERANDS] += cycles - len(fixed)
+        if states >> INTERRUPT_REDIRECTION & 1:
+            self.latency[source][latency] += 1
+
+    @property
+    def state_cycles(self):
+        """Cycles spent in every cpu_state"""
+        return [sum(by_state[state] for by_state in self.states) for state in range(len(STATE_NAMES))]
+
+    def to_json(self):
+        return {
+            "version": VERSION,
+            "instructions": self.instructions,
+            "cycles": self.cycles,
+            "cpi": self.cycles / self.instructions if self.instructions else 0.0,
+            "states": dict(zip(STATE_NAMES, self.state_cycles)),
+            "opcodes": {f"{op:#04x}": {"mnemonic": _opcode(op), "instructions": count, "cycles": cycles,
+                                       "states": {STATE_NAMES[state]: value
+                                                  for state, value in enumerate(self.states[op]) if value}}
+                        for op, (count, cycles) in enumerate(self.opcodes) if count},
+            "cycles_per_instruction": {str(cycles): count for cycles, count in sorted(self.cpi.items())},
+            "interruption_latency": {SOURCE_NAMES[source]: {str(cycles): count for cycles, count in sorted(counts.items())}
+                                     for source, counts in enumerate(self.latency) if source and counts},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get("version") != VERSION:
+            raise ValueError(f"Profile version {data.get('version')}, this one reads {VERSION}")
+        profile = cls()
+        profile.instructions = data["instructions"]
+        profile.cycles = data["cycles"]
+        for key, entry in data["opcodes"].items():
+            op = int(key, 16)
+            profile.opcodes[op] = [entry["instructions"], entry["cycles"]]
+            for name, value in entry["states"].items():
+                profile.states[op][STATE_NAMES.index(name)] = value
+        profile.cpi.update({int(cycles): count for cycles, count in data["cycles_per_instruction"].items()})
+        for name, counts in data["interruption_latency"].items():
+            profile.latency[SOURCE_NAMES.index(name)].update({int(cycles): count for cycles, count in counts.items()})
+        return profile
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as stream:
+            json.dump(self.to_json(), stream, indent=1)
+
+    @classmethod
+    def read(cls, path):
+        with open(path) as stream:
+            return cls.from_json(json.load(stream))
+
+    @classmethod
+    def merge(cls, paths):
+        merged = cls()
+        for path in paths:
+            merged += cls.read(path)
+        return merged
+
+    def report(self, limit=20, width=40):
+        """Text histograms of cycles per instruction and latencies, and the opcodes taking most cycles"""
+        cpi = self.cycles / self.instructions if self.instructions else 0.0
+        lines = [f"{self.instructions} instructions, {self.cycles} cycles, CPI {cpi:.3f}", "",
+                 "Cycles per instruction"]
+        lines += _histogram(self.cpi, width)
+
+        lines += ["", "Cycles by state"]
+        for name, cycles in zip(STATE_NAMES, self.state_cycles):
+            if name != STATE_NAMES[RESETTING]:
+                lines.append(f"  {name:<22} {cycles:>10} {100 * cycles / max(self.cycles, 1):5.1f}%")
+
+        for source, counts in enumerate(self.latency):
+            if source and counts:
+                total = sum(counts.values())
+                mean = sum(cycles * count for cycles, count in counts.items()) / total
+                lines += ["", f"Interruption latency, {SOURCE_NAMES[source]}: {total} interruptions, min "
+                          f"{min(counts)} mean {mean:.2f} max {max(counts)} cycles"]
+                lines += _histogram(counts, width)
+
+        lines += ["", f"{'Opcode':<16} {'Count':>10} {'Cycles':>10} {'CPI':>6} {'Operands':>9} {'Stack':>6} "
+                  f"{'Redirect':>9}"]
+        ranked = sorted((op for op in range(256) if self.opcodes[op][0]), key=lambda op: -self.opcodes[op][1])
+        for op in ranked[:limit]:
+            count, cycles = self.opcodes[op]
+            by_state = self.states[op]
+            lines.append(f"{_opcode(op):<7} ({op:#04x}) {count:>10} {cycles:>10} {cycles / count:6.2f} "
+                         f"{by_state[FETCHING_OPERANDS]:>9} {by_state[POPPING_STACK]:>6} {by_state[INTERRUPT_REDIRECTION]:>9}")
+        if len(ranked) > limit:
+            lines.append(f"... {len(ranked) - limit} more opcodes")
+        return "\n".join(lines)
+
+
+def _histogram(counts, width):
+    peak = max(counts.values(), default=0)
+    return [f"  {value:>5} {'#' * max(1, round(width * count / peak)):<{width}} {count}"
+            for value, count in sorted(counts.items())]
+
+
+class Profiler:
+    """Profiles the instructions the RTL retires into a Profile"""
+
+    def __init__(self, dut, profile=None):
+        self.profile = Profile() if profile is None else profile
+        self._ring = RetiredRing(dut)
+        self._task = None
+        self._last_cycle = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Starts profiling, the first retirement recorded gives the first cycle"""
+        self._ring.sync()
+        self._last_cycle = None
+        self._task = cocotb.start_soon(self._monitor())
+
+    def stop(self):
+        """Stops the profiler, counting the instructions retired since its last wakeup"""
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+            self._drain()
+
+    def _drain(self):
+        add = self.profile.add
+        last = self._last_cycle
+        for entry in self._ring.read():
+            if not entry.is_resolvable:
+                last = None
+                continue
+            word = entry.integer
+            cycle = (word >> CYCLE_SHIFT) & CYCLE_MASK
+            states = (word >> STATES_SHIFT) & 0x3F
+            # Resets restart the count, there is no instruction to charge them to
+            if last is not None and not states & (1 << RESETTING):
+                add((word >> OP_CODE_SHIFT) & 0xFF, states | 1 << FETCHING_OPCODE, (cycle - last) & CYCLE_MASK,
+                    (word >> _SOURCE_SHIFT) & 3, (word >> LATENCY_SHIFT) & LATENCY_MASK)
+            last = cycle
+        self._last_cycle = last
+
+    async def _monitor(self):
+        while True:
+            await self._ring.wait()
+            self._drain()
+
+
+_profiler = None
+
+
+def profile(dut, directory=None):
+    """Starts the profiler of this simulation, writing to directory ($CPUY_PROFILE) at exit.
+
+    cocotb kills it at the end of every test, so every test calls it again, which counts the last
+    retirements of the previous test; those of the last test of the simulation are lost.
+    """
+    global _profiler
+    directory = directory or os.environ.get("CPUY_PROFILE")
+    if not directory:
+        return None
+    if _profiler is None:
+        _profiler = Profiler(dut)
+        atexit.register(_profiler.profile.write, os.path.join(directory, uuid.uuid4().hex + ".json"))
+    if not _profiler.running:
+        # Killed at the end of the previous test, its retirements since the last wakeup are in the ring
+        _profiler.stop()
+        _profiler.start()
+    return _profiler
+
+
+def profile_files(paths):
+    """Profile .json files of the given files and directories"""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path])
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_tb.profile", description="Merges profiles and prints "
+                                     "their histograms")
+    parser.add_argument("paths", nargs="+", help="profile .json files, or directories holding them")
+    parser.add_argument("-o", "--output", help="merged profile to write")
+    parser.add_argument("--limit", type=int, default=20, help="opcodes listed")
+    args = parser.parse_args(argv)
+
+    files = profile_files(args.paths)
+    if not files:
+        parser.exit(1, "No profiles found\n")
+    merged = Profile.merge(files)
+    if args.output:
+        merged.write(args.output)
+    print(merged.report(args.limit))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""Parallel regression runner of the cocotb test modules
+
+The design is compiled once per toplevel, tb or the tb_rom of modules setting
+TOPLEVEL = "tb_rom" (or taken from the build cache of cpuy_tb.build, when the
+RTL did not change), then every cocotb test runs as its own simulator
+process on a pool of workers, each worker with its own directory under
+sim_build/regress. Per-test results.xml files are merged into one report with
+the wall time and simulated clock cycles of every test:
+
+    python -m cpuy_tb.regress -j 32
+    python -m cpuy_tb.regress -k call_ret test.test_cpuy_branching_instructions
+
+Tests are started longest first, using the wall times of the previous report,
+so the regression takes about as long as its slowest test. The design includes
+the waveform capture of cpuy_tb.waves, which costs nothing until a test or
+$CPUY_WAVES arms it.
+
+Results are cached in the results kind of the cpuy_iss.cache directory, keyed
+on the build key of the toplevel (Verilog sources, simulator and cocotb
+versions), the sources of the test module and of the local modules it imports,
+which hold its programs, and the $CPUY_* variables. A test whose key did not
+change is replayed from the cache, its status, message and metrics, without a
+simulation, and --force runs every test again. Modules reading inputs other
+than their Python sources set RESULT_CACHE = False. Runs collecting coverage,
+profiles or waveforms always simulate.
+"""
+
+import argparse
+import ast
+import glob
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import find_libpython
+
+from cpuy_iss import cache
+
+from .build import ROOT, TOPLEVEL, build, build_key, test_command, with_waves
+from .profile import Profile, profile_files
+
+CLOCK_PERIOD_NS = 10_000 # Clock of the test modules, 10 us
+RESULTS_VERSION = 1
+# Local packages whose modules are hashed into the result keys of the tests importing them
+LOCAL_PACKAGES = ("test", "cpuy_tb", "cpuy_iss")
+
+
+class TestResult:
+    __slots__ = ("module", "name", "status", "message", "wall_time", "sim_time_ns", "element", "cached")
+
+    def __init__(self, module, name, status, message="", wall_time=0.0, sim_time_ns=0.0, element=None,
+                 cached=False):
+        self.module = module
+        self.name = name
+        self.status = status # "passed", "failed" or "skipped"
+        self.message = message
+        self.wall_time = wall_time
+        self.sim_time_ns = sim_time_ns
+        self.element = element # <testcase> of the shard report
+        self.cached = cached # Replayed from the result cache
+
+    @property
+    def cycles(self):
+        return round(self.sim_time_ns / CLOCK_PERIOD_NS)
+
+
+def discover(root=ROOT, package="test", prefix="test_"):
+    """Modules prefix*.py of package holding @cocotb.test() coroutines, as (module, [tests])"""
+    modules = []
+    for path in sorted(glob.glob(os.path.join(root, package, prefix + "*.py"))):
+        with open(path) as source:
+            tree = ast.parse(source.read(), path)
+        tests = [node.name for node in tree.body if isinstance(node, ast.AsyncFunctionDef) and
+                 any(ast.unparse(decorator).startswith("cocotb.test") for decorator in node.decorator_list)]
+        if tests:
+            modules.append((f"{package}.{os.path.splitext(os.path.basename(path))[0]}", tests))
+    return modules
+
+
+def _module_constant(module, name, default, root=ROOT):
+    path = os.path.join(root, *module.split(".")) + ".py"
+    with open(path) as source:
+        tree = ast.parse(source.read(), path)
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) and
+                node.targets[0].id == name and isinstance(node.value, ast.Constant)):
+            return node.value.value
+    return default
+
+
+def module_toplevel(module, root=ROOT):
+    """Toplevel a test module runs on: its TOPLEVEL constant, tb by default"""
+    return _module_constant(module, "TOPLEVEL", TOPLEVEL, root)
+
+
+def _module_path(module, root):
+    """Source file of a local module or package, None when it is not one"""
+    base = os.path.join(root, *module.split("."))
+    for path in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def module_sources(module, root=ROOT):
+    """Source files of module and of the local modules it imports, transitively, sorted"""
+    paths = set()
+    pending = [module]
+    while pending:
+        name = pending.pop()
+        path = _module_path(name, root)
+        if path is None or path in paths:
+            continue
+        paths.add(path)
+        package = name if path.endswith("__init__.py") else name.rpartition(".")[0]
+        parts = name.split(".")
+        pending.extend(".".join(parts[:index]) for index in range(1, len(parts)))
+        with open(path) as source:
+            tree = ast.parse(source.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                if node.level:
+                    base = package.split(".")[:len(package.split(".")) - node.level + 1]
+                    imported = ".".join(base + ([node.module] if node.module else []))
+                else:
+                    imported = node.module
+                pending.append(imported)
+                # from package import module
+                pending.extend(f"{imported}.{alias.name}" for alias in node.names)
+    return sorted(path for path in paths if os.path.relpath(path, root).split(os.sep)[0] in LOCAL_PACKAGES)
+
+
+def sources_digest(paths, root=ROOT):
+    """Digest of the paths, relative to root, and contents of source files"""
+    parts = []
+    for path in paths:
+        with open(path, "rb") as stream:
+            parts += [os.path.relpath(path, root), stream.read()]
+    return cache.digest(*parts)
+
+
+def result_key(build, module, name, sources, env):
+    """Cache key of the result of a test: its build key, the sources_digest of the modules it depends on and
+    the $CPUY_* variables"""
+    return cache.digest(str(RESULTS_VERSION), build, module, name, sources,
+                        *(f"{variable}={env[variable]}" for variable in sorted(env)
+                          if variable.startswith("CPUY_") and variable != "CPUY_CACHE"))
+
+
+def load_result(key, module, name):
+    """TestResult cached for key, None on a miss"""
+    data = cache.load("results", key)
+    if data is None:
+        return None
+    entry = json.loads(data)
+    return TestResult(module, name, entry["status"], entry["message"], entry["wall_time"], entry["sim_time_ns"],
+                      ET.fromstring(entry["element"]), cached=True)
+
+
+def store_result(key, result):
+    entry = {"status": result.status, "message": result.message, "wall_time": result.wall_time,
+             "sim_time_ns": result.sim_time_ns, "element": ET.tostring(result.element, encoding="unicode")}
+    cache.store("results", key, json.dumps(entry).encode())
+
+
+def _environment():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    env.setdefault("LIBPYTHON_LOC", find_libpython.find_libpython())
+    env.setdefault("PYGPI_PYTHON_BIN", sys.executable)
+    env["TOPLEVEL"] = TOPLEVEL
+    env["TOPLEVEL_LANG"] = "verilog"
+    return env
+
+
+def run_test(sim, build_dir, work_dir, module, name, env):
+    """Runs one test in work_dir and returns its TestResult"""
+    results_file = os.path.join(work_dir, "results.xml")
+    if os.path.exists(results_file):
+        os.remove(results_file)
+    env = dict(env, MODULE=module, TESTCASE=name, COCOTB_RESULTS_FILE=results_file)
+
+    start = time.perf_counter()
+    with open(os.path.join(work_dir, f"{module}.{name}.log"), "w") as log:
+        process = subprocess.run(test_command(sim, build_dir), cwd=work_dir, env=env, stdout=log,
+                                 stderr=subprocess.STDOUT)
+    wall_time = time.perf_counter() - start
+
+    try:
+        element = ET.parse(results_file).find(".//testcase")
+    except (OSError, ET.ParseError):
+        element = None
+    if element is None:
+        return TestResult(module, name, "failed", f"Simulator exited with code {process.returncode}, see {log.name}",
+                          wall_time)
+
+    failure = element.find("failure")
+    if failure is None:
+        failure = element.find("error")
+    if failure is not None:
+        status, message = "failed", failure.get("message", "")
+    elif element.find("skipped") is not None:
+        status, message = "skipped", ""
+    else:
+        status, message = "passed", ""
+    return TestResult(module, name, status, message, wall_time, float(element.get("sim_time_ns", 0)), element)
+
+
+def previous_wall_times(report):
+    """Wall times by (module, test) of a report written by a previous run"""
+    try:
+        tree = ET.parse(report)
+    except (OSError, ET.ParseError):
+        return {}
+    return {(case.get("classname"), case.get("name")): float(case.get("time", 0)) for case in tree.iter("testcase")}
+
+
+def run(tests, sim="icarus", jobs=None, report=None, coverage=None, waves="fst", profile=None, directory=None,
+        cache_results=False, force=False):
+    """Builds once per toplevel and runs the (module, test) pairs on jobs workers, returns their TestResults.
+
+    With coverage, a directory, every shard writes its coverage file there, and
+    with profile, a directory, its cycle profile.
+    Captured waveforms are written in the waves format, into the worker directories
+    under directory (sim_build/regress).
+    With cache_results, tests whose result key is cached are replayed instead of
+    run, unless force, and the results of the tests run are cached.
+    """
+    sources, defines = with_waves(waves=waves)
+    toplevels = {module: module_toplevel(module) for module in {module for module, _ in tests}}
+
+    # Longest tests first so the last ones to start are short
+    wall_times = previous_wall_times(report) if report else {}
+    tests = sorted(tests, key=lambda test: -wall_times.get(test, float("inf")))
+
+    env = _environment()
+    if coverage:
+        env["CPUY_COVERAGE"] = os.path.abspath(coverage)
+    if profile:
+        env["CPUY_PROFILE"] = os.path.abspath(profile)
+
+    results = {}
+    keys = {}
+    if cache_results and not any(env.get(variable) for variable in ("CPUY_COVERAGE", "CPUY_PROFILE", "CPUY_WAVES")):
+        build_keys = {toplevel: build_key(sim, sources, (toplevel,), defines) for toplevel in set(toplevels.values())}
+        dependencies = {module: sources_digest(module_sources(module)) for module in toplevels
+                        if _module_constant(module, "RESULT_CACHE", True)}
+        for module, name in tests:
+            if module not in dependencies:
+                continue
+            key = result_key(build_keys[toplevels[module]], module, name, dependencies[module], env)
+            keys[module, name] = key
+            cached = None if force else load_result(key, module, name)
+            if cached is not None:
+                results[module, name] = cached
+    pending = [test for test in tests if test not in results]
+
+    if pending:
+        build_dirs = {toplevel: build(sim, sources, (toplevel,), defines)
+                      for toplevel in sorted({toplevels[module] for module, _ in pending})}
+        jobs = max(1, min(jobs or os.cpu_count(), len(pending)))
+        regress_dir = directory or os.path.join(ROOT, "sim_build", "regress")
+        shutil.rmtree(regress_dir, ignore_errors=True)
+        workers = queue.Queue()
+        for worker in range(jobs):
+            work_dir = os.path.join(regress_dir, f"worker{worker}")
+            os.makedirs(work_dir)
+            workers.put(work_dir)
+
+        def shard(test):
+            work_dir = workers.get()
+            try:
+                toplevel = toplevels[test[0]]
+                result = run_test(sim, build_dirs[toplevel], work_dir, *test, dict(env, TOPLEVEL=toplevel))
+            finally:
+                workers.put(work_dir)
+            # Simulations ending without a report are not cached, they may not be the test's doing
+            if test in keys and result.element is not None:
+                store_result(keys[test], result)
+            return result
+
+        with ThreadPoolExecutor(jobs) as pool:
+            results.update(zip(pending, pool.map(shard, pending)))
+    return [results[test] for test in tests]
+
+
+def write_report(results, path, wall_time):
+    """Merged JUnit report, cocotb attributes plus the cycles simulated by every test"""
+    suite = ET.Element("testsuite", name="all", package="all", tests=str(len(results)),
+                       failures=str(sum(result.status == "failed" for result in results)),
+                       skipped=str(sum(result.status == "skipped" for result in results)), time=f"{wall_time:.3f}")
+    for result in results:
+        case = ET.SubElement(suite, "testcase", dict(result.element.attrib) if result.element is not None else {})
+        case.set("name", result.name)
+        case.set("classname", result.module)
+        case.set("time", f"{result.wall_time:.3f}")
+        case.set("sim_time_ns", f"{result.sim_time_ns:.0f}")
+        case.set("cycles", str(result.cycles))
+        if result.cached:
+            case.set("cached", "true")
+        if result.element is not None:
+            case.extend(result.element)
+        elif result.status == "failed":
+            ET.SubElement(case, "failure", message=result.message)
+    tree = ET.ElementTree(ET.Element("testsuites", name="results"))
+    tree.getroot().append(suite)
+    ET.indent(tree)
+    tree.write(path, encoding="unicode", xml_declaration=True)
+
+
+def summary(results, wall_time):
+    lines = [f"{'TEST':<60} {'STATUS':>7} {'WALL (s)':>9} {'CYCLES':>9}"]
+    for result in sorted(results, key=lambda result: -result.wall_time):
+        lines.append(f"{result.module + '.' + result.name:<60} {result.status.upper():>7} "
+                     f"{result.wall_time:>9.2f} {result.cycles:>9}{' cached' if result.cached else ''}")
+        if result.status == "failed":
+            lines.append(f"    {result.message}")
+    failed = sum(result.status == "failed" for result in results)
+    cached = sum(result.cached for result in results)
+    serial = sum(result.wall_time for result in results if not result.cached)
+    lines.append(f"{len(results)} tests, {failed} failed, {cached} cached in {wall_time:.2f} s "
+                 f"({serial:.2f} s of test wall time)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_tb.regress", description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", help="test modules to run, every cocotb module under test/ by default")
+    parser.add_argument("-j", "--jobs", type=int, help="parallel simulations, the number of CPUs by default")
+    parser.add_argument("-k", "--tests", help="comma separated test names to run")
+    parser.add_argument("--sim", default=os.environ.get("SIM", "icarus"), choices=("icarus", "verilator"))
+    parser.add_argument("--report", default=os.path.join(ROOT, "results.xml"), help="merged JUnit report")
+    parser.add_argument("--coverage", metavar="DIR", help="collect functional coverage into DIR and report it")
+    parser.add_argument("--profile", metavar="DIR", help="profile the cycles of the RTL into DIR and report them")
+    parser.add_argument("--waves", default=os.environ.get("WAVES_FORMAT", "fst"), choices=("fst", "vcd"),
+                        help="format of the captured waveforms, vcd for Verilator without FST support")
+    parser.add_argument("--force", action="store_true", help="run every test, even those with a cached result")
+    args = parser.parse_args(argv)
+
+    selected = set(args.tests.split(",")) if args.tests else None
+    tests = [(module, test) for module, module_tests in discover() for test in module_tests
+             if (not args.modules or module in args.modules) and (selected is None or test in selected)]
+    if not tests:
+        parser.exit(1, "No tests selected\n")
+
+    for directory in (args.coverage, args.profile):
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    start = time.perf_counter()
+    results = run(tests, args.sim, args.jobs, report=args.report, coverage=args.coverage, waves=args.waves,
+                  profile=args.profile, cache_results=True, force=args.force)
+    wall_time = time.perf_counter() - start
+
+    write_report(results, args.report, wall_time)
+    print(summary(results, wall_time))
+    if args.coverage:
+        from .coverage import Coverage, coverage_files # NumPy is only needed for coverage
+        print(Coverage.merge(coverage_files([args.coverage])).report())
+    if args.profile:
+        print(Profile.merge(profile_files([args.profile])).report())
+    return 1 if any(result.status == "failed" for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Reader of the ring of retired instructions of tb.v
+
+Every time cpuy retires an instruction, i.e. enters FETCHING_OPCODE, tb.v
+records an entry in retired_ring_tb, a ring of 16. Its readers wake up once
+per 8 retirements, when retired_half_tb toggles, and read the entries recorded
+since their previous read:
+
+    ring = RetiredRing(dut)
+    ring.sync()
+    while True:
+        await ring.wait()
+        for entry in ring.read():
+            ...
+
+Fields of an entry, from the least significant bit: the architectural state
+(STATE_FIELDS), the clock cycle it was recorded in, the ext_int value the
+instruction executed with, its opcode, the cpu_state values it went through,
+the timers that overflowed meanwhile, the ALU operation flag of ucode.v and
+the cycles since the interruption request of interrupt_source rose, the
+latency of an interruption in the entry of its redirection.
+"""
+
+from cocotb.triggers import Edge, ReadOnly
+
+RING_SIZE = 16
+
+# Fields of tb.state_tb from the least significant bit: (name, width)
+STATE_FIELDS = (("stack_ptr", 4), ("interrupt_source", 3), ("p1", 8), ("p0", 8), ("tmr_cfg", 8),
+                ("cpu_cfg", 8), ("flags", 8), ("w", 8), ("pc", 10))
+STATE_BITS = 65
+STATE_MASK = (1 << STATE_BITS) - 1
+
+CYCLE_SHIFT = STATE_BITS
+CYCLE_MASK = (1 << 32) - 1
+EXT_INT_SHIFT = CYCLE_SHIFT + 32
+OP_CODE_SHIFT = EXT_INT_SHIFT + 1
+STATES_SHIFT = OP_CODE_SHIFT + 8 # One bit per cpu_state value
+OVERFLOWS_SHIFT = STATES_SHIFT + 6 # Bit 0 Timer 0, bit 1 Timer 1
+ALU_SHIFT = OVERFLOWS_SHIFT + 2
+LATENCY_SHIFT = ALU_SHIFT + 1
+LATENCY_MASK = (1 << 16) - 1
+
+
+class RetiredRing:
+    """Cached handles of the ring and the index of the next entry to read"""
+
+    def __init__(self, dut):
+        self._half = Edge(dut.retired_half_tb)
+        self._count = dut.retired_count_tb
+        self._entries = [dut.retired_ring_tb[index] for index in range(RING_SIZE)]
+        self._next = 0
+
+    def sync(self):
+        """Skips the entries recorded so far, the next one read is the next one recorded"""
+        self._next = self._count.value.integer
+
+    async def wait(self):
+        """Waits for the ring to fill one more half"""
+        await self._half
+        await ReadOnly()
+
+    def read(self):
+        """Values of the entries recorded since the previous read, oldest first"""
+        end = self._count.value.integer
+        entries = self._entries
+        values = []
+        index = self._next
+        while index != end:
+            values.append(entries[index].value)
+            index = (index + 1) % RING_SIZE
+        self._next = end
+        return values
@@ -0,0 +1,167 @@
+import cocotb
+from cocotb.triggers import Edge, Event, First, Timer
+from cocotb.utils import get_sim_steps, get_sim_time
+
+from cpuy_iss.isa import (HALT_ADDRESS, HALT_BUDGET, HALT_FLAG_ADDRESS, HALT_FLAG_SELF_JUMP,
+                          HALT_FLAG_SENTINEL, HALT_SELF_JUMP, HALT_SENTINEL, ROM_SIZE, SENTINEL, halt_flags,
+                          idle_loops, rom_image)
+
+from .idle import MIN_SKIP, skip, wake_cycles
+
+
+def cycles_since(start, clock_period, clock_units):
+    """Clock cycles elapsed since start, a get_sim_time() in simulator steps, counted in steps so long
+    runs do not lose a cycle to float rounding"""
+    return (get_sim_time() - start) // get_sim_steps(clock_period, clock_units)
+
+
+class RomResult:
+    __slots__ = ("reason", "address", "cycles")
+
+    def __init__(self, reason, address, cycles):
+        self.reason = reason
+        self.address = address
+        self.cycles = cycles
+
+    def __repr__(self):
+        return f"RomResult(reason={self.reason!r}, address={self.address!r}, cycles={self.cycles})"
+
+
+class RomDriver:
+    """External ROM model for the tb toplevel.
+
+    Instead of sampling the address bus on every clock, the driver sleeps until
+    addr_bus_tb changes and only then drives data_bus_tb with the addressed word.
+    The run stops when the PC reaches a halt address:
+
+    - sentinel: an address whose ROM word equals `sentinel` (the 127 marker the tests use).
+    - halt_at: any address in the given iterable.
+    - self jump: a `Jmp` (2 operands) to its own address, once the jump has executed so
+      the previous instructions have completed.
+    - max_cycles: a budget of clock cycles, measured in simulation time.
+
+    With skip_idle, idle loops waiting for an interruption are fed by tb.v
+    while the driver sleeps, see cpuy_tb.idle; idle_cycles counts those cycles.
+    """
+
+    def __init__(self, dut, program, sentinel=SENTINEL, halt_at=(), halt_on_self_jump=True,
+                 max_cycles=None, clock_period=10, clock_units="us", skip_idle=True):
+        self.dut = dut
+        self.sentinel = sentinel
+        self.halt_at = tuple(halt_at)
+        self.halt_on_self_jump = halt_on_self_jump
+        self.max_cycles = max_cycles
+        self.clock_period = clock_period
+        self.clock_units = clock_units
+        self.skip_idle = skip_idle
+        self.idle_cycles = 0
+        self._idle_start = None
+
+        # Cached handles, looking them up through dut on every access is expensive
+        self._addr_bus = dut.addr_bus_tb
+        self._data_bus = dut.data_bus_tb
+
+        self._halted = Event("rom_halted")
+        self._result = None
+        self.load(program)
+
+    def load(self, program):
+        self.rom = rom_image(program)
+        self._flags = halt_flags(self.rom, self.sentinel, self.halt_at, self.halt_on_self_jump)
+        self._idle = idle_loops(self.rom, self._flags) if self.skip_idle else bytes(ROM_SIZE)
+
+    def _current_address(self):
+        try:
+            return int(self._addr_bus.value)
+        except ValueError: # Address bus unresolved before reset
+            return None
+
+    def _halt(self, reason, address):
+        cycles = cycles_since(self._start, self.clock_period, self.clock_units)
+        self._result = RomResult(reason, address, cycles)
+        self._halted.set()
+
+    async def _feed(self):
+        addr_bus = self._addr_bus
+        data_bus = self._data_bus
+        rom = self.rom
+        flags = self._flags
+        idle = self._idle
+        edge = Edge(addr_bus)
+
+        address = self._current_address()
+        data_bus.value = rom[address or 0]
+        previous = address
+        skipped = False
+
+        while True:
+            await edge
+            address = self._current_address()
+            if address is None:
+                continue
+
+            data_bus.value = rom[address]
+            if skipped: # The idle ROM fed the bus until this change of the address
+                self.dut.idle_tb.value = 0
+                skipped = False
+
+            flag = flags[address]
+            if flag:
+                if flag & HALT_FLAG_SENTINEL:
+                    self._halt(HALT_SENTINEL, address)
+                    return
+                if flag & HALT_FLAG_ADDRESS:
+                    self._halt(HALT_ADDRESS, address)
+                    return
+                # PC arrives at a Jmp from its second operand only once the jump executed
+                if flag & HALT_FLAG_SELF_JUMP and previous == (address + 3) % ROM_SIZE:
+                    self._halt(HALT_SELF_JUMP, address)
+                    return
+
+            # Back from the Jmp of an idle loop, the instructions before the loop have completed
+            length = idle[address]
+            if length and previous == (address + length) % ROM_SIZE:
+                cycles = wake_cycles(self.dut)
+                if cycles is None or cycles >= MIN_SKIP:
+                    loop = bytes(rom[(address + offset) % ROM_SIZE] for offset in range(length))
+                    self._idle_start = get_sim_time()
+                    await skip(self.dut, address, loop, cycles, self.clock_period, self.clock_units)
+                    self._count_idle()
+                    skipped = True
+                    address = None
+
+            previous = address
+
+    def _count_idle(self):
+        if self._idle_start is not None:
+            self.idle_cycles += cycles_since(self._idle_start, self.clock_period, self.clock_units)
+            self._idle_start = None
+
+    def halt(self, reason=HALT_BUDGET):
+        """Ends the run() in progress, for tests deciding by themselves when a program is over"""
+        if self._result is None:
+            self._halt(reason, self._current_address())
+
+    async def run(self):
+        """Feeds the ROM until a halt condition is met and returns a RomResult"""
+        self._halted.clear()
+        self._result = None
+        self._start = get_sim_time()
+
+        feeder = cocotb.start_soon(self._feed())
+        triggers = [self._halted.wait()]
+        if self.max_cycles is not None:
+            triggers.append(Timer(self.max_cycles * self.clock_period, units=self.clock_units))
+
+        await First(*triggers)
+        feeder.kill()
+        if self.skip_idle:
+            self._count_idle()
+            self.dut.idle_tb.value = 0
+
+        if self._result is None:
+            self._halt(HALT_BUDGET, self._current_address())
+
+        # Let the edge that triggered the halt settle before results are checked
+        await Timer(1, units="ns")
+        return self._result
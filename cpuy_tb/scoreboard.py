@@ -0,0 +1,233 @@
+"""Lockstep scoreboard of the RTL against the cpuy_iss reference model
+
+The scoreboard reads the retired instructions recorded by tb.v through
+cpuy_tb.retired, once per 8 of them, replays them in the ISS and compares
+every one, so a divergence is still reported at the first instruction and
+cycle where it happens:
+
+    scoreboard = Scoreboard(dut, Cpu(program))
+    scoreboard.start()          # While in reset, or right after an injection
+    await RomDriver(dut, program).run()
+    scoreboard.finish()         # Raises ScoreboardError on a divergence
+
+RAM cells and registers written by the ISS are compared at the end of every
+batch, finish() also compares the whole RAM and registers. The first
+divergence stops the scoreboard, its message holds the instruction, the clock
+cycle and both states. With waves, a cpuy_tb.waves.Waves, a divergence found
+while the simulation runs also starts a waveform capture, within 8
+instructions of the divergent one.
+"""
+
+import cocotb
+from cocotb.triggers import NextTimeStep
+
+from cpuy_iss.isa import (FETCHING_OPCODE, MOVLM, MOVWM, MOVWR, MULLW, MULMW, REGISTERS, RESETTING, XCHWM,
+                          disassemble)
+
+from .retired import CYCLE_MASK, CYCLE_SHIFT, EXT_INT_SHIFT, STATE_FIELDS, STATE_MASK, RetiredRing
+from .waves import divergence_waves
+
+
+def _ram_writes():
+    """RAM cell written by every opcode, as 1 + the index of the operand holding its address"""
+    table = bytearray(256)
+    for op in (MOVWM, MOVLM, XCHWM):
+        table[op] = table[op + 1] = 1
+    for op in (MULLW, MULMW): # High byte of the product
+        table[op] = table[op + 1] = 2
+    return bytes(table)
+
+
+_RAM_WRITE = _ram_writes()
+
+
+class ScoreboardError(AssertionError):
+    pass
+
+
+def pack_state(cpu):
+    """State of cpu packed like tb.state_tb"""
+    ports = cpu.ports
+    return (cpu.stack.ptr | cpu.interrupt_source << 4 | ports[1] << 7 | ports[0] << 15 | cpu.tmr_cfg << 23 |
+            cpu.cpu_cfg << 31 | cpu.flags << 39 | cpu.w << 47 | cpu.pc << 55)
+
+
+def unpack_state(value):
+    """STATE_FIELDS of an integer read from tb.state_tb"""
+    state = {}
+    for name, width in STATE_FIELDS:
+        state[name] = value & ((1 << width) - 1)
+        value >>= width
+    return state
+
+
+def _value(handle):
+    """Integer value of handle, None when it holds X or Z bits"""
+    value = handle.value
+    return value.integer if value.is_resolvable else None
+
+
+def _format_state(state):
+    # Most significant field, the PC, first
+    return " ".join(f"{name}={value:#x}" if isinstance(value, int) else f"{name}={value}"
+                    for name, value in reversed(state.items()))
+
+
+class Scoreboard:
+    """Compares the RTL with cpu, a Cpu holding the state the RTL starts from.
+
+    RAM and registers survive a reset, so start() copies them from the RTL into
+    cpu, cells holding X are compared again only once the ISS writes them.
+    Without waves, the capture $CPUY_WAVES=divergence configures is used.
+    """
+
+    def __init__(self, dut, cpu, waves=None):
+        self.dut = dut
+        self.cpu = cpu
+        self.waves, self._waves_options = (waves, {}) if waves is not None else divergence_waves() or (None, {})
+        self.divergence = None
+        self.retired = 0
+
+        # Cached handles
+        self._ring = RetiredRing(dut)
+        self._cpu_state = dut.cpuy.cpu_state
+        self._ram = dut.cpuy.ram
+        self._registers = dut.cpuy.registers
+        self._task = None
+
+    def start(self):
+        """Starts monitoring, the RTL must be in reset or between instructions"""
+        state = self._cpu_state.value
+        if not state.is_resolvable or state.integer not in (RESETTING, FETCHING_OPCODE):
+            raise ValueError(f"Scoreboard started with cpu_state {state}, not between instructions")
+        self.divergence = None
+        self.retired = 0
+        self._unknown = set()
+        for name, handles, values in (("RAM", self._ram, self.cpu.ram), ("R", self._registers, self.cpu.registers)):
+            for index in range(len(values)):
+                value = _value(handles[index])
+                if value is None:
+                    self._unknown.add((name, index))
+                else:
+                    values[index] = value
+
+        # The next entry recorded is the state cpu starts from, it gives the first cycle
+        self._ring.sync()
+        self._start_cycle = None
+        self._start_cycles = self.cpu.cycles
+        self._cycle = 0
+        self._written = {}
+        self._task = cocotb.start_soon(self._monitor())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+
+    def _diverged(self, message, rtl, iss, address):
+        self.divergence = (f"{message} after instruction {self.retired} at {address:#05x} "
+                           f"'{disassemble(self.cpu.rom, address)[0]}', cycle {self._cycle}:\n"
+                           f"  RTL: {_format_state(rtl)}\n  ISS: {_format_state(iss)}")
+        self.dut._log.error("Scoreboard divergence: %s", self.divergence)
+
+    async def _monitor(self):
+        while True:
+            await self._ring.wait()
+            if not self._drain():
+                break
+        if self.waves is not None:
+            await NextTimeStep() # Out of the read-only phase
+            self.waves.arm(**self._waves_options)
+
+    def _drain(self):
+        """Replays the retirements recorded since the last call, False on a divergence"""
+        cpu = self.cpu
+        rom = cpu.rom
+
+        for entry in self._ring.read():
+            try:
+                word = entry.integer
+            except ValueError:
+                word = None
+
+            if self._start_cycle is None:
+                if word is not None:
+                    self._start_cycle = (word >> CYCLE_SHIFT) & CYCLE_MASK
+                continue
+
+            address = cpu.pc
+            op = rom[address]
+            if word is None:
+                self._diverged("State holds X", {"entry": entry.binstr}, unpack_state(pack_state(cpu)), address)
+                return False
+            cpu.ext_int = (word >> EXT_INT_SHIFT) & 1
+            cpu.step()
+            self.retired += 1
+            self._cycle = ((word >> CYCLE_SHIFT) - self._start_cycle) & CYCLE_MASK
+
+            value = word & STATE_MASK
+            expected = pack_state(cpu)
+            if value != expected:
+                rtl, iss = unpack_state(value), unpack_state(expected)
+                fields = ", ".join(name for name in reversed(iss) if rtl[name] != iss[name])
+                self._diverged(f"State differs in {fields}", rtl, iss, address)
+                return False
+            if self._cycle != cpu.cycles - self._start_cycles:
+                self._diverged(f"RTL took {self._cycle} cycles, ISS {cpu.cycles - self._start_cycles}",
+                               unpack_state(value), unpack_state(expected), address)
+                return False
+
+            write = _RAM_WRITE[op]
+            if write:
+                cell = ("RAM", cpu.operands[write - 1])
+            elif MOVWR <= op < MOVWR + REGISTERS:
+                cell = ("R", op & 7)
+            else:
+                continue
+            self._written[cell] = (self.retired, self._cycle, address, value, expected)
+
+        return self._check_written()
+
+    def _check_written(self):
+        """Compares the RAM cells and registers written since the last check, False on a divergence"""
+        written, self._written = self._written, {}
+        for (name, index), (retired, cycle, address, value, expected) in written.items():
+            handle, iss = (self._ram, self.cpu.ram) if name == "RAM" else (self._registers, self.cpu.registers)
+            if _value(handle[index]) != iss[index]:
+                where = f"RAM[{index:#04x}]" if name == "RAM" else f"R{index}"
+                self.retired, self._cycle = retired, cycle
+                self._diverged(f"{where} is {handle[index].value}, ISS wrote {iss[index]:#x}",
+                               unpack_state(value), unpack_state(expected), address)
+                return False
+        return True
+
+    def compare_memories(self):
+        """Messages of the RAM cells and registers differing between the RTL and the ISS"""
+        messages = []
+        for name, handles, values in (("RAM", self._ram, self.cpu.ram), ("R", self._registers, self.cpu.registers)):
+            for index, expected in enumerate(values):
+                value = _value(handles[index])
+                if value is None and (name, index) in self._unknown:
+                    continue
+                if value != expected:
+                    where = f"RAM[{index:#04x}]" if name == "RAM" else f"R{index}"
+                    messages.append(f"{where}: RTL {handles[index].value}, ISS {expected:#x}")
+        return messages
+
+    def finish(self, memories=True):
+        """Checks the last retirements and raises a ScoreboardError on the first divergence found.
+
+        Call it with the RTL between instructions, as RomDriver.run() leaves it.
+        With memories, the whole RAM and the registers are compared as well,
+        which catches writes of the RTL to cells the ISS did not write.
+        """
+        running = self._task is not None
+        self.stop()
+        if running and self.divergence is None:
+            self._drain()
+        if self.divergence is None and memories:
+            messages = self.compare_memories()
+            if messages:
+                self.divergence = f"Memories differ after {self.retired} instructions: " + ", ".join(messages)
+        if self.divergence is not None:
+            raise ScoreboardError(self.divergence)
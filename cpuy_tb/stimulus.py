@@ -0,0 +1,39 @@
+"""Scheduled stimulus of ext_int_tb, p0in_tb and p1in_tb
+
+drive() applies a cpuy_iss.stimulus.Schedule with one Timer per cycle holding
+events, so a long run with sparse events costs as many wakeups as it has
+events. Started right after reset() releases rst_tb, the events of cycle n are
+applied half a period after the n-th rising edge, so the CPU sees them from the
+next rising edge on, the one a Player applying the same schedule to the ISS
+assumes.
+"""
+
+from cocotb.triggers import Timer
+from cocotb.utils import get_sim_steps, get_sim_time
+
+from cpuy_iss.stimulus import EXT_INT, INPUTS
+
+from .native import is_native
+
+
+async def drive(dut, schedule, clock_period=10, clock_units="us"):
+    """Applies the events of schedule, cycles counted from now, a rising edge of clk_tb"""
+    tb = dut.tb if is_native(dut) else dut
+    handles = [getattr(tb, f"{name}_tb") for name in INPUTS]
+    handles[EXT_INT] = dut.ext_int_tb # A port of the native toplevel too
+    # In simulator steps, a float time would not always be representable at the simulator precision
+    period = get_sim_steps(clock_period, clock_units)
+    start = get_sim_time() + period // 2
+
+    cycles = schedule.cycles
+    inputs = schedule.inputs
+    values = schedule.values
+    index = 0
+    while index < len(cycles):
+        cycle = cycles[index]
+        delay = start + cycle * period - get_sim_time()
+        if delay > 0:
+            await Timer(delay)
+        while index < len(cycles) and cycles[index] == cycle:
+            handles[inputs[index]].value = values[index]
+            index += 1
@@ -0,0 +1,141 @@
+import os
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+
+from cpuy_iss import Cpu
+from cpuy_iss.isa import HALT_BUDGET
+
+from .inject import fast_forward
+from .native import NativeRom, is_native
+from .profile import profile
+from .rom import RomDriver
+from .scoreboard import Scoreboard, ScoreboardError
+from .waves import capture
+
+# Cycles a table program may run before it is reported as not halting
+MAX_CYCLES = 2000
+
+
+class Program:
+    """One row of a program table: a program and the P0, P1 and RAM values expected when it halts.
+
+    Expectations left as None are not checked, ram maps RAM addresses to values.
+    p1 is the 8 bits P1 register, of which only the 4 low bits reach p1_tb.
+    The first fast_forward instructions run in the ISS and are injected into the RTL.
+    """
+
+    __slots__ = ("name", "program", "p0", "p1", "ram", "ext_int", "max_cycles", "halt_on_budget", "fast_forward")
+
+    def __init__(self, name, program, p0=None, p1=None, ram=None, ext_int=0, max_cycles=MAX_CYCLES,
+                 halt_on_budget=False, fast_forward=0):
+        self.name = name
+        self.program = program
+        self.p0 = p0
+        self.p1 = p1
+        self.ram = dict(ram or {})
+        self.ext_int = ext_int
+        self.max_cycles = max_cycles
+        self.halt_on_budget = halt_on_budget # Running out of max_cycles is the expected end
+        self.fast_forward = fast_forward
+
+    def __repr__(self):
+        return f"Program({self.name!r})"
+
+
+async def reset(dut, cycles=2):
+    """Holds rst_tb high for cycles clock cycles, the CPU then spends 2 more in RESETTING.
+
+    With $CPUY_COVERAGE set, it also starts the coverage collector of cpuy_tb.coverage,
+    with $CPUY_PROFILE the profiler of cpuy_tb.profile and with $CPUY_WAVES the
+    waveform capture of cpuy_tb.waves.
+    """
+    tb = dut.tb if is_native(dut) else dut
+    if os.environ.get("CPUY_COVERAGE"):
+        from .coverage import collect # NumPy is only needed for coverage
+        collect(tb)
+    if os.environ.get("CPUY_PROFILE"):
+        profile(tb)
+    if os.environ.get("CPUY_WAVES"):
+        capture(tb)
+    dut.rst_tb.value = 1
+    await ClockCycles(dut.clk_tb, cycles)
+    dut.rst_tb.value = 0
+
+
+def check(dut, row, result):
+    """Failure messages of row after its run, empty when it passed"""
+    failures = []
+    if result.reason == HALT_BUDGET and not row.halt_on_budget:
+        failures.append(f"Program did not halt in {row.max_cycles} cycles, PC at {result.address}")
+    for port, expected, handle in (("P0", row.p0, dut.p0_tb), ("P1", row.p1, dut.cpuy.ports[1])):
+        if expected is None:
+            continue
+        value = handle.value
+        if not value.is_resolvable or value.integer != expected:
+            failures.append(f"Unexpected {port}: desired {expected}, got {value}")
+    if row.ram:
+        ram = dut.cpuy.ram
+        for address, expected in sorted(row.ram.items()):
+            value = ram[address].value
+            if not value.is_resolvable or value.integer != expected:
+                failures.append(f"Unexpected RAM[{address}]: desired {expected}, got {value}")
+    return failures
+
+
+async def run_programs(dut, programs, clock_period=10, clock_units="us", lockstep=None):
+    """Runs a table of Programs back to back in the current simulation.
+
+    One clock and one RomDriver serve every program, the CPU is reset through
+    rst_tb between them. Registers and RAM keep their contents across a reset,
+    as in the RTL, so programs should not expect them to start cleared. Every
+    program is checked and logged, then a single AssertionError lists all the
+    programs that failed with their messages.
+
+    With lockstep (by default when $CPUY_LOCKSTEP is set) a Scoreboard checks
+    every instruction of every program against the ISS. On the tb_rom toplevel
+    the HDL clocks the CPU and feeds the ROM, see cpuy_tb.native.
+    """
+    if not programs:
+        return
+    if lockstep is None:
+        lockstep = bool(os.environ.get("CPUY_LOCKSTEP"))
+    if is_native(dut):
+        tb = dut.tb
+        driver = NativeRom(dut, programs[0].program)
+    else:
+        tb = dut
+        cocotb.start_soon(Clock(dut.clk_tb, clock_period, clock_units).start())
+        driver = RomDriver(dut, programs[0].program, clock_period=clock_period, clock_units=clock_units)
+
+    failed = []
+    for row in programs:
+        dut.ext_int_tb.value = row.ext_int
+        driver.load(row.program)
+        driver.max_cycles = row.max_cycles
+        await reset(dut)
+        if row.fast_forward:
+            cpu = await fast_forward(tb, row.program, row.ext_int, max_instructions=row.fast_forward)
+        else:
+            cpu = Cpu(row.program)
+        if lockstep:
+            scoreboard = Scoreboard(tb, cpu)
+            scoreboard.start()
+        result = await driver.run()
+
+        failures = check(tb, row, result)
+        if lockstep:
+            try:
+                scoreboard.finish()
+            except ScoreboardError as error:
+                failures.append(str(error))
+        if failures:
+            failed.append((row.name, failures))
+            dut._log.error("%s FAILED: %s", row.name, "; ".join(failures))
+        else:
+            dut._log.info("%s passed in %d cycles", row.name, result.cycles)
+
+    if failed:
+        raise AssertionError(f"{len(failed)} of {len(programs)} programs failed:\n" + "\n".join(
+            f"  {name}: {'; '.join(failures)}" for name, failures in failed))
@@ -0,0 +1,136 @@
+"""Trace recorder of the port outputs and retired instructions of the RTL
+
+The recorder wakes up on every change of ports_tb, p0out, p1out, p0cfg and
+p1cfg side by side in tb.v, and with retirements once per 8 instructions
+through cpuy_tb.retired. Events go to a cpuy_iss.trace.TraceWriter, which
+writes them in chunks, so memory stays bounded however long the run:
+
+    recorder = TraceRecorder(dut, "run.trace", retirements=True)
+    recorder.start()
+    await RomDriver(dut, program).run()
+    recorder.stop()
+
+Cycles count rising edges of clk_tb since start(), a port change is stamped
+with the edge it happened at and a retirement with the edge it retired at.
+The ports hold the values of the previous program until RESETTING clears them,
+so a recorder started in reset takes its first sample at the edge the CPU
+leaves RESETTING.
+"""
+
+import cocotb
+from cocotb.triggers import Edge, ReadOnly, RisingEdge
+
+from cpuy_iss.isa import RESETTING
+from cpuy_iss.trace import CHUNK_EVENTS, PORT_NAMES, PORTS, RETIREMENTS, TraceWriter, port_event, retirement_event
+
+from .retired import CYCLE_MASK, CYCLE_SHIFT, OP_CODE_SHIFT, STATE_FIELDS, STATES_SHIFT, RetiredRing
+
+_SHIFTS = {name: sum(width for _, width in STATE_FIELDS[:index]) for index, (name, _) in enumerate(STATE_FIELDS)}
+
+
+class _Clock:
+    """Cycles since start of 32 bits cycle_tb values read in order, across its wraps"""
+
+    def __init__(self, start):
+        self._raw = start
+        self.cycles = 0
+
+    def __call__(self, raw):
+        self.cycles += (raw - self._raw) & CYCLE_MASK
+        self._raw = raw
+        return self.cycles
+
+
+class TraceRecorder:
+    """Records the port changes, and optionally the retirements, of the RTL into a trace file"""
+
+    def __init__(self, dut, path, retirements=False, chunk_events=CHUNK_EVENTS):
+        self.dut = dut
+        self.path = path
+        self.retirements = retirements
+        self.writer = None
+        self.chunk_events = chunk_events
+
+        # Cached handles
+        self._ports = dut.ports_tb
+        self._cycle = dut.cycle_tb
+        self._rst = dut.rst_tb
+        self._cpu_state = dut.cpuy.cpu_state
+        self._rising_edge = RisingEdge(dut.clk_tb)
+        self._ring = RetiredRing(dut) if retirements else None
+        self._tasks = []
+
+    def start(self):
+        """Opens the trace and records the ports values at this cycle, 0, or in reset once the CPU leaves
+        RESETTING"""
+        self.writer = TraceWriter(self.path, self.chunk_events)
+        start = self._cycle.value.integer
+        self._ports_clock = _Clock(start)
+        self._values = [None] * len(PORT_NAMES)
+        resetting = self._resetting()
+        if not resetting:
+            self._record_ports(0)
+        self._tasks = [cocotb.start_soon(self._monitor_ports(resetting))]
+        if self._ring is not None:
+            self._ring.sync()
+            self._ring_clock = _Clock(start)
+            self._tasks.append(cocotb.start_soon(self._monitor_retirements()))
+
+    def stop(self):
+        """Stops recording, writing the retirements since the last wakeup, and closes the trace"""
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+        if self.writer is not None:
+            if self._ring is not None:
+                self._drain()
+            self.writer.close()
+
+    def _record_ports(self, cycle):
+        value = self._ports.value
+        if not value.is_resolvable:
+            return
+        value = value.integer
+        add = self.writer.add
+        for port, (shift, mask) in enumerate(((0, 0xFF), (8, 0x0F), (12, 0xFF), (20, 0x0F))):
+            port_value = value >> shift & mask
+            if port_value != self._values[port]:
+                self._values[port] = port_value
+                add(PORTS, cycle, port_event(port, port_value))
+
+    def _resetting(self):
+        rst, state = self._rst.value, self._cpu_state.value
+        return (not rst.is_resolvable or rst.integer or not state.is_resolvable or
+                state.integer == RESETTING)
+
+    async def _monitor_ports(self, resetting):
+        if resetting:
+            # Changes before are the previous values being cleared
+            while self._resetting():
+                await self._rising_edge
+                await ReadOnly()
+            self._record_ports(self._ports_clock(self._cycle.value.integer) - 1)
+
+        edge = Edge(self._ports)
+        while True:
+            await edge
+            # cycle_tb counted the edge the ports changed at
+            self._record_ports(self._ports_clock(self._cycle.value.integer) - 1)
+
+    def _drain(self):
+        add = self.writer.add
+        clock = self._ring_clock
+        for entry in self._ring.read():
+            if not entry.is_resolvable:
+                continue
+            word = entry.integer
+            cycle = clock((word >> CYCLE_SHIFT) & CYCLE_MASK)
+            if (word >> STATES_SHIFT) & (1 << RESETTING):
+                continue
+            add(RETIREMENTS, cycle, retirement_event(word >> _SHIFTS["pc"] & 0x3FF, (word >> OP_CODE_SHIFT) & 0xFF,
+                                                     word >> _SHIFTS["w"] & 0xFF, word >> _SHIFTS["flags"] & 0xFF))
+
+    async def _monitor_retirements(self):
+        while True:
+            await self._ring.wait()
+            self._drain()
@@ -0,0 +1,107 @@
+"""Extraction of the decode table of cpuy_iss.ucode from ucode.v
+
+tb_ucode.v decodes the 256 opcodes at once, sweep() drives every W x flags
+into it, checks that only jump_condition depends on them and packs the table.
+test/test_cpuy_ucode.py runs the sweep on the tb_ucode toplevel, caches the
+table and checks it against the decode of cpuy_iss.isa. This module runs that
+test when ucode.v changed, so tools always read a table of the current RTL:
+
+    python -m cpuy_tb.ucode [--sim verilator] [--dump] # Prints the cache entry
+
+    table = extract(sim="verilator") # From Python, cached after the first run
+"""
+
+import argparse
+import os
+import sys
+from array import array
+
+from cocotb.triggers import Timer
+
+from cpuy_iss import cache, ucode
+from cpuy_iss.isa import CARRY, MNEMONICS, SIGN, ZERO
+
+from .build import ROOT
+from .regress import run
+
+MODULE = "test.test_cpuy_ucode"
+TEST = "ucode_table"
+
+
+async def sweep(dut):
+    """Decode table of the tb_ucode toplevel, an array("I") of cpuy_iss.ucode words"""
+    controls = None
+    truths = [0] * 256
+    for w in range(256):
+        dut.w.value = w
+        for flags in range(8):
+            dut.carry.value = bool(flags & CARRY)
+            dut.zero.value = bool(flags & ZERO)
+            dut.sign.value = bool(flags & SIGN)
+            await Timer(1, units="ns")
+
+            words = dut.controls.value.integer
+            if controls is None:
+                controls = words
+            elif words != controls:
+                op = next(op for op in range(256) if (words ^ controls) >> (32 * op) & 0xFFFF_FFFF)
+                raise ValueError(f"Outputs of {MNEMONICS[op] or 'NOP'} ({op:#04x}) depend on W or the flags "
+                                 f"(w={w:#04x}, flags={flags:#05b}), only jump_condition may")
+
+            jumps = dut.jump_condition.value.integer
+            index = w << 3 | flags
+            while jumps:
+                op = (jumps & -jumps).bit_length() - 1
+                truths[op] |= 1 << index
+                jumps &= jumps - 1
+
+    return array("I", (ucode.pack((controls >> (32 * op)) & 0xFFFF_FFFF, truths[op]) for op in range(256)))
+
+
+def extract(sim="icarus", waves="fst", force=False):
+    """Decode table of ucode.v, simulated only when no table of the current ucode.v is cached"""
+    table = None if force else ucode.load_table()
+    if table is not None:
+        return table
+
+    result, = run([(MODULE, TEST)], sim, jobs=1, waves=waves, directory=os.path.join(ROOT, "sim_build", "ucode"))
+    table = ucode.load_table()
+    if result.status != "passed" or table is None:
+        raise SystemExit(f"Decode table extraction failed: {result.message or 'no table cached'}")
+    return table
+
+
+def dump(table):
+    """Text of every decoded opcode, its condition and the outputs it sets"""
+    lines = []
+    for op, word in enumerate(table):
+        if not word:
+            continue
+        kind, bit = ucode.jump_kind(word)
+        condition = ucode.CONDITION_NAMES[kind] + (f" {bit}" if kind in (ucode.CONDITION_W_CLEAR,
+                                                                         ucode.CONDITION_W_SET) else "")
+        outputs = [name if width == 1 else f"{name}={value}"
+                   for (name, width), value in zip(ucode.FIELDS, ucode.fields(word).values()) if value]
+        lines.append(f"{op:#04x} {MNEMONICS[op] or 'NOP':<9} {condition:<9} {', '.join(outputs)}")
+    lines.append(f"{sum(1 for word in table if word)} opcodes decoded, {sum(1 for word in table if not word)} as NOP")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cpuy_tb.ucode", description=__doc__.splitlines()[0])
+    parser.add_argument("--sim", default=os.environ.get("SIM", "icarus"), choices=("icarus", "verilator"))
+    parser.add_argument("--waves", default=os.environ.get("WAVES_FORMAT", "fst"), choices=("fst", "vcd"),
+                        help="format of the waveform capture built in, as in the regression")
+    parser.add_argument("--force", action="store_true", help="extract the table even if it is cached")
+    parser.add_argument("--dump", action="store_true", help="print the decode of every opcode")
+    args = parser.parse_args(argv)
+
+    table = extract(args.sim, args.waves, args.force)
+    if args.dump:
+        print(dump(table))
+    print(cache.path("ucode", ucode.key()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Windowed waveform capture
+
+Builds with waves (`python -m cpuy_tb.build --waves`, `make test_cpuy`) add
+waves.v to tb, which dumps nothing until a capture is armed. A capture starts
+at its trigger, in the HDL so waiting for it costs no wakeups, and dumps the
+selected scopes into cpuy.fst in the working directory for a number of cycles
+or until it is stopped:
+
+    waves = Waves(dut)
+    waves.arm(cycles=200)                       # Right away, for 200 cycles
+    waves.arm(pc=0x20, scopes=("cpuy", "alu"))  # When the instruction at 0x20 starts
+    waves.arm(interrupt=True, cycles=50)        # At the next interruption entry
+    waves.stop()
+
+Scoreboard(dut, cpu, waves=waves) starts a capture on a divergence. With
+$CPUY_WAVES set, the first reset of a simulation arms a capture from it:
+`start`, `pc=0x20`, `interrupt` or `divergence`, optionally followed by
+`,cycles=N` and `,scopes=cpuy+alu`.
+
+The scopes of the first capture of a simulation are the ones every later
+capture dumps. Verilator ignores $dumpoff and the scopes of $dumpvars: its
+captures dump every scope from the first trigger to the end of the simulation.
+"""
+
+import os
+
+# Scopes of waves.v, in the order of the bits of waves.scopes
+SCOPES = ("tb", "cpuy", "alu", "stack", "timers")
+
+TRIGGER_NOW = 0
+TRIGGER_PC = 1
+TRIGGER_INTERRUPT = 2
+
+
+class Waves:
+    """Handles of the waves instance of tb"""
+
+    def __init__(self, dut):
+        if not hasattr(dut, "waves"):
+            raise RuntimeError("No waveform capture in this simulation, build it with python -m cpuy_tb.build "
+                               "--waves")
+        self._waves = dut.waves
+
+    @property
+    def capturing(self):
+        value = self._waves.capturing.value
+        return value.is_resolvable and bool(value.integer)
+
+    def arm(self, pc=None, interrupt=False, cycles=0, scopes=SCOPES):
+        """Captures cycles cycles (0: until stopped) from the start of the instruction at pc, the next
+        interruption entry, or the next clock edge"""
+        unknown = set(scopes) - set(SCOPES)
+        if unknown:
+            raise ValueError(f"Unknown scopes {', '.join(sorted(unknown))}, scopes are {', '.join(SCOPES)}")
+        waves = self._waves
+        waves.scopes.value = sum(1 << SCOPES.index(scope) for scope in scopes)
+        if pc is not None:
+            waves.trigger.value = TRIGGER_PC
+            waves.trigger_pc.value = pc
+        else:
+            waves.trigger.value = TRIGGER_INTERRUPT if interrupt else TRIGGER_NOW
+        waves.window.value = cycles
+        waves.armed.value = 1
+
+    def stop(self):
+        """Ends the capture, or disarms a capture not triggered yet"""
+        self._waves.armed.value = 0
+
+
+def parse(spec):
+    """(trigger, Waves.arm keyword arguments) of a $CPUY_WAVES value"""
+    trigger, *options = [part.strip() for part in spec.split(",")]
+    kwargs = {}
+    if trigger.startswith("pc="):
+        trigger, kwargs["pc"] = "pc", int(trigger[3:], 0)
+    elif trigger == "interrupt":
+        kwargs["interrupt"] = True
+    elif trigger not in ("start", "divergence"):
+        raise ValueError(f"Unknown waveform trigger {trigger!r}, use start, pc=ADDRESS, interrupt or divergence")
+    for option in options:
+        name, _, value = option.partition("=")
+        if name == "cycles":
+            kwargs["cycles"] = int(value, 0)
+        elif name == "scopes":
+            kwargs["scopes"] = tuple(value.split("+"))
+        else:
+            raise ValueError(f"Unknown waveform option {option!r}, use cycles=N or scopes=a+b")
+    return trigger, kwargs
+
+
+_waves = None
+_divergence = None
+
+
+def capture(dut, spec=None):
+    """Arms the capture described by spec ($CPUY_WAVES) on the first call of a simulation.
+
+    A divergence trigger is kept for divergence_waves() instead.
+    """
+    global _waves, _divergence
+    spec = spec or os.environ.get("CPUY_WAVES")
+    if not spec or _waves is not None:
+        return _waves
+    trigger, kwargs = parse(spec)
+    _waves = Waves(dut)
+    if trigger == "divergence":
+        _divergence = kwargs
+    else:
+        _waves.arm(**kwargs)
+    return _waves
+
+
+def divergence_waves():
+    """(Waves, Waves.arm keyword arguments) when $CPUY_WAVES captures divergences, else None"""
+    if _divergence is None:
+        return None
+    return _waves, _divergence
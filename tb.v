@@ -12,20 +12,103 @@ module tb (
 	input wire rst_tb,
 	input wire ext_int_tb,
 	input wire [7:0] data_bus_tb,
-	output reg [11:0] addr_bus_tb,
-	output reg [7:0] p0_tb,
-	output reg [7:0] p1_tb
+	output wire [9:0] addr_bus_tb,
+	output wire [7:0] p0_tb,
+	output wire [3:0] p1_tb
 );
 
+    // Idle loop fed in the HDL while cpuy_tb.idle skips it: with idle_tb set, the idle_length_tb bytes from
+    // idle_address_tb come from idle_rom_tb instead of data_bus_tb
+    reg idle_tb = 0;
+    reg [9:0] idle_address_tb = 0;
+    reg [3:0] idle_length_tb = 0;
+    reg [63:0] idle_rom_tb = 0;
+    wire [9:0] idle_offset_tb = addr_bus_tb - idle_address_tb;
+    wire [7:0] data_bus = idle_tb && idle_offset_tb < { 6'b0, idle_length_tb } ?
+                          idle_rom_tb[{ idle_offset_tb[2:0], 3'b000 } +: 8] : data_bus_tb;
+
+    // Port inputs, driven by cpuy_tb.stimulus
+    reg [7:0] p0in_tb = 0;
+    reg [3:0] p1in_tb = 0;
+
+    // Port outputs side by side, watched by cpuy_tb.trace
+    wire [7:0] p0cfg_tb;
+    wire [3:0] p1cfg_tb;
+    wire [23:0] ports_tb = { p1cfg_tb, p0cfg_tb, p1_tb, p0_tb };
+
     // instantiate the DUT
     cpuy cpuy(
 	    .clk (clk_tb),
 	    .rst (rst_tb),
 	    .ext_int (ext_int_tb),
-	    .data_bus (data_bus_tb),
+	    .data_bus (data_bus),
+	    .p0in (p0in_tb),
+	    .p1in (p1in_tb),
 	    .addr_bus (addr_bus_tb),
-	    .p0 (p0_tb),
-	    .p1 (p1_tb)
+	    .p0out (p0_tb),
+	    .p1out (p1_tb),
+	    .p0cfg (p0cfg_tb),
+	    .p1cfg (p1cfg_tb)
+    );
+
+    // Retirement of an instruction and the architectural state at that point
+    wire retired_tb = cpuy.cpu_state == 1; // FETCHING_OPCODE
+    wire [64:0] state_tb = { cpuy.pc, cpuy.w, cpuy.flags, cpuy.cpu_cfg, cpuy.tmr_cfg, cpuy.ports[0], cpuy.ports[1],
+                             cpuy.interrupt_source, cpuy.stack.stack_ptr };
+
+    // Ring of the last 16 retirements as { interruption latency, ALU operation, timer overflows, cpu_state
+    // values visited, opcode, ext_int at EXECUTING, clock cycle, state }, read by cpuy_tb.retired one half at
+    // a time when retired_half_tb toggles
+    reg [31:0] cycle_tb = 0;
+    reg executed_ext_int_tb = 0;
+    reg [5:0] visited_states_tb = 0;
+    reg [1:0] overflows_tb = 0;
+    reg [1:0] overflow_q_tb = 0;
+    reg [3:0] retired_count_tb = 0;
+    reg [130:0] retired_ring_tb [15:0];
+    wire retired_half_tb = retired_count_tb[3];
+    wire [1:0] overflow_tb = { cpuy.tmr1.overflow, cpuy.tmr0.overflow };
+
+    // Cycle every interruption request rose in, by source, and the cycles since the one of the source taken
+    wire [3:0] requests_tb = { cpuy.done_t1, cpuy.done_t0, ext_int_tb, 1'b0 };
+    reg [3:0] requests_q_tb = 0;
+    reg [31:0] requested_cycle_tb [3:0];
+    wire [31:0] latency_tb = cycle_tb - requested_cycle_tb[cpuy.interrupt_source[1:0]];
+    integer source_tb;
+
+    initial
+        for (source_tb = 0; source_tb < 4; source_tb = source_tb + 1)
+            requested_cycle_tb[source_tb] = 0;
+
+    always @(posedge clk_tb) begin
+        cycle_tb <= cycle_tb + 1;
+        overflow_q_tb <= overflow_tb;
+        requests_q_tb <= requests_tb;
+        for (source_tb = 1; source_tb < 4; source_tb = source_tb + 1)
+            if (requests_tb[source_tb] & !requests_q_tb[source_tb])
+                requested_cycle_tb[source_tb] <= cycle_tb;
+        if (cpuy.cpu_state == 4) // EXECUTING
+            executed_ext_int_tb <= ext_int_tb;
+        if (retired_tb) begin
+            retired_ring_tb[retired_count_tb] <= { latency_tb[15:0], cpuy.alu_operation_ucode, overflows_tb,
+                                                   visited_states_tb, cpuy.op_code, executed_ext_int_tb, cycle_tb,
+                                                   state_tb };
+            retired_count_tb <= retired_count_tb + 1'b1;
+            visited_states_tb <= 6'b000010;
+            overflows_tb <= overflow_tb & ~overflow_q_tb;
+        end else begin
+            visited_states_tb <= visited_states_tb | (6'b000001 << cpuy.cpu_state);
+            overflows_tb <= overflows_tb | (overflow_tb & ~overflow_q_tb);
+        end
+    end
+
+`ifdef CPUY_WAVES
+    // Waveform capture controlled by cpuy_tb.waves
+    waves waves (
+	    .clk (clk_tb),
+	    .pc (cpuy.pc),
+	    .cpu_state (cpuy.cpu_state)
     );
+`endif
 
 endmodule
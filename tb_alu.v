@@ -0,0 +1,42 @@
+`default_nettype none
+`timescale 1ns/1ns
+
+/*
+ALU toplevel for test/test_cpuy_alu.py: 256 alu instances, one per op2 value,
+share operation, op1 and cpu_carry so every timestep evaluates 256 points.
+Lane n drives bits 8n+7:8n of result_l and result_h and bit n of the flags
+*/
+
+module tb_alu (
+	input wire enable,
+	input wire [7:0] operation,
+	input wire [7:0] op1,
+	input wire cpu_carry,
+	output wire [2047:0] result_l,
+	output wire [2047:0] result_h,
+	output wire [255:0] carry,
+	output wire [255:0] zero,
+	output wire [255:0] sign
+);
+
+	genvar lane;
+	generate
+		for (lane = 0; lane < 256; lane = lane + 1) begin : lanes
+			wire [7:0] op2 = lane[7:0];
+
+			alu alu (
+				.enable (enable),
+				.operation (operation),
+				.op1 (op1),
+				.op2 (op2),
+				.cpu_carry (cpu_carry),
+				.result_l (result_l[8 * lane +: 8]),
+				.result_h (result_h[8 * lane +: 8]),
+				.carry (carry[lane]),
+				.zero (zero[lane]),
+				.sign (sign[lane])
+			);
+		end
+	endgenerate
+
+endmodule
@@ -0,0 +1,64 @@
+`default_nettype none
+`timescale 1ns/1ns
+
+/*
+native toplevel: tb with its clock and ROM in the HDL, so programs run without
+the cocotb Clock and RomDriver. cpuy_tb.native writes the ROM image into
+cpuy_rom.hex in the working directory and toggles load, then releases reset
+and waits for halted, the HDL version of the halt conditions of RomDriver
+*/
+
+module tb_rom (
+	input wire rst_tb,
+	input wire ext_int_tb,
+	output wire [9:0] addr_bus_tb,
+	output wire [7:0] p0_tb,
+	output wire [3:0] p1_tb
+);
+
+	// 10 us, the clock period of the cocotb tests
+	reg clk_tb = 0;
+	always #5000 clk_tb = ~clk_tb;
+
+	// ROM word and the HALT_FLAG_* bits of cpuy_iss.isa.halt_flags of every address
+	reg [15:0] image [0:1023];
+	reg load = 0;
+	wire [7:0] data_bus_tb = image[addr_bus_tb][7:0];
+	wire [7:0] halt_flags = image[addr_bus_tb][15:8];
+
+	// Written by cpuy_tb.native, halted holds the halt flag and address until the next run
+	reg running = 0;
+	reg halted = 0;
+	reg [2:0] halt_flag = 0;
+	reg [9:0] halt_address = 0;
+	reg [9:0] previous_address = 0;
+
+	tb tb (
+		.clk_tb (clk_tb),
+		.rst_tb (rst_tb),
+		.ext_int_tb (ext_int_tb),
+		.data_bus_tb (data_bus_tb),
+		.addr_bus_tb (addr_bus_tb),
+		.p0_tb (p0_tb),
+		.p1_tb (p1_tb)
+	);
+
+	always @(load) begin
+		$readmemh("cpuy_rom.hex", image);
+	end
+
+	// Same as RomDriver: every change of the address bus, PC arrives at a Jmp to itself from its
+	// second operand only once the jump executed
+	always @(addr_bus_tb) begin
+		if (running && !halted) begin
+			if (halt_flags[0] || halt_flags[1] ||
+			    (halt_flags[2] && previous_address == addr_bus_tb + 10'd3)) begin
+				halted = 1;
+				halt_flag = halt_flags[0] ? 3'b001 : (halt_flags[1] ? 3'b010 : 3'b100);
+				halt_address = addr_bus_tb;
+			end
+		end
+		previous_address = addr_bus_tb;
+	end
+
+endmodule
@@ -0,0 +1,67 @@
+`default_nettype none
+`timescale 1ns/1ns
+
+/*
+Microcode toplevel for cpuy_tb.ucode: 256 ucode instances, one per opcode,
+share w and the flags so every timestep decodes all the opcodes. Lane n drives
+bits 32n+31:32n of controls, its outputs but jump_condition in the field order
+of cpuy_iss.ucode.FIELDS from bit 0, and bit n of jump_condition
+*/
+
+module tb_ucode (
+	input wire [7:0] w,
+	input wire carry,
+	input wire zero,
+	input wire sign,
+	output wire [8191:0] controls,
+	output wire [255:0] jump_condition
+);
+
+	genvar lane;
+	generate
+		for (lane = 0; lane < 256; lane = lane + 1) begin : lanes
+			wire [7:0] opcode = lane[7:0];
+			wire alu_operation, alu_multibyte_result, jump_operation, mov_operation, destination_w;
+			wire destination_flags, destination_memory, destination_registers, destination_ports;
+			wire [2:0] destination_index;
+			wire ram_operand, duplicate_w, source_ports, source_registers, stack_operation, stack_direction;
+			wire destination_cpu_config, destination_timer_config, destination_ports_config, source_operands;
+
+			ucode ucode (
+				.opcode (opcode),
+				.w (w),
+				.carry (carry),
+				.zero (zero),
+				.sign (sign),
+				.alu_operation (alu_operation),
+				.alu_multibyte_result (alu_multibyte_result),
+				.jump_operation (jump_operation),
+				.jump_condition (jump_condition[lane]),
+				.mov_operation (mov_operation),
+				.destination_w (destination_w),
+				.destination_flags (destination_flags),
+				.destination_memory (destination_memory),
+				.destination_registers (destination_registers),
+				.destination_ports (destination_ports),
+				.destination_index (destination_index),
+				.ram_operand (ram_operand),
+				.duplicate_w (duplicate_w),
+				.source_ports (source_ports),
+				.source_registers (source_registers),
+				.stack_operation (stack_operation),
+				.stack_direction (stack_direction),
+				.destination_cpu_config (destination_cpu_config),
+				.destination_timer_config (destination_timer_config),
+				.destination_ports_config (destination_ports_config),
+				.source_operands (source_operands)
+			);
+
+			assign controls[32 * lane +: 32] = {10'b0, source_operands, destination_ports_config,
+				destination_timer_config, destination_cpu_config, stack_direction, stack_operation,
+				source_registers, source_ports, duplicate_w, ram_operand, destination_index, destination_ports,
+				destination_registers, destination_memory, destination_flags, destination_w, mov_operation,
+				jump_operation, alu_multibyte_result, alu_operation};
+		end
+	endgenerate
+
+endmodule
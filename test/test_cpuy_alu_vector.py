@@ -0,0 +1,22 @@
+import numpy as np
+
+from cpuy_iss.alu import OPERATIONS
+from cpuy_iss.alu_vector import alu
+from cpuy_iss.isa import CARRY, SIGN, ZERO
+
+
+def test_scalar_mirror():
+    op1, op2, cpu_carry = np.meshgrid(np.arange(0, 256, 5), np.arange(0, 256, 7), (0, 1), indexing="ij")
+    for operation in range(256):
+        result_l, result_h, carry, zero, sign = alu(operation, op1, op2, cpu_carry)
+        flags = carry * CARRY | zero * ZERO | sign * SIGN
+        for index in zip(*(axis.ravel() for axis in np.indices(op1.shape))):
+            desired = OPERATIONS[operation](int(op1[index]), int(op2[index]), int(cpu_carry[index]))
+            got = (result_l[index], result_h[index], flags[index])
+            assert desired == got, f"Unexpected output of {operation:#04x} for {op1[index]}, {op2[index]}, " \
+                f"{cpu_carry[index]}: desired {desired}, got {got}"
+
+
+def test_disabled():
+    outputs = alu(0x88, 200, 100, 1, enable=False)
+    assert [int(output) for output in outputs] == [0, 0, 0, 0, 0]
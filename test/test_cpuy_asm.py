@@ -0,0 +1,82 @@
+import pytest
+
+from cpuy_iss import Cpu
+from cpuy_iss.asm import AssemblerError, assemble, main, to_bin, to_hex
+from cpuy_iss.isa import ROM_SIZE
+
+from .test_cpuy_iss import timer_interruption
+
+timer_interruption_source = """
+        Jmp main
+        .org 0x20               ; Timer 0 interruption vector
+        MovLW 135
+        AddLW 2
+        MovWP0
+        Ret
+        .org 0x40
+main:   MovLW 20                ; Timer 0 counts 20 down
+        MovWR0
+        MovLW 0
+        MovWR1
+        MovLW 1
+        TmrCfg
+        MovLW 160               ; GIE and T0IE
+        CpuCfg
+loop:   Jmp loop
+"""
+
+
+def test_hand_encoded():
+    assert assemble(timer_interruption_source, use_cache=False) == bytearray(timer_interruption)
+    assert assemble("movlw 120\nMulLW 220, 7\nMovWP0\nMovMW 7\nMovWP1\nNOP\n.byte 127", use_cache=False) == \
+        bytearray([132, 120, 145, 220, 7, 64, 128, 7, 65, 0, 127])
+
+
+def test_symbols():
+    program = assemble("""
+        .equ BASE, 0x100
+        Call BASE+3
+        Tb7js end
+        .org BASE+3
+end:    Ret
+        .byte end-BASE, 0b101
+    """, use_cache=False)
+    assert program[:6] == bytearray([0xAB, 0x03, 0x01, 0xFF, 0x03, 0x01])
+    assert program[0x103:] == bytearray([60, 3, 5])
+
+    cpu = Cpu(program)
+    cpu.step()
+    assert cpu.pc == 0x103, f"Unexpected PC: desired 0x103, got {cpu.pc:#x}"
+
+
+@pytest.mark.parametrize("source, message", [
+    ("Inc 1", "takes no operands"),
+    ("MovLW", "takes 1 or 2 operands"),
+    ("MovLM 1, 2, 3", "takes 1 or 2 operands"),
+    ("AddLW 256", "does not fit in a byte"),
+    ("Jmp 0x400", "out of the ROM"),
+    ("Jmp nowhere", "undefined symbol"),
+    ("Foo", "unknown mnemonic"),
+    ("a: NOP\na: NOP", "redefined"),
+    ("NOP\n.org 0\nNOP", "overlaps"),
+    ("AddLW 1 2", "invalid operand"),
+])
+def test_errors(source, message):
+    with pytest.raises(AssemblerError, match=message):
+        assemble(source, use_cache=False)
+
+
+def test_images(tmp_path, monkeypatch):
+    monkeypatch.setenv("CPUY_CACHE", str(tmp_path / "cache"))
+    source = "MovLW 25\nMovWP0\n.byte 0, 0, 127 ; test_images"
+    program = assemble(source)
+    assert list((tmp_path / "cache" / "asm").glob("*/*")), "Image not cached"
+    assert assemble(source) == program
+
+    lines = to_hex(program).splitlines()
+    assert len(lines) == ROM_SIZE and lines[:3] == ["84", "19", "40"]
+    assert to_bin(program) == bytes(program) + bytes(ROM_SIZE - len(program))
+
+    (tmp_path / "program.s").write_text(source)
+    main([str(tmp_path / "program.s"), "-o", str(tmp_path / "program.bin")])
+    assert (tmp_path / "program.bin").read_bytes() == to_bin(program)
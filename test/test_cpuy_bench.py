@@ -0,0 +1,28 @@
+from bench.run import ISS, BenchResult, check_rtl, compare, run_iss, update_baseline
+
+
+def test_budgets():
+    iss = run_iss(["alu_loop", "timer_isr"], repeat=1)
+    baseline = update_baseline({"version": 1, "workloads": {}, "throughput": {}}, iss)
+    assert not any(compare(result, baseline, 0.3)[0] for result in iss)
+
+    rtl = [BenchResult(result.workload, "verilator", "passed", "", 1.0, result.cycles, result.instructions)
+           for result in iss]
+    rtl[1].cycles += 1
+    check_rtl(rtl, iss)
+    assert rtl[0].status == "passed" and rtl[1].status == "failed"
+
+    failed, note = compare(rtl[1], baseline, 0.3)
+    assert failed and "cpuy_iss" in note
+    rtl[1].status = "passed"
+    failed, note = compare(rtl[1], baseline, 0.3)
+    assert failed and note.startswith("over budget")
+    assert compare(rtl[0], baseline, 0.3) == (False, "no throughput baseline")
+
+
+def test_throughput():
+    baseline = {"version": 1, "workloads": {}, "throughput": {ISS: {"alu_loop": 1000.0}}}
+    assert compare(BenchResult("alu_loop", ISS, "passed", "", 1.0, 800), baseline, 0.3) == \
+        (False, "no cycle budget, -20%")
+    failed, note = compare(BenchResult("alu_loop", ISS, "passed", "", 1.0, 600), baseline, 0.3)
+    assert failed and note.endswith("40% slower than 1000 cycles/s")
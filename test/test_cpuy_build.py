@@ -0,0 +1,103 @@
+import os
+
+from cpuy_tb import build, regress
+
+
+def test_build_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(build, "ROOT", str(tmp_path))
+    (tmp_path / "test").mkdir()
+    for source in ("tb.v", "cpuy.v"):
+        (tmp_path / source).write_text(f"module {source[:-2]}; endmodule\n")
+    (tmp_path / build.LINT_WAIVERS).write_text("`verilator_config\n")
+    sources = ("tb.v", "cpuy.v")
+
+    key = build.build_key("icarus", sources)
+    (tmp_path / "test" / "test_cpuy.py").write_text("# Tests only\n")
+    assert build.build_key("icarus", sources) == key, "Key changed without changes to the RTL"
+
+    assert build.build_key("icarus", sources, defines=("X=1",)) != key
+    assert build.build_key("icarus", sources, toplevels=("tb", "dump")) != key
+    verilator_key = build.build_key("verilator", sources)
+    assert verilator_key != key
+    (tmp_path / build.LINT_WAIVERS).write_text("`verilator_config\nlint_off -rule WIDTHTRUNC\n")
+    assert build.build_key("verilator", sources) != verilator_key, "Key unchanged after changes to the waivers"
+    assert build.build_key("icarus", sources) == key
+    (tmp_path / "cpuy.v").write_text("module cpuy; wire a; endmodule\n")
+    assert build.build_key("icarus", sources) != key, "Key unchanged after changes to the RTL"
+
+
+def test_cached_build(tmp_path, monkeypatch):
+    monkeypatch.setenv("CPUY_CACHE", str(tmp_path / "cache"))
+    compilations = tmp_path / "compilations"
+
+    def fake_commands(sim, build_dir, sources, toplevels, defines):
+        return [["sh", "-c", f"echo >> {compilations}; touch {os.path.join(build_dir, 'sim.vvp')}"]]
+
+    monkeypatch.setattr(build, "build_command", fake_commands)
+    build_dir = build.build("icarus")
+    assert os.path.exists(os.path.join(build_dir, "sim.vvp")), "Simulation not published to the cache"
+    assert build.build("icarus") == build_dir
+    assert len(compilations.read_text().splitlines()) == 1, "Cached build compiled again"
+    assert build.build("icarus", force=True) == build_dir
+    assert len(compilations.read_text().splitlines()) == 2, "Forced build not compiled"
+
+
+def test_result_key(tmp_path):
+    for package, modules in (("test", {"test_a": "from cpuy_tb import RomDriver\nfrom .common import ROM\n",
+                                       "test_b": "import cpuy_iss.isa\n", "common": "ROM = b'\\x84'\n"}),
+                             ("cpuy_tb", {"__init__": "from .rom import RomDriver\n", "rom": "import os\n",
+                                          "coverage": ""}),
+                             ("cpuy_iss", {"__init__": "", "isa": ""})):
+        (tmp_path / package).mkdir()
+        for module, source in modules.items():
+            (tmp_path / package / f"{module}.py").write_text(source)
+
+    sources = [os.path.relpath(path, tmp_path) for path in regress.module_sources("test.test_a", str(tmp_path))]
+    assert sources == ["cpuy_tb/__init__.py", "cpuy_tb/rom.py", "test/common.py", "test/test_a.py"]
+
+    def key(module="test.test_a", env={}):
+        sources = regress.sources_digest(regress.module_sources(module, str(tmp_path)), str(tmp_path))
+        return regress.result_key("build", module, "t", sources, env)
+
+    a, b = key(), key("test.test_b")
+    (tmp_path / "test" / "test_b.py").write_text("import cpuy_iss.isa\nimport os\n")
+    (tmp_path / "cpuy_tb" / "coverage.py").write_text("import numpy\n")
+    assert key() == a, "Key changed after changes to modules the test does not import"
+    assert key("test.test_b") != b
+    assert key(env={"CPUY_LOCKSTEP": "1", "CPUY_CACHE": "/tmp"}) != a
+    assert key(env={"CPUY_CACHE": "/tmp", "HOME": "/"}) == a
+    (tmp_path / "test" / "common.py").write_text("ROM = b'\\x85'\n")
+    assert key() != a, "Key unchanged after changes to the program"
+
+
+def test_cached_results(tmp_path, monkeypatch):
+    monkeypatch.setenv("CPUY_CACHE", str(tmp_path / "cache"))
+    monkeypatch.delenv("CPUY_WAVES", raising=False)
+    runs = []
+
+    def fake_run_test(sim, build_dir, work_dir, module, name, env):
+        runs.append(name)
+        element = regress.ET.Element("testcase", sim_time_ns="20000")
+        if name == "fails":
+            regress.ET.SubElement(element, "failure", message="Unexpected P0")
+        return regress.TestResult(module, name, "failed" if name == "fails" else "passed",
+                                  "Unexpected P0" if name == "fails" else "", 1.5, 20000.0, element)
+
+    monkeypatch.setattr(regress, "run_test", fake_run_test)
+    monkeypatch.setattr(regress, "build", lambda *args: str(tmp_path))
+    monkeypatch.setattr(regress, "build_key", lambda *args: "build")
+    tests = [("test.test_cpuy_asm", "passes"), ("test.test_cpuy_asm", "fails")]
+    directory = str(tmp_path / "regress")
+
+    first = regress.run(tests, directory=directory, cache_results=True)
+    replayed = regress.run(tests, directory=directory, cache_results=True)
+    assert sorted(runs) == ["fails", "passes"], "Cached results simulated again"
+    assert [result.cached for result in replayed] == [True, True]
+    assert [(result.status, result.message, result.cycles) for result in replayed] == \
+        [(result.status, result.message, result.cycles) for result in first]
+    regress.write_report(replayed, str(tmp_path / "results.xml"), 0.1)
+    assert 'cached="true"' in (tmp_path / "results.xml").read_text()
+
+    regress.run(tests, directory=directory, cache_results=True, force=True)
+    regress.run(tests, directory=directory)
+    assert len(runs) == 6, "Forced or uncached runs replayed from the cache"
@@ -0,0 +1,137 @@
+import cocotb
+from cocotb.clock import Clock
+
+from cpuy_iss import Cpu
+from cpuy_iss.asm import assemble
+from cpuy_iss.checkpoint import differences, record
+from cpuy_tb import RomDriver
+from cpuy_tb.checkpoint import CheckpointRecorder, replay_divergence
+from cpuy_tb.table import reset
+
+from .test_cpuy_iss import timer_interruption
+
+INTERVAL = 128
+
+# Counts RAM[0] down from 250 while Timer 0 interruptions add 3 to RAM[1], writes RAM[2] once at 100
+source = """
+        Jmp main
+        .org 0x20               ; Timer 0 interruption vector
+        MovMW 1
+        AddLW 3
+        MovWM 1
+        Ret
+        .org 0x40
+main:   MovLW 40                ; Timer 0 counts 40 down with autoreload
+        MovWR0
+        MovLW 0
+        MovWR1
+        MovLW 5
+        TmrCfg
+        MovLW 160               ; GIE and T0IE
+        CpuCfg
+        MovLM 0, 250
+        MovLM 1, 0
+loop:   MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        SubLW 100
+        JmpZ half
+        Jmp loop
+half:   MovLM 2, {half}
+        Jmp loop
+done:   MovMW 1
+        MovWP0
+        MovMW 2
+        MovWP1
+        NOP
+        NOP
+        .byte 127
+"""
+program = assemble(source.format(half=7))
+
+
+async def record_run(dut, program=program, **options):
+    # RAM cells and a timer count a previous program left, a reset keeps them
+    for address in (2, 5, 0x3E):
+        dut.cpuy.ram[address].value = 0xA5
+    dut.cpuy.tmr1.counter.value = 0x1234
+    await reset(dut)
+    recorder = CheckpointRecorder(dut, program, INTERVAL)
+    recorder.start()
+    await RomDriver(dut, program, **options).run()
+    recorder.stop()
+    return recorder.snapshots
+
+
+def expected(program, snapshots, **halt):
+    """Snapshots of the ISS from the first one of the RTL, at the same instruction counts"""
+    cpu = Cpu(program)
+    snapshots[0].restore(cpu)
+    return snapshots[:1] + record(cpu, [snapshot.instructions for snapshot in snapshots[1:]], **halt)
+
+
+@cocotb.test()
+async def checkpoint_snapshots(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    snapshots = await record_run(dut)
+    counts = [snapshot.instructions for snapshot in snapshots]
+    assert len(snapshots) > 8 and all(count % INTERVAL < 8 for count in counts), f"Unexpected checkpoints {counts}"
+
+    assert snapshots[0].fields()["ram"][0x3E] == 0xA5, "RAM left by a previous program not captured"
+    assert snapshots[0].fields()["tmr1"][0] == 0x1234, "Timer count left by a previous program not captured"
+
+    # Every snapshot holds the state of the ISS after the same instructions and cycles
+    for rtl, iss in zip(snapshots, expected(program, snapshots)):
+        assert rtl == iss, f"Unexpected snapshot after {rtl.instructions} instructions: {differences(rtl, iss)}"
+
+    assert await replay_divergence(dut, program, snapshots) is None, "Unexpected divergence"
+
+
+@cocotb.test()
+async def checkpoint_replay(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    snapshots = await record_run(dut)
+
+    # The ISS writes 8 to RAM[2], a divergence in the middle of the run
+    reference = assemble(source.format(half=8))
+    divergence = await replay_divergence(dut, program, snapshots, reference=reference)
+    assert divergence is not None, "Divergence not detected"
+    assert 0 < divergence.index < len(snapshots) - 1, f"Unexpected snapshot {divergence.index}"
+    assert divergence.fields == ["ram[0x02]"], f"Unexpected fields {divergence.fields}"
+    assert "RAM[0x02]" in divergence.message and "'MovLM 0x02, 0x08'" in divergence.message, \
+        f"Unexpected message: {divergence.message}"
+
+    # Only the interval was replayed
+    replayed = divergence.end.instructions - divergence.start.instructions
+    assert divergence.retired <= replayed <= INTERVAL + 8, \
+        f"Unexpected replay: {divergence.retired} of {replayed} instructions"
+
+
+@cocotb.test()
+async def checkpoint_idle(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    # Interruptions keep the program running while it idles in its self jump
+    snapshots = await record_run(dut, timer_interruption, max_cycles=3000, halt_on_self_jump=False)
+    counts = [snapshot.instructions for snapshot in snapshots]
+    assert len(snapshots) > 4, f"Unexpected checkpoints {counts}"
+    for rtl, iss in zip(snapshots, expected(timer_interruption, snapshots, halt_on_self_jump=False)):
+        assert rtl == iss, f"Unexpected snapshot after {rtl.instructions} instructions: {differences(rtl, iss)}"
+    assert await replay_divergence(dut, timer_interruption, snapshots, halt_on_self_jump=False) is None, \
+        "Unexpected divergence"
+
+    # The ISS adds 3 to P0 in the interruption routine
+    reference = list(timer_interruption)
+    reference[35] = 3
+    divergence = await replay_divergence(dut, timer_interruption, snapshots, reference=reference,
+                                         halt_on_self_jump=False)
+    assert divergence is not None, "Divergence not detected"
+    assert "ports[0x00]" in divergence.fields, f"Unexpected fields {divergence.fields}"
+    assert "State differs in w" in divergence.message and "'AddLW 0x03'" in divergence.message, \
+        f"Unexpected message: {divergence.message}"
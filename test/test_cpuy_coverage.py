@@ -0,0 +1,68 @@
+import tempfile
+
+import cocotb
+from cocotb.clock import Clock
+
+from cpuy_iss import Cpu
+from cpuy_iss.isa import (ADDLW, DEC, EXECUTING, FETCHING_OPCODE, INTERRUPT_REDIRECTION, POPPING_STACK, RET,
+                          T0_INTERRUPTION, ZERO)
+from cpuy_tb import RomDriver
+from cpuy_tb.coverage import Collector, collect
+from cpuy_tb.table import reset
+
+from .test_cpuy_fast_forward import countdown
+
+
+@cocotb.test()
+async def coverage_countdown(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    await reset(dut)
+    collector = Collector(dut)
+    collector.start()
+    await RomDriver(dut, countdown).run()
+    collector.stop()
+    coverage = collector.coverage
+
+    reference = Cpu(countdown)
+    reference.run()
+    # stop() counts the retirements since the last wakeup, the last instruction retires after the driver halts
+    instructions = int(coverage.opcode_state[:, FETCHING_OPCODE].sum())
+    assert instructions == reference.instructions - 1, \
+        f"Unexpected instructions: desired {reference.instructions - 1}, got {instructions}"
+
+    for name, count in (("Ret through POPPING_STACK", coverage.opcode_state[RET, POPPING_STACK]),
+                        ("Timer 0 interruptions", coverage.interrupts[T0_INTERRUPTION]),
+                        ("Timer 0 overflows counting down with autoreload", coverage.timer_overflow[0, 0, 1]),
+                        ("EXECUTING -> INTERRUPT_REDIRECTION", coverage.transitions[EXECUTING, INTERRUPT_REDIRECTION]),
+                        ("Dec reaching zero", coverage.alu_flags[DEC, ZERO]),
+                        ("AddLW in the interruption routine", coverage.alu_flags[ADDLW, 0]),
+                        ("Stack depth 1", coverage.stack_depth[1])):
+        assert count, f"Not covered: {name}"
+
+    assert not coverage.timer_overflow[1].any(), "Unexpected Timer 1 overflows"
+    holes = coverage.holes()
+    hit, total, missing = holes["interrupts"]
+    assert missing == ["source 1", "source 3"], f"Unexpected interruption holes: {missing}"
+
+
+@cocotb.test()
+async def coverage_next_test(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    await reset(dut)
+    directory = tempfile.mkdtemp()
+    collector = collect(dut, directory)
+    instructions = int(collector.coverage.opcode_state[:, FETCHING_OPCODE].sum())
+    await RomDriver(dut, countdown).run()
+
+    # cocotb kills the monitor at the end of the test, the call of the next test counts its last retirements
+    collector._task.kill()
+    assert collect(dut, directory) is collector
+    reference = Cpu(countdown)
+    reference.run()
+    instructions = int(collector.coverage.opcode_state[:, FETCHING_OPCODE].sum()) - instructions
+    assert instructions == reference.instructions - 1, \
+        f"Unexpected instructions: desired {reference.instructions - 1}, got {instructions}"
@@ -0,0 +1,49 @@
+from cpuy_iss.isa import (ADDLW, CARRY, EXECUTING, FETCHING_OPCODE, FETCHING_OPERANDS, INTERRUPT_REDIRECTION,
+                          NOP, T1_INTERRUPTION)
+from cpuy_tb.coverage import Coverage, coverage_files, main, reachable_alu_flags
+from cpuy_tb.retired import ALU_SHIFT, OP_CODE_SHIFT, OVERFLOWS_SHIFT, STATES_SHIFT
+
+
+def entry(op, states, flags=0, interrupt_source=0, stack_ptr=0, tmr_cfg=0, overflows=0, alu=0):
+    """Ring entry of tb.v, state fields as in cpuy_tb.retired.STATE_FIELDS"""
+    state = stack_ptr | interrupt_source << 4 | tmr_cfg << 23 | flags << 39
+    mask = sum(1 << state for state in states)
+    return (state | op << OP_CODE_SHIFT | mask << STATES_SHIFT | overflows << OVERFLOWS_SHIFT |
+            alu << ALU_SHIFT)
+
+
+def test_add():
+    coverage = Coverage()
+    coverage.add(entry(ADDLW, (FETCHING_OPCODE, FETCHING_OPERANDS, EXECUTING), flags=CARRY, alu=1))
+    coverage.add(entry(NOP, (FETCHING_OPCODE, EXECUTING, INTERRUPT_REDIRECTION), interrupt_source=T1_INTERRUPTION,
+                       stack_ptr=1, tmr_cfg=0x50, overflows=0b10))
+
+    assert coverage.opcode_state[ADDLW].tolist() == [0, 1, 1, 0, 1, 0]
+    assert coverage.alu_flags[ADDLW, CARRY] == 1
+    assert coverage.transitions[FETCHING_OPERANDS, EXECUTING] == 1
+    assert coverage.transitions[EXECUTING, FETCHING_OPCODE] == 1
+    assert coverage.transitions[INTERRUPT_REDIRECTION, FETCHING_OPCODE] == 1
+    assert coverage.interrupts[T1_INTERRUPTION] == 1
+    assert coverage.timer_overflow[1, 0, 1] == 1 # Counting down with autoreload
+    assert coverage.stack_depth.tolist()[:2] == [1, 1]
+    assert not coverage.alu_flags[NOP].any()
+
+
+def test_merge(tmp_path):
+    coverage = Coverage()
+    coverage.add(entry(ADDLW, (FETCHING_OPCODE, FETCHING_OPERANDS, EXECUTING), alu=1))
+    for shard in range(1000):
+        coverage.write(str(tmp_path / f"{shard}.cov"))
+
+    files = coverage_files([str(tmp_path)])
+    assert len(files) == 1000
+    merged = Coverage.merge(files)
+    assert (merged.counts == 1000 * coverage.counts).all()
+
+    hit, total, missing = merged.holes()["alu_flags"]
+    assert reachable_alu_flags()[ADDLW] == {0, CARRY}
+    assert hit == 1 and f"AddLW ({ADDLW:#04x}): --C" in missing
+
+    output = tmp_path / "merged.out"
+    assert main([str(tmp_path), "-o", str(output)]) == 0
+    assert (Coverage.read(str(output)).counts == merged.counts).all()
@@ -0,0 +1,69 @@
+import cocotb
+from cocotb.clock import Clock
+
+from cpuy_iss import Cpu
+from cpuy_iss.asm import assemble
+from cpuy_tb import RomDriver, fast_forward
+from cpuy_tb.table import reset
+
+# Counts RAM[0] down from 60 while Timer 0 interruptions add 3 to RAM[1]
+countdown = assemble("""
+        Jmp main
+        .org 0x20               ; Timer 0 interruption vector
+        MovMW 1
+        AddLW 3
+        MovWM 1
+        Ret
+        .org 0x40
+main:   MovLW 40                ; Timer 0 counts 40 down with autoreload
+        MovWR0
+        MovLW 0
+        MovWR1
+        MovLW 5
+        TmrCfg
+        MovLW 160               ; GIE and T0IE
+        CpuCfg
+        MovLM 0, 60
+        MovLM 1, 0
+        Call push
+loop:   MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        Jmp loop
+push:   Ret
+done:   MovMW 1
+        MovWP0
+        SetC
+        RLC
+        MovWP1
+        NOP
+        NOP
+        .byte 127
+""")
+
+
+@cocotb.test()
+async def fast_forward_countdown(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    reference = Cpu(countdown)
+    reference.run()
+
+    # Injected at reset, with the TmrCfg set pending (7), inside Call (12), at the interruption vector (21),
+    # inside the interruption routine (23) and inside the loop
+    for instructions in (0, 7, 12, 21, 23, 150, 400):
+        await reset(dut)
+        cpu = await fast_forward(dut, countdown, max_instructions=instructions)
+        result = await RomDriver(dut, countdown, max_cycles=reference.cycles).run()
+        assert result.reason == "sentinel", f"Unexpected halt after {instructions} instructions: {result}"
+
+        assert dut.p0_tb.value == reference.p0out, \
+            f"Unexpected P0 after {instructions} instructions: desired {reference.p0out}, got {dut.p0_tb.value}"
+        assert dut.p1_tb.value == reference.p1out, \
+            f"Unexpected P1 after {instructions} instructions: desired {reference.p1out}, got {dut.p1_tb.value}"
+        # The driver starts after the injection edge and stops at the fetch of the last NOP, 2 cycles short
+        cycles = cpu.cycles + result.cycles + 2
+        assert cycles == reference.cycles, \
+            f"Unexpected cycles after {instructions} instructions: desired {reference.cycles}, got {cycles}"
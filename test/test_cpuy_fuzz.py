@@ -0,0 +1,51 @@
+import random
+
+from cpuy_iss.fuzz import Candidate, Corpus, decode, fuzz, generate, mutate, trace
+from cpuy_iss.isa import CALL, CPU_CFG, EI_INTERRUPTION, JUMPS, MOVLW, OPERAND_COUNT, ROM_SIZE
+
+
+def check_candidate(candidate):
+    instructions = decode(candidate.program)
+    assert b"".join(instructions) == candidate.program
+    for instruction in instructions[:-1]:
+        op = instruction[0]
+        assert len(instruction) == 1 + OPERAND_COUNT[op], f"Unexpected size of {instruction.hex()}"
+        if (op in JUMPS or op | 1 == CALL | 1) and len(instruction) == 3:
+            target = instruction[1] | instruction[2] << 8
+            assert target < ROM_SIZE, f"Unexpected jump target: desired < {ROM_SIZE}, got {target}"
+
+
+def test_generate_and_mutate():
+    rng = random.Random(1)
+    candidates = [generate(rng) for _ in range(50)]
+    for candidate in candidates:
+        check_candidate(candidate)
+        for _ in range(10):
+            candidate = mutate(candidate, rng, candidates)
+            check_candidate(candidate)
+
+
+def test_ext_int_coverage():
+    # External interruption enabled, ext_int high on cycle 20
+    program = bytes((MOVLW, 0xC0, CPU_CFG)) + bytes(61)
+    _, points = trace(Candidate(program, max_instructions=40))
+    assert not any((point >> 4) & 3 == EI_INTERRUPTION for point in points)
+    _, points = trace(Candidate(program, (20, 21), max_instructions=40))
+    assert any((point >> 4) & 3 == EI_INTERRUPTION for point in points), "External interruption not covered"
+
+
+def test_corpus(tmp_path):
+    corpus = Corpus(str(tmp_path))
+    added = fuzz(corpus, 300, random.Random(2))
+    assert added and len(list(tmp_path.iterdir())) == len(added)
+
+    # New entries are trimmed to their last new coverage point
+    for candidate in added:
+        _, points = trace(candidate)
+        assert max(points.values()) == candidate.max_instructions - 1
+
+    coverage = set(corpus.coverage)
+    dropped = corpus.minimize()
+    assert len(list(tmp_path.iterdir())) == len(added) - dropped
+    reloaded = Corpus(str(tmp_path))
+    assert reloaded.coverage == coverage, "Minimized corpus lost coverage"
@@ -0,0 +1,76 @@
+import random
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+
+from cpuy_iss.fuzz import DEFAULT_CORPUS, Corpus, fuzz, trace
+from cpuy_tb import RomDriver, fast_forward
+from cpuy_tb.scoreboard import Scoreboard, ScoreboardError
+from cpuy_tb.table import reset
+
+# Replays the corpus directory, which the regression result cache does not hash
+RESULT_CACHE = False
+
+
+async def drive_ext_int(dut, start, end):
+    """ext_int_tb high from cycle start to cycle end, counted from the current one"""
+    if start:
+        await ClockCycles(dut.clk_tb, start)
+    dut.ext_int_tb.value = 1
+    await ClockCycles(dut.clk_tb, end - start)
+    dut.ext_int_tb.value = 0
+
+
+async def replay(dut, driver, candidate):
+    """Runs candidate in lockstep with the ISS, returns its failure messages"""
+    reference, _ = trace(candidate)
+    dut.ext_int_tb.value = 0
+    await reset(dut)
+    # Candidates start with RAM and registers cleared, which a reset does not do
+    cpu = await fast_forward(dut, candidate.program, max_instructions=0)
+    scoreboard = Scoreboard(dut, cpu)
+    scoreboard.start()
+    driver.load(candidate.program)
+    run = cocotb.start_soon(driver.run())
+
+    # The injection is in cycle 0 of the ISS, one more edge records the last retirement
+    stimulus = cocotb.start_soon(drive_ext_int(dut, *candidate.ext_int)) if candidate.ext_int else None
+    await ClockCycles(dut.clk_tb, reference.cycles + 1)
+    driver.halt()
+    await run
+    if stimulus is not None:
+        stimulus.kill()
+
+    try:
+        scoreboard.finish()
+    except ScoreboardError as error:
+        return [str(error)]
+    if scoreboard.retired != reference.instructions:
+        return [f"Unexpected retired instructions: desired {reference.instructions}, got {scoreboard.retired}"]
+    return []
+
+
+@cocotb.test()
+async def fuzz_corpus(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+
+    # Without a corpus from `python -m cpuy_iss.fuzz`, a short campaign seeds one
+    corpus = Corpus(DEFAULT_CORPUS)
+    if not len(corpus):
+        corpus = Corpus()
+        fuzz(corpus, 200, random.Random(0))
+        corpus.minimize()
+
+    driver = RomDriver(dut, b"", sentinel=None, halt_on_self_jump=False)
+    failed = []
+    for candidate in corpus.candidates():
+        failures = await replay(dut, driver, candidate)
+        if failures:
+            failed.append((candidate, failures))
+            dut._log.error("%s FAILED: %s", candidate.key(), "; ".join(failures))
+
+    dut._log.info("%d corpus entries replayed, %d coverage points", len(corpus), len(corpus.coverage))
+    if failed:
+        raise AssertionError(f"{len(failed)} of {len(corpus)} corpus entries failed:\n" + "\n".join(
+            f"{candidate.key()}: {'; '.join(failures)}" for candidate, failures in failed))
@@ -0,0 +1,149 @@
+import time
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+
+from cpuy_iss import Cpu
+from cpuy_iss.asm import assemble
+from cpuy_tb import RomDriver
+from cpuy_tb.table import reset
+
+# Spins in a Jmp to itself until 4 Timer 0 interruptions, RAM[1] counts the first 3
+timer0 = assemble("""
+        Jmp main
+        .org 0x20               ; Timer 0 interruption vector
+        MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        MovMW 1
+        Inc
+        MovWM 1
+        Ret
+        .org 0x40
+main:   MovLW 0xB8              ; Timer 0 counts 3000 down with autoreload
+        MovWR0
+        MovLW 0x0B
+        MovWR1
+        MovLW 5
+        TmrCfg
+        MovLM 0, 4
+        MovLM 1, 0
+        MovLW 160               ; GIE and T0IE
+        CpuCfg
+idle:   Jmp idle
+done:   MovMW 1
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+""")
+
+# Spins in 3 NOPs and a Jmp back until 3 Timer 1 interruptions, Timer 1 counts up
+timer1 = assemble("""
+        Jmp main
+        .org 0x30               ; Timer 1 interruption vector
+        MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        MovMW 1
+        Inc
+        MovWM 1
+        Ret
+        .org 0x40
+main:   MovLW 0x00              ; Timer 1 counts 4096 up from 0xF000 with autoreload
+        MovWR2
+        MovLW 0xF0
+        MovWR3
+        MovLW 0x70
+        TmrCfg
+        MovLM 0, 3
+        MovLM 1, 0
+        MovLW 144               ; GIE and T1IE
+        CpuCfg
+idle:   NOP
+        NOP
+        NOP
+        Jmp idle
+done:   MovMW 1
+        SetC
+        RLC
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+""")
+
+# Spins until the external interruption, which only the test raises
+external = assemble("""
+        Jmp main
+        .org 0x10               ; External interruption vector
+        MovLW 42
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+        .org 0x40
+main:   MovLW 192               ; GIE and ExtIE
+        CpuCfg
+idle:   Jmp idle
+""")
+
+
+async def run_both(dut, program, stimulus=None, max_cycles=50_000):
+    """(halt reason, cycles, idle cycles, P0) of program with idle loops skipped, checked against the run
+    fed one fetch at a time"""
+    runs = []
+    for skip_idle in (False, True):
+        dut.ext_int_tb.value = 0
+        await reset(dut)
+        task = cocotb.start_soon(stimulus(dut)) if stimulus else None
+        rom = RomDriver(dut, program, halt_on_self_jump=False, skip_idle=skip_idle,
+                        max_cycles=max_cycles)
+        start = time.perf_counter()
+        result = await rom.run()
+        if task is not None:
+            task.kill()
+        dut._log.info(f"skip_idle={skip_idle}: {result}, {rom.idle_cycles} idle cycles in "
+                      f"{time.perf_counter() - start:.2f} s")
+        runs.append((result.reason, result.cycles, rom.idle_cycles, dut.p0_tb.value.integer))
+
+    full, skipped = runs
+    assert full[:2] == skipped[:2], f"Unexpected run with idle loops skipped: desired {full[:2]}, got {skipped[:2]}"
+    assert skipped[3] == full[3], f"Unexpected P0 with idle loops skipped: desired {full[3]}, got {skipped[3]}"
+    assert full[2] == 0 and skipped[2] > 0, f"Unexpected idle cycles: {full[2]} and {skipped[2]}"
+    return skipped
+
+
+@cocotb.test()
+async def idle_timers(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+
+    for program in (timer0, timer1):
+        reference = Cpu(program)
+        reference.run(halt_on_self_jump=False)
+        reason, cycles, idle_cycles, p0 = await run_both(dut, program)
+        assert reason == "sentinel", f"Unexpected halt: {reason}"
+        assert p0 == reference.p0out, f"Unexpected P0: desired {reference.p0out}, got {p0}"
+        # RomResult counts the cycle the halt address reaches the bus in, the ISS stops before fetching it
+        assert cycles == reference.cycles + 1, f"Unexpected cycles: desired {reference.cycles + 1}, got {cycles}"
+        assert idle_cycles > reference.cycles // 2, f"Unexpected idle cycles: {idle_cycles} of {cycles}"
+
+
+@cocotb.test()
+async def idle_external(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+
+    async def interrupt(dut):
+        await ClockCycles(dut.clk_tb, 3000)
+        dut.ext_int_tb.value = 1
+
+    _, _, _, p0 = await run_both(dut, external, interrupt)
+    assert p0 == 42, f"Unexpected P0: desired 42, got {p0}"
+
+    # Without the external interruption, the loop is skipped until the end of the budget
+    _, cycles, _, _ = await run_both(dut, external, max_cycles=2000)
+    assert cycles == 2000, f"Unexpected cycles: desired 2000, got {cycles}"
+    assert dut.idle_tb.value == 0, "Idle ROM left feeding the bus after the run"
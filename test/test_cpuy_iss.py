@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+from cpuy_iss import Cpu, Timer
+from cpuy_iss.checkpoint import differences, first_divergence, read, record, snapshot, write
+from cpuy_iss.isa import HALT_BUDGET, HALT_SELF_JUMP, HALT_SENTINEL, halt_flags, idle_loops, rom_image
+from cpuy_iss.stimulus import EXT_INT, P0IN, P1IN, Player, Schedule
+
+# Programs of the RTL tests, the ISS must end with the same ports values
+programs = [
+    ([132, 25, 64, 0, 0, 127], 25, 0), # Movlw 25, MovwP0
+    ([132, 180, 130, 16, 132, 0, 128, 16, 64, 0, 0, 127], 180, 0), # MovWM and MovMW
+    ([132, 11, 1, 64, 0, 0, 127], 10, 0), # Dec
+    ([132, 1, 4, 8, 64, 0, 0, 127], 3, 0), # SetC, RLC
+    ([132, 120, 145, 220, 7, 64, 128, 7, 65, 0, 127], 32, 103), # MulLW with high byte to RAM
+    ([132, 27, 130, 200, 132, 52, 147, 200, 5, 64, 128, 5, 65, 0, 0, 127], 124, 5), # MulMW
+    ([135, 15, 55, 132, 66, 160, 15, 64, 128, 15, 65, 0, 0, 127], 55, 66), # XchWM
+]
+
+timer_interruption = [163, 64, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, # Jmp 40h
+                      0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+                      132, 135, 136, 2, 64, 60, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, # Movlw 135, Addlw 2, MovWp0, Ret
+                      0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+                      132, 20, 80, 132, 0, 81, 132, 1, 63, 132, 160, 62, # Timer 0 counts 20 down, GIE and T0IE
+                      163, 76, 0] # Jmp to self
+
+
+def test_programs():
+    for program, p0, p1 in programs:
+        cpu = Cpu(program)
+        assert cpu.run() == HALT_SENTINEL
+        assert cpu.p0out == p0, f"Unexpected P0: desired {p0}, got {cpu.p0out}"
+        assert cpu.ports[1] == p1, f"Unexpected P1: desired {p1}, got {cpu.ports[1]}"
+
+
+def test_cycles():
+    cpu = Cpu([132, 25, 64, 0, 0, 127]) # Movlw (3 cycles), MovwP0 and 2 NOP (2 cycles each)
+    cpu.run()
+    assert cpu.instructions == 4, f"Unexpected instructions: desired 4, got {cpu.instructions}"
+    assert cpu.cycles == 9, f"Unexpected cycles: desired 9, got {cpu.cycles}"
+
+
+def test_timer_interruption():
+    cpu = Cpu(timer_interruption)
+    assert cpu.run(max_cycles=100, halt_on_self_jump=False) == HALT_BUDGET
+    assert cpu.p0out == 137, f"Unexpected P0: desired 137, got {cpu.p0out}"
+    assert cpu.interrupt_source == 0, f"Unexpected interruption in course {cpu.interrupt_source}"
+    assert cpu.stack.empty, "Stack not empty after Ret"
+
+    cpu.reset()
+    assert cpu.run() == HALT_SELF_JUMP
+    assert cpu.pc == 76, f"Unexpected PC: desired 76, got {cpu.pc}"
+
+
+def test_timer_advance():
+    rng = random.Random(0)
+    for _ in range(200):
+        count, direction, auto_reload = rng.randrange(0, 300), rng.randrange(2), rng.randrange(2)
+        if direction:
+            count = 0x10000 - count
+        stepped = Timer()
+        stepped.load(count & 0xFFFF, direction, auto_reload)
+        bulk = Timer()
+        bulk.load(count & 0xFFFF, direction, auto_reload)
+
+        edges = rng.randrange(0, 1000)
+        for _ in range(edges):
+            stepped.advance(1)
+        bulk.advance(edges)
+
+        state = (stepped.counter, stepped.overflow, stepped.run)
+        assert state == (bulk.counter, bulk.overflow, bulk.run), f"Timer mismatch after {edges} edges"
+
+
+def test_idle_loops():
+    # Jmp to itself at 0, 2 NOPs and a Jmp back at 3, a Jmp to another address at 8 and 6 NOPs at 11
+    rom = rom_image([0xA3, 0, 0, 0, 0, 0xA3, 3, 0, 0xA3, 0, 0] + [0] * 6 + [0xA3, 11, 0])
+    lengths = idle_loops(rom)
+    loops = {address: length for address, length in enumerate(lengths) if length}
+    assert loops == {0: 3, 3: 5}, f"Unexpected idle loops {loops}"
+
+    # Halts inside a loop end the run there
+    loops = [address for address, length in enumerate(idle_loops(rom, halt_flags(rom, halt_at=[5]))) if length]
+    assert loops == [], f"Unexpected idle loops {loops}"
+
+
+def test_stimulus_schedule():
+    schedule = Schedule([(30, "p0in_tb", 7), (10, EXT_INT, 1), (30, "ext_int", 0)])
+    schedule.pulse(20, 4, P1IN)
+    events = list(schedule)
+    assert events == [(10, 0, 1), (20, 2, 1), (24, 2, 0), (30, 1, 7), (30, 0, 0)], f"Unexpected events {events}"
+    assert list(schedule.shifted(5))[0] == (15, 0, 1)
+    for event in ((0, "p2in", 1), (0, P1IN, 16)):
+        with pytest.raises(ValueError):
+            schedule.add(*event)
+
+    # MovP0W, MovWM 0, MovP0W, MovWP0: the reads at cycles 0 and 5 see the events before cycles 2 and 7
+    cpu = Cpu([72, 130, 0, 72, 64, 0, 127])
+    cpu.ports_cfg[0] = 0xFF
+    cpu.run(stimulus=Player(Schedule([(1, P0IN, 3), (2, P0IN, 9), (7, P0IN, 12)]), offset=0))
+    assert cpu.ports[0] == 9 and cpu.ram[0] == 3, f"Unexpected reads {cpu.ram[0]} and {cpu.ports[0]}"
+
+
+def test_checkpoints(tmp_path):
+    counts = [100, 200, 300, 400]
+    snapshots = record(Cpu(timer_interruption), counts, halt_on_self_jump=False)
+    assert [snapshot.instructions for snapshot in snapshots] == counts
+
+    # A restored snapshot runs on like the Cpu it was taken from
+    cpu = Cpu(timer_interruption)
+    snapshots[1].restore(cpu)
+    assert record(cpu, counts[2:], halt_on_self_jump=False) == snapshots[2:]
+
+    write(str(tmp_path / "run.ckp"), snapshots)
+    assert read(str(tmp_path / "run.ckp")) == snapshots
+    assert first_divergence(snapshots, snapshots) is None and first_divergence(snapshots, snapshots[:2]) == 2
+
+    cpu.ram[5] = 1
+    cpu.w ^= 1
+    other = snapshot(cpu)
+    assert first_divergence(snapshots, snapshots[:3] + [other]) == 3
+    assert differences(snapshots[3], other) == ["w", "ram[0x05]"], f"Unexpected {differences(snapshots[3], other)}"
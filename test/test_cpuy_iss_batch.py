@@ -0,0 +1,62 @@
+import random
+
+from cpuy_iss import Cpu
+from cpuy_iss.batch import HALT_REASONS, BatchCpu
+from cpuy_iss.isa import MNEMONICS, OPERAND_COUNT, RET
+
+from .test_cpuy_iss import programs, timer_interruption
+
+opcodes = [op for op in range(256) if MNEMONICS[op]]
+
+
+def random_program(rng):
+    # Timers loaded from R0..R3 with short counts and interruptions enabled, then random code
+    program = [132, rng.randrange(40), 80, 132, 0, 81, 132, rng.randrange(30), 82, 132, 0, 83,
+               132, rng.choice([0x01, 0x07, 0x11, 0x33, 0x75]), 63, 132, rng.choice([0x00, 0xA0, 0xB0, 0xF0]), 62]
+    while len(program) < 240:
+        op = rng.choice(opcodes)
+        program.append(op)
+        program += [rng.randrange(256) for _ in range(OPERAND_COUNT[op])]
+        if op >= 0xA2 and OPERAND_COUNT[op] == 2:
+            program[-1] = 0 # Keep jumps within the code
+    for vector in (0x10, 0x20, 0x30):
+        program[vector + 12:vector + 16] = [RET, 0, 0, 0]
+    return program
+
+
+def state(cpu):
+    timers = [(timer.counter, timer.overflow, timer.run) if timer.run or timer.overflow else None
+              for timer in (cpu.tmr0, cpu.tmr1)]
+    return (cpu.pc, cpu.w, cpu.flags, cpu.cpu_cfg, cpu.tmr_cfg, bytes(cpu.registers), bytes(cpu.ram),
+            bytes(cpu.ports), bytes(cpu.ports_cfg), cpu.interrupt_source, cpu.stack.mem[:cpu.stack.ptr], timers,
+            cpu.cycles, cpu.instructions)
+
+
+def test_lockstep():
+    rng = random.Random(0)
+    sources = [random_program(rng) for _ in range(64)]
+    batch = BatchCpu(sources)
+    batch.ext_int[::3] = 1
+    cpus = [Cpu(program) for program in sources]
+    for lane, cpu in enumerate(cpus):
+        cpu.ext_int = int(batch.ext_int[lane])
+
+    for step in range(300):
+        batch.step()
+        for lane, cpu in enumerate(cpus):
+            cpu.step()
+            if step % 10 == 9:
+                assert state(batch.cpu(lane)) == state(cpu), f"Lane {lane} diverged at step {step}"
+
+
+def test_run():
+    sources = [program for program, _, _ in programs] + [timer_interruption]
+    batch = BatchCpu(sources)
+    reasons = batch.run(max_cycles=200)
+
+    for lane, program in enumerate(sources):
+        cpu = Cpu(program)
+        reason = cpu.run(max_cycles=200)
+        assert HALT_REASONS[reasons[lane]] == reason, f"Unexpected halt: desired {reason}, got {reasons[lane]}"
+        assert batch.pc[lane] == cpu.pc, f"Unexpected PC: desired {cpu.pc}, got {batch.pc[lane]}"
+        assert batch.ports[lane, 0] == cpu.p0out, f"Unexpected P0: desired {cpu.p0out}, got {batch.ports[lane, 0]}"
@@ -0,0 +1,95 @@
+import random
+
+from bench.workloads import WORKLOADS
+from cpuy_iss import Cpu
+from cpuy_iss.blocks import BlockCpu, decode_block, program_blocks, translate
+from cpuy_iss.isa import HALT_FLAG_SELF_JUMP, halt_flags, rom_image
+from cpuy_iss.stimulus import Player, Schedule
+
+from .test_cpuy_iss import programs, timer_interruption
+from .test_cpuy_iss_batch import random_program, state
+
+
+def full_state(cpu):
+    # Including the registers an instruction leaves behind and the timers loads
+    return state(cpu) + (cpu.op_code, bytes(cpu.operands), cpu.w_swap, cpu.set_t0, cpu.set_t1,
+                         cpu.tmr0.counter, cpu.tmr1.counter)
+
+
+def run_both(program, ext_int=0, **kwargs):
+    reference = Cpu(program)
+    blocks = BlockCpu(program)
+    reference.ext_int = blocks.ext_int = ext_int
+    reason = reference.run(**kwargs)
+    assert blocks.run(**kwargs) == reason, f"Unexpected halt: desired {reason}"
+    assert full_state(blocks) == full_state(reference), f"State mismatch running {kwargs}"
+    return blocks
+
+
+def test_programs():
+    for program, _, _ in programs:
+        run_both(program)
+    run_both(timer_interruption, max_cycles=2000)
+    for program in WORKLOADS.values():
+        run_both(program)
+
+
+def test_random_programs():
+    rng = random.Random(0)
+    for index in range(200):
+        program = random_program(rng)
+        ext_int = index & 1
+        run_both(program, ext_int, max_cycles=3000)
+        run_both(program, ext_int, max_instructions=rng.randrange(1, 800), halt_on_self_jump=False)
+        run_both(program, ext_int, max_cycles=rng.randrange(1, 3000), halt_at=(rng.randrange(0x40, 0xF0),))
+
+
+def test_resume():
+    # Runs resumed after a budget continue where the interpreter would
+    rng = random.Random(1)
+    for _ in range(20):
+        program = random_program(rng)
+        reference = Cpu(program)
+        blocks = BlockCpu(program)
+        for budget in (7, 100, 33, 1000):
+            reference.run(max_cycles=budget, halt_on_self_jump=False)
+            blocks.run(max_cycles=budget, halt_on_self_jump=False)
+            assert full_state(blocks) == full_state(reference), f"State mismatch after {budget} cycles"
+
+
+def test_stimulus():
+    schedule = Schedule()
+    schedule.pulse(100, 5)
+    schedule.pulse(700, 5)
+    reference = Cpu(timer_interruption)
+    blocks = BlockCpu(timer_interruption)
+    reference.run(max_cycles=1000, stimulus=Player(schedule))
+    blocks.run(max_cycles=1000, stimulus=Player(schedule))
+    assert full_state(blocks) == full_state(reference), "State mismatch with stimulus"
+
+
+def test_blocks():
+    program = WORKLOADS["alu_loop"]
+    rom = rom_image(program)
+    flags = halt_flags(rom)
+
+    # MovLM, MovLM, then the loop body up to JmpZ
+    instructions = decode_block(rom, 0, flags)
+    assert [op for _, op, _ in instructions][-1] == 0xA7, f"Unexpected block end {instructions[-1]}"
+    block = translate(rom, 0, flags)
+    assert block.instructions == len(instructions) and block.cycles > block.instructions
+
+    # Halt flags end blocks and are never translated
+    assert translate(rom, len(program) - 1, flags) is None
+
+    cpu = BlockCpu(program)
+    cpu.run()
+    # The loop runs 250 times, translated once
+    translated = sum(block.instructions for block in cpu.blocks if block is not None)
+    assert translated < cpu.instructions / 100, f"Unexpected translated instructions {translated}"
+    assert BlockCpu(program).run() and program_blocks(rom, flags) is cpu.blocks, "Blocks not shared"
+
+    # Self jumps are stepped
+    rom = rom_image([0, 0, 0xA3, 2, 0])
+    flags = halt_flags(rom)
+    assert flags[2] & HALT_FLAG_SELF_JUMP and len(decode_block(rom, 0, flags)) == 2
@@ -0,0 +1,99 @@
+import random
+
+from bench.workloads import WORKLOADS
+from cpuy_iss import Cpu
+from cpuy_iss.asm import assemble
+from cpuy_iss.isa import HALT_SENTINEL
+from cpuy_iss.profile import ProfiledCpu, read_program
+
+from .test_cpuy_iss import timer_interruption
+from .test_cpuy_iss_batch import random_program, state
+
+# 21 nested calls of rec, the stack keeps 15 return addresses and the 15th Ret returns to the top
+recursion = assemble("""
+        MovLM 0, 20
+        Call rec
+        MovMW 0
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+rec:    MovMW 0
+        JmpZ done
+        Dec
+        MovWM 0
+        Call rec
+done:   Ret
+""")
+
+
+def test_stack():
+    # The routines followed are the ones of the stack of the CPU, every instruction of random programs
+    rng = random.Random(0)
+    for index in range(50):
+        program = random_program(rng)
+        cpu = ProfiledCpu(program)
+        reference = Cpu(program)
+        cpu.ext_int = reference.ext_int = index & 1
+        for step in range(500):
+            cpu.step()
+            reference.step()
+            depth = len(cpu.profile.active().split(";")) - 1
+            assert depth == cpu.stack.ptr, f"Unexpected depth at step {step}: desired {cpu.stack.ptr}, got {depth}"
+        assert state(cpu) == state(reference), "State mismatch"
+
+
+def test_cycles():
+    for name, program in list(WORKLOADS.items()) + [("timer_interruption", timer_interruption)]:
+        cpu = ProfiledCpu(program)
+        reference = Cpu(program)
+        reason = reference.run(max_cycles=5000, halt_on_self_jump=False)
+        assert cpu.run(max_cycles=5000, halt_on_self_jump=False) == reason and state(cpu) == state(reference), f"{name} diverged"
+
+        profile = cpu.profile
+        opcode_cycles = sum(cycles for _, cycles in profile.opcodes())
+        assert profile.cycles == cpu.cycles, f"Unexpected {name} cycles: desired {cpu.cycles}, got {profile.cycles}"
+        assert opcode_cycles + sum(profile.interruptions) == cpu.cycles, f"Unexpected {name} opcode cycles"
+        assert profile.instructions == cpu.instructions
+        assert sum(cycles for _, _, cycles in profile.hot()) == opcode_cycles
+
+
+def test_routines():
+    cpu = ProfiledCpu(WORKLOADS["call_chain"])
+    cpu.run()
+    routines = cpu.profile.routines()
+    inclusive = [routines[name][1] for name in sorted(routines) if name != "main"]
+    assert len(inclusive) == 15 and inclusive == sorted(inclusive, reverse=True), f"Unexpected routines {routines}"
+    assert routines["main"][1] == cpu.cycles
+    assert sum(exclusive for _, _, exclusive in routines.values()) == cpu.cycles
+
+    cpu = ProfiledCpu(timer_interruption)
+    cpu.run(max_cycles=1000, halt_on_self_jump=False)
+    entries, inclusive, exclusive = cpu.profile.routines()["isr_tmr0"]
+    assert entries == cpu.profile.interruptions[2] > 0 and inclusive == exclusive
+
+    # Collapsed stacks, one line per stack
+    lines = cpu.profile.collapsed()
+    assert [line.rsplit(" ", 1)[0] for line in lines] == ["main", "main;isr_tmr0"], f"Unexpected stacks {lines}"
+
+
+def test_overflow():
+    cpu = ProfiledCpu(recursion, names={0x00C: "rec"})
+    assert cpu.run() == HALT_SENTINEL and cpu.instructions == 123, f"Unexpected run of {cpu.instructions}"
+    profile = cpu.profile
+    assert profile.overflows == 6 and profile.calls["rec"] == 15, f"Unexpected {profile.overflows} overflows"
+    deepest = max(profile.stacks, key=lambda key: key.count(";"))
+    assert deepest.count(";") == 15 and deepest.startswith("main;rec;rec")
+
+    # A reset restarts from the top
+    cpu.reset()
+    cpu.run()
+    assert profile.calls["rec"] == 30 and profile.cycles == 2 * cpu.cycles
+
+
+def test_read_program(tmp_path):
+    (tmp_path / "program.hex").write_text("84\n19 // Movlw 25\n40\n")
+    (tmp_path / "program.bin").write_bytes(bytes([132, 25, 64]))
+    (tmp_path / "program.s").write_text("Movlw 25\nMovwP0\n")
+    for name in ("program.hex", "program.bin", "program.s"):
+        assert bytes(read_program(str(tmp_path / name))) == bytes([132, 25, 64]), f"Unexpected {name}"
@@ -0,0 +1,78 @@
+import cocotb
+
+from cpuy_iss import Cpu
+from cpuy_iss.asm import assemble
+from cpuy_iss.isa import HALT_BUDGET, HALT_SELF_JUMP
+from cpuy_tb import run_programs
+from cpuy_tb.native import NativeRom
+from cpuy_tb.table import reset
+
+from .test_cpuy import programs
+from .test_cpuy_fast_forward import countdown
+
+TOPLEVEL = "tb_rom"
+
+# 250 x 250 iterations of an inner loop, about 1.7M cycles
+nested = assemble("""
+        MovLM 0, 250
+        MovLM 2, 0
+outer:  MovLM 1, 250
+inner:  MovMW 2
+        AddLW 3
+        XorLW 0x55
+        MovWM 2
+        MovMW 1
+        Dec
+        MovWM 1
+        JmpZ next
+        Jmp inner
+next:   MovMW 0
+        Dec
+        MovWM 0
+        JmpZ done
+        Jmp outer
+done:   MovMW 2
+        MovWP0
+        MovLW 7
+halt:   Jmp halt
+""")
+
+
+@cocotb.test()
+async def native_programs(dut):
+    dut.ext_int_tb.value = 0
+    await run_programs(dut, programs)
+
+
+@cocotb.test()
+async def native_nested(dut):
+    dut.ext_int_tb.value = 0
+    rom = NativeRom(dut, nested)
+    await reset(dut)
+    result = await rom.run()
+    assert result.reason == HALT_SELF_JUMP, f"Unexpected halt: {result}"
+
+    reference = Cpu(nested)
+    reference.run()
+    # The run starts with the 2 RESETTING cycles after reset()
+    assert result.cycles == reference.cycles + 2, \
+        f"Unexpected cycles: desired {reference.cycles + 2}, got {result.cycles}"
+    core = dut.tb.cpuy
+    for name, value, expected in (("P0", dut.p0_tb.value, reference.p0out), ("W", core.w.value, reference.w),
+                                  ("RAM[2]", core.ram[2].value, reference.ram[2])):
+        assert value == expected, f"Unexpected {name}: desired {expected}, got {value}"
+
+
+@cocotb.test()
+async def native_budget(dut):
+    dut.ext_int_tb.value = 0
+    rom = NativeRom(dut, countdown, max_cycles=500)
+    await reset(dut)
+    result = await rom.run()
+    assert result.reason == HALT_BUDGET and result.cycles == 500, f"Unexpected halt: {result}"
+
+    rom.load(countdown)
+    rom.max_cycles = None
+    await reset(dut)
+    result = await rom.run()
+    assert result.reason == "sentinel", f"Unexpected halt: {result}"
@@ -0,0 +1,72 @@
+import tempfile
+
+import cocotb
+from cocotb.clock import Clock
+
+from cpuy_iss import Cpu
+from cpuy_iss.isa import CYCLES, EXECUTING, FETCHING_OPCODE, INTERRUPT_REDIRECTION, NO_INTERRUPTION, T0_INTERRUPTION
+from cpuy_tb import RomDriver
+from cpuy_tb.profile import Profiler, profile
+from cpuy_tb.table import reset
+
+from .test_cpuy_fast_forward import countdown
+
+
+@cocotb.test()
+async def profile_countdown(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    await reset(dut)
+    profiler = Profiler(dut)
+    profiler.start()
+    await RomDriver(dut, countdown).run()
+    profiler.stop()
+    profile = profiler.profile
+
+    reference = Cpu(countdown)
+    reference.reset()
+    interruptions = 0
+    for _ in range(profile.instructions):
+        source = reference.interrupt_source
+        reference.step()
+        interruptions += source == NO_INTERRUPTION and reference.interrupt_source != NO_INTERRUPTION
+    assert profile.cycles == reference.cycles, \
+        f"Unexpected cycles of {profile.instructions} instructions: desired {reference.cycles}, got {profile.cycles}"
+
+    for op, (count, cycles) in enumerate(profile.opcodes):
+        states = profile.states[op]
+        desired = count * CYCLES[op] + states[INTERRUPT_REDIRECTION]
+        assert cycles == desired, f"Unexpected cycles of opcode {op:#04x}: desired {desired}, got {cycles}"
+        assert sum(states) == cycles, f"Unexpected state cycles of opcode {op:#04x}: desired {cycles}, got {states}"
+        assert states[FETCHING_OPCODE] == count and states[EXECUTING] == count, \
+            f"Unexpected FETCHING_OPCODE and EXECUTING cycles of opcode {op:#04x}: desired {count}, got {states}"
+
+    latency = profile.latency[T0_INTERRUPTION]
+    assert sum(latency.values()) == interruptions, \
+        f"Unexpected Timer 0 interruptions: desired {interruptions}, got {sum(latency.values())}"
+    # The request rises at most 5 cycles before the EXECUTING cycle (Call), redirection and fetch take 2 more
+    assert interruptions and all(2 <= cycles <= 8 for cycles in latency), f"Unexpected latencies: {dict(latency)}"
+    assert sum(latency.values()) == sum(counts[INTERRUPT_REDIRECTION] for counts in profile.states)
+    assert "Interruption latency, timer 0" in profile.report()
+
+
+@cocotb.test()
+async def profile_next_test(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    await reset(dut)
+    directory = tempfile.mkdtemp()
+    profiler = profile(dut, directory)
+    instructions = profiler.profile.instructions
+    await RomDriver(dut, countdown).run()
+
+    # cocotb kills the monitor at the end of the test, the call of the next test counts its last retirements
+    profiler._task.kill()
+    assert profile(dut, directory) is profiler
+    reference = Cpu(countdown)
+    reference.run()
+    instructions = profiler.profile.instructions - instructions
+    assert instructions == reference.instructions - 1, \
+        f"Unexpected instructions: desired {reference.instructions - 1}, got {instructions}"
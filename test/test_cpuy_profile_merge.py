@@ -0,0 +1,42 @@
+from cpuy_iss.isa import (EXECUTING, FETCHING_OPCODE, FETCHING_OPERANDS, INTERRUPT_REDIRECTION, JMP, NOP,
+                          POPPING_STACK, RET, T0_INTERRUPTION)
+from cpuy_tb.profile import Profile, main, profile_files
+
+
+def mask(*states):
+    return sum(1 << state for state in states)
+
+
+def test_add():
+    profile = Profile()
+    profile.add(JMP, mask(FETCHING_OPCODE, FETCHING_OPERANDS, EXECUTING), 4)
+    profile.add(RET, mask(FETCHING_OPCODE, POPPING_STACK, EXECUTING, INTERRUPT_REDIRECTION), 4, T0_INTERRUPTION, 3)
+    profile.add(NOP, mask(FETCHING_OPCODE, EXECUTING), 2)
+
+    assert profile.instructions == 3 and profile.cycles == 10
+    assert profile.opcodes[JMP] == [1, 4]
+    assert profile.states[JMP] == [0, 1, 2, 0, 1, 0]
+    assert profile.states[RET] == [0, 1, 0, 1, 1, 1]
+    assert profile.state_cycles == [0, 3, 2, 1, 3, 1]
+    assert profile.cpi == {4: 2, 2: 1}
+    assert profile.latency[T0_INTERRUPTION] == {3: 1}
+
+
+def test_merge(tmp_path):
+    profile = Profile()
+    profile.add(JMP, mask(FETCHING_OPCODE, FETCHING_OPERANDS, EXECUTING, INTERRUPT_REDIRECTION), 5,
+                T0_INTERRUPTION, 4)
+    for shard in range(100):
+        profile.write(str(tmp_path / f"{shard}.json"))
+
+    files = profile_files([str(tmp_path)])
+    assert len(files) == 100
+    merged = Profile.merge(files)
+    assert merged.instructions == 100 and merged.cycles == 500
+    assert merged.states[JMP] == [0, 100, 200, 0, 100, 100]
+    assert merged.latency[T0_INTERRUPTION] == {4: 100}
+    assert "Interruption latency, timer 0: 100 interruptions, min 4 mean 4.00 max 4 cycles" in merged.report()
+
+    output = tmp_path / "merged.out"
+    assert main([str(tmp_path), "-o", str(output)]) == 0
+    assert Profile.read(str(output)).to_json() == merged.to_json()
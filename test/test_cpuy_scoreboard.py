@@ -0,0 +1,49 @@
+import cocotb
+from cocotb.clock import Clock
+
+from cpuy_iss import Cpu
+from cpuy_tb import RomDriver, fast_forward
+from cpuy_tb.scoreboard import Scoreboard, ScoreboardError
+from cpuy_tb.table import reset
+
+from .test_cpuy_fast_forward import countdown
+
+
+@cocotb.test()
+async def lockstep_countdown(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    # From reset and from an injection inside the interruption routine
+    for instructions in (0, 23):
+        await reset(dut)
+        cpu = await fast_forward(dut, countdown, max_instructions=instructions) if instructions else Cpu(countdown)
+        scoreboard = Scoreboard(dut, cpu)
+        scoreboard.start()
+        await RomDriver(dut, countdown).run()
+        scoreboard.finish()
+        assert scoreboard.retired > 300, f"Unexpected retired instructions: desired > 300, got {scoreboard.retired}"
+
+
+@cocotb.test()
+async def lockstep_divergence(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    program = [132, 25, 136, 30, 64, 0, 0, 127] # Movlw 25, Addlw 30, MovwP0
+    reference = list(program)
+    reference[3] = 31 # The ISS adds 31
+
+    await reset(dut)
+    scoreboard = Scoreboard(dut, Cpu(reference))
+    scoreboard.start()
+    await RomDriver(dut, program).run()
+    try:
+        scoreboard.finish()
+    except ScoreboardError as error:
+        message = str(error)
+    else:
+        raise AssertionError("Divergence not detected")
+
+    assert scoreboard.retired == 2, f"Unexpected retired instructions: desired 2, got {scoreboard.retired}"
+    assert "State differs in w" in message and "0x002 'AddLW 0x1f'" in message, f"Unexpected message: {message}"
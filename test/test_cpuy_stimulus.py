@@ -0,0 +1,126 @@
+import random
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import Timer
+
+from cpuy_iss import Cpu
+from cpuy_iss.asm import assemble
+from cpuy_iss.stimulus import P0IN, P1IN, Player, Schedule
+from cpuy_tb import RomDriver
+from cpuy_tb.stimulus import drive
+from cpuy_tb.table import reset
+
+from .test_cpuy_idle import external
+
+# Sums P0 and P1 reads with half of their pins as inputs while RAM[1] counts external interruptions
+ports = assemble("""
+        Jmp main
+        .org 0x10               ; External interruption vector
+        MovMW 1
+        Inc
+        MovWM 1
+        Ret
+        .org 0x40
+main:   MovLW 0xF0              ; P0 pins 7-4 and P1 pins 2 and 0 are inputs
+        MovWR0
+        MovLW 0x05
+        MovWR1
+        PortsCfg
+        MovLW 0x0A              ; Read back on the P0 output pins
+        MovWP0
+        MovLM 0, 0
+        MovLM 1, 0
+        MovLM 2, 40
+        MovLW 192               ; GIE and ExtIE
+        CpuCfg
+loop:   MovP0W
+        AddMW 0
+        MovWM 0
+        MovP1W
+        AddMW 0
+        MovWM 0
+        MovMW 2
+        Dec
+        MovWM 2
+        JmpZ done
+        Jmp loop
+done:   MovMW 1
+        MovWP1
+        MovMW 0
+        MovWP0
+        NOP
+        NOP
+        .byte 127
+""")
+
+
+def port_schedule(seed=20):
+    """Port values changing every 7 to 40 cycles and 5 cycles wide external interruptions"""
+    rng = random.Random(seed)
+    schedule = Schedule()
+    cycle = 0
+    while cycle < 700:
+        cycle += rng.randrange(7, 40)
+        schedule.add(cycle, P0IN, rng.randrange(256))
+        schedule.add(cycle, P1IN, rng.randrange(16))
+    for cycle in range(100, 600, 90):
+        schedule.pulse(cycle, 5)
+    return schedule
+
+
+async def run_both(dut, program, schedule, **kwargs):
+    """Runs program on the RTL and the ISS, both fed by schedule, and checks they end the same"""
+    for name in ("ext_int_tb", "p0in_tb", "p1in_tb"):
+        getattr(dut, name).value = 0
+    # The ISS starts with RAM cleared, a reset keeps what the previous run left
+    for address in range(3):
+        dut.cpuy.ram[address].value = 0
+    await reset(dut)
+    stimulus = cocotb.start_soon(drive(dut, schedule))
+    result = await RomDriver(dut, program, **kwargs).run()
+    stimulus.kill() # Events after the halt must not reach the next run
+
+    cpu = Cpu(program)
+    reason = cpu.run(stimulus=Player(schedule), **kwargs)
+    assert result.reason == reason, f"Unexpected halt: desired {reason}, got {result}"
+    for port, handle, desired in (("P0", dut.p0_tb, cpu.p0out), ("P1", dut.p1_tb, cpu.p1out)):
+        assert handle.value.integer == desired, f"Unexpected {port}: desired {desired}, got {handle.value}"
+    ram = [dut.cpuy.ram[address].value.integer for address in range(3)]
+    assert ram == list(cpu.ram[:3]), f"Unexpected RAM: desired {list(cpu.ram[:3])}, got {ram}"
+    # RomResult counts the cycle the halt address reaches the bus in, the ISS stops before fetching it
+    assert result.cycles == cpu.cycles + 1, f"Unexpected cycles: desired {cpu.cycles + 1}, got {result.cycles}"
+    return cpu
+
+
+@cocotb.test()
+async def stimulus_ports(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+
+    # Every phase of the events against the instructions sampling them
+    schedule = port_schedule()
+    for shift in range(5):
+        cpu = await run_both(dut, ports, schedule.shifted(shift), max_cycles=20_000)
+        assert cpu.ram[1] == 6, f"Unexpected external interruptions: desired 6, got {cpu.ram[1]}"
+
+
+@cocotb.test()
+async def stimulus_sparse(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+
+    # One event in a long idle run, taken by the idle loop driver too
+    schedule = Schedule([(40_000, "ext_int_tb", 1)])
+    cpu = await run_both(dut, external, schedule, halt_on_self_jump=False)
+    assert cpu.p0out == 42, f"Unexpected P0: desired 42, got {cpu.p0out}"
+    assert cpu.cycles > 40_000, f"Unexpected cycles: desired > 40000, got {cpu.cycles}"
+
+
+@cocotb.test()
+async def stimulus_late(dut):
+    # Started far from time 0 and off the microsecond grid, as after other tests of the simulation, where
+    # the times of the events are not exact in microseconds
+    await Timer(124_290_001, "ns")
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    schedule = Schedule([(40_000, "ext_int_tb", 1)])
+    cpu = await run_both(dut, external, schedule, halt_on_self_jump=False)
+    assert cpu.p0out == 42, f"Unexpected P0: desired 42, got {cpu.p0out}"
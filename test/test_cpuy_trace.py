@@ -0,0 +1,97 @@
+import cocotb
+from cocotb.clock import Clock
+
+from cpuy_iss import Cpu
+from cpuy_iss.asm import assemble
+from cpuy_iss.isa import HALT_SENTINEL
+from cpuy_iss.trace import PORT_NAMES, PORTS, RETIREMENTS, Trace, decode_retirement, first_difference
+from cpuy_tb import RomDriver
+from cpuy_tb.table import reset
+from cpuy_tb.trace import TraceRecorder
+
+# Cycle of the first port sample, the CPU spends 2 cycles in RESETTING after reset()
+RESET_CYCLES = 2
+
+# Counts RAM[0] down from 40 on P0 and P1
+countdown = assemble("""
+        MovLW 0x0F
+        MovWR0
+        MovLW 0x03
+        MovWR1
+        PortsCfg
+        MovLM 0, 40
+loop:   MovMW 0
+        MovWP0
+        MovWP1
+        Dec
+        MovWM 0
+        JmpZ done
+        Jmp loop
+done:   MovWP0
+        NOP
+        NOP
+        .byte 127
+""")
+
+
+def reference(program):
+    """Port changes and (pc, op_code, w, flags) after every instruction of program in the ISS"""
+    cpu = Cpu(program)
+    ports = [("p0out", 0), ("p1out", 0), ("p0cfg", 0), ("p1cfg", 0)]
+    retirements = []
+    values = dict(ports)
+    while cpu.run(max_instructions=1) != HALT_SENTINEL:
+        retirements.append((cpu.pc, cpu.op_code, cpu.w, cpu.flags))
+        for port in values:
+            if getattr(cpu, port) != values[port]:
+                values[port] = getattr(cpu, port)
+                ports.append((port, values[port]))
+    return ports, retirements
+
+
+async def record(dut, program, path):
+    await reset(dut)
+    recorder = TraceRecorder(dut, path, retirements=True, chunk_events=16)
+    recorder.start()
+    await RomDriver(dut, program).run()
+    recorder.stop()
+    return recorder
+
+
+@cocotb.test()
+async def trace_ports(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+
+    # A previous run leaves the ports configured, the trace starts once RESETTING clears them
+    await reset(dut)
+    await RomDriver(dut, countdown).run()
+    recorder = await record(dut, countdown, "countdown.trace")
+    ports, retirements = reference(countdown)
+    with Trace("countdown.trace") as trace:
+        assert recorder.writer.events == [trace.count(PORTS), trace.count(RETIREMENTS)]
+        recorded = [(port, value) for _, port, value in trace.ports()]
+        assert recorded == ports, f"Unexpected port changes: desired {ports}, got {recorded}"
+        recorded = [event[1:] for event in trace.retirements()]
+        assert recorded == retirements, f"Unexpected retirements: desired {retirements}, got {recorded}"
+
+        # A port write happens at the EXECUTING edge, the edge before its instruction retires
+        retired = {cycle for cycle, *_ in trace.retirements()}
+        written = [cycle for cycle, port, _ in list(trace.ports())[len(PORT_NAMES):] if port == "p0out"]
+        assert all(cycle + 1 in retired for cycle in written), f"Unexpected port write cycles {written}"
+        cycles = [cycle for cycle, _ in trace.events(RETIREMENTS)]
+        assert cycles == sorted(cycles), "Retirement cycles not in order"
+
+    # Runs after the same program trace the same events, and a MovWP0 in place of the last NOP is the
+    # first difference
+    await record(dut, countdown, "again.trace")
+    await record(dut, countdown, "again_2.trace")
+    longer = countdown.replace(b"\x00\x00\x7f", b"\x40\x00\x00\x7f")
+    await record(dut, longer, "longer.trace")
+    with Trace("again.trace") as trace, Trace("again_2.trace") as again, Trace("longer.trace") as other:
+        assert next(trace.ports()) == (RESET_CYCLES, "p0out", 0), f"Unexpected first event {next(trace.ports())}"
+        for stream in (PORTS, RETIREMENTS):
+            assert first_difference(trace, again, stream) is None, f"Traces of stream {stream} differ"
+        index, _, (_, value) = first_difference(trace, other, RETIREMENTS)
+        assert index == len(retirements) - 1, f"Unexpected first difference at {index}"
+        assert decode_retirement(value)[1] == 0x40, f"Unexpected opcode {decode_retirement(value)[1]}"
@@ -0,0 +1,59 @@
+import pytest
+
+from cpuy_iss.stimulus import P0IN
+from cpuy_iss.trace import (PORTS, RETIREMENTS, Trace, TraceWriter, first_difference, main, port_event,
+                            retirement_event)
+
+
+def write(path, events, chunk_events=4):
+    with TraceWriter(str(path), chunk_events) as writer:
+        for event in events:
+            writer.add(*event)
+    return writer
+
+
+def test_round_trip(tmp_path):
+    events = [(PORTS, cycle * 3, port_event(cycle % 4, cycle & 0x0F)) for cycle in range(10)]
+    events += [(RETIREMENTS, cycle, retirement_event(0x3FF - cycle, cycle, 0xFF, 0x07)) for cycle in range(7)]
+    writer = write(tmp_path / "a.trace", events)
+    assert writer.events == [10, 7]
+
+    with Trace(str(tmp_path / "a.trace")) as trace:
+        assert len(trace) == 17
+        assert list(trace.events(PORTS)) == [(cycle, value) for stream, cycle, value in events if stream == PORTS]
+        assert list(trace.ports())[5] == (15, "p1out", 5)
+        assert list(trace.retirements())[6] == (6, 0x3F9, 6, 0xFF, 0x07)
+        schedule = trace.schedule({"p0out": "p0in"})
+        assert list(schedule) == [(0, P0IN, 0), (12, P0IN, 4), (24, P0IN, 8)]
+
+
+
+def test_close_while_iterating(tmp_path):
+    write(tmp_path / "a.trace", [(PORTS, cycle, port_event(0, cycle)) for cycle in range(10)])
+
+    # Iterators stopped early still hold views of the mapping
+    trace = Trace(str(tmp_path / "a.trace"))
+    ports = trace.ports()
+    chunks = list(trace.chunks(PORTS))
+    assert next(ports) == (0, "p0out", 0) and len(chunks) == 3
+    trace.close()
+    with pytest.raises(ValueError):
+        next(ports)
+
+def test_truncated_and_diff(tmp_path, capsys):
+    events = [(PORTS, cycle, port_event(0, cycle)) for cycle in range(9)]
+    write(tmp_path / "a.trace", events)
+    data = (tmp_path / "a.trace").read_bytes()
+    (tmp_path / "killed.trace").write_bytes(data[:-8]) # The last chunk is incomplete
+    events[6] = (PORTS, 6, port_event(1, 6))
+    write(tmp_path / "b.trace", events)
+
+    with Trace(str(tmp_path / "a.trace")) as a, Trace(str(tmp_path / "killed.trace")) as killed:
+        assert first_difference(a, killed, PORTS) == (8, (8, 8), None)
+        assert first_difference(a, a, RETIREMENTS) is None
+    assert main([str(tmp_path / "a.trace"), str(tmp_path / "b.trace")]) == 1
+    assert "event 6 differs" in capsys.readouterr().out
+
+    (tmp_path / "bad.trace").write_bytes(b"\0" * 16)
+    with pytest.raises(ValueError):
+        Trace(str(tmp_path / "bad.trace"))
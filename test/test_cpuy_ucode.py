@@ -0,0 +1,46 @@
+"""Decode table of ucode.v on the tb_ucode toplevel
+
+Extracts the table of cpuy_iss.ucode, caches it for the tools reading it and
+checks it against the hand written decode of cpuy_iss.isa.
+"""
+
+import cocotb
+
+from cpuy_iss import ucode
+from cpuy_iss.isa import CALL, JMP, JMPC, JMPS, JMPZ, JUMPS, MNEMONICS, NOP, RAM_OPERAND, RET, TBJC, TBJS
+from cpuy_tb.ucode import sweep
+
+TOPLEVEL = "tb_ucode"
+
+
+def _conditions():
+    conditions = {}
+    for op, kind in ((JMP, ucode.CONDITION_ALWAYS), (JMPC, ucode.CONDITION_CARRY), (JMPZ, ucode.CONDITION_ZERO),
+                     (JMPS, ucode.CONDITION_SIGN)):
+        conditions[op] = conditions[op + 1] = (kind, 0)
+    for bit in range(8):
+        for op, kind in ((TBJC, ucode.CONDITION_W_CLEAR), (TBJS, ucode.CONDITION_W_SET)):
+            conditions[op + 2 * bit] = conditions[op + 2 * bit + 1] = (kind, bit)
+    return conditions
+
+
+@cocotb.test()
+async def ucode_table(dut):
+    table = await sweep(dut)
+    ucode.store_table(table)
+
+    conditions = _conditions()
+    failures = []
+    for op, word in enumerate(table):
+        name = f"{MNEMONICS[op] or 'NOP'} ({op:#04x})"
+        desired = {"jump_operation": int(op in JUMPS), "ram_operand": RAM_OPERAND[op],
+                   "stack_operation": int(op in (RET, CALL, CALL + 1)), "stack_direction": int(op | 1 == CALL | 1)}
+        got = {field: ucode.field(word, field) for field in desired}
+        if desired != got:
+            failures.append(f"Unexpected decode of {name}: desired {desired}, got {got}")
+        if (MNEMONICS[op] is None or op == NOP) != (word == 0):
+            failures.append(f"Unexpected decode of {name}: {ucode.fields(word)}")
+        kind = ucode.jump_kind(word)
+        if kind != conditions.get(op, (ucode.CONDITION_NEVER, 0)):
+            failures.append(f"Unexpected jump_condition of {name}: desired {conditions.get(op)}, got {kind}")
+    assert not failures, "\n".join(failures)
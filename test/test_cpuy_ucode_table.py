@@ -0,0 +1,53 @@
+from array import array
+
+import pytest
+
+from cpuy_iss import cache, ucode
+from cpuy_iss.isa import CARRY, SIGN, ZERO
+
+
+def test_layout():
+    assert ucode.CONTROLS_WIDTH == 22
+    assert ucode.CONDITION_BIT_SHIFT + 3 <= 32
+    word = 1 << ucode.SHIFTS["destination_index"] + 1 | 1 << ucode.SHIFTS["source_operands"]
+    assert ucode.field(word, "destination_index") == 2
+    assert ucode.field(word, "source_operands") == 1
+    assert ucode.field(word, "alu_operation") == 0
+
+
+def test_conditions():
+    for kind, bit, w, flags, desired in ((ucode.CONDITION_CARRY, 0, 0, CARRY, True),
+                                         (ucode.CONDITION_ZERO, 0, 0xFF, CARRY | SIGN, False),
+                                         (ucode.CONDITION_SIGN, 0, 0, SIGN | ZERO, True),
+                                         (ucode.CONDITION_W_CLEAR, 3, 0xF7, 0, True),
+                                         (ucode.CONDITION_W_SET, 3, 0xF7, 0, False)):
+        word = ucode.pack(0, ucode.truth_table(kind, bit))
+        assert ucode.jump_kind(word) == (kind, bit)
+        assert ucode.jump_condition(word, w, flags) == desired, \
+            f"Unexpected jump_condition of {ucode.CONDITION_NAMES[kind]} {bit}: desired {desired}"
+
+
+def test_unknown_condition():
+    # Carry and zero is not a condition ucode.v decodes
+    with pytest.raises(ValueError):
+        ucode.classify(ucode.truth_table(ucode.CONDITION_CARRY) & ucode.truth_table(ucode.CONDITION_ZERO))
+    with pytest.raises(ValueError):
+        ucode.pack(1 << ucode.CONTROLS_WIDTH, 0)
+
+
+def test_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("CPUY_CACHE", str(tmp_path))
+    source = tmp_path / "ucode.v"
+    source.write_text("module ucode; endmodule\n")
+    assert ucode.load_table(str(source)) is None
+
+    table = array("I", (ucode.pack(op << 1, ucode.truth_table(op % 7 if op % 7 < 5 else ucode.CONDITION_NEVER))
+                        for op in range(256)))
+    path = ucode.store_table(table, str(source))
+    assert path == cache.path("ucode", ucode.key(str(source)))
+    assert ucode.load_table(str(source)) == table
+
+    source.write_text("module ucode (); endmodule\n")
+    assert ucode.load_table(str(source)) is None
+    with pytest.raises(ValueError):
+        ucode.from_bytes(b"\0" * 4)
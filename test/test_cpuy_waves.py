@@ -0,0 +1,83 @@
+import os
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, FallingEdge, ReadOnly, RisingEdge
+
+from cpuy_iss import Cpu
+from cpuy_iss.isa import T0_INTERRUPTION_VECTOR
+from cpuy_tb import RomDriver
+from cpuy_tb.scoreboard import Scoreboard, ScoreboardError
+from cpuy_tb.table import reset
+from cpuy_tb.waves import Waves
+
+from .test_cpuy_fast_forward import countdown
+
+
+async def captured_cycles(dut):
+    """Waits for the next capture and returns its first cycle, PC and length in cycles"""
+    await RisingEdge(dut.waves.capturing)
+    await ReadOnly()
+    start, pc = dut.cycle_tb.value.integer, dut.cpuy.pc.value.integer
+    await FallingEdge(dut.waves.capturing)
+    await ReadOnly()
+    cycles = dut.cycle_tb.value.integer - start
+    await FallingEdge(dut.clk_tb)
+    return start, pc, cycles
+
+
+@cocotb.test()
+async def waves_triggers(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+    waves = Waves(dut)
+
+    await reset(dut)
+    waves.arm(pc=0x40, cycles=30)
+    run = cocotb.start_soon(RomDriver(dut, countdown).run())
+
+    _, pc, cycles = await captured_cycles(dut)
+    # The trigger is the FETCHING_OPCODE cycle of the instruction, the PC moves on to its operand
+    assert pc == 0x41, f"Unexpected PC after the trigger: desired 0x41, got {pc:#x}"
+    assert cycles == 30, f"Unexpected captured cycles: desired 30, got {cycles}"
+    assert any(os.path.exists(name) for name in ("cpuy.fst", "cpuy.vcd")), "No waveform file written"
+
+    waves.arm(interrupt=True, cycles=10, scopes=("cpuy",))
+    _, pc, cycles = await captured_cycles(dut)
+    assert pc == T0_INTERRUPTION_VECTOR, \
+        f"Unexpected PC after the interruption trigger: desired {T0_INTERRUPTION_VECTOR:#x}, got {pc:#x}"
+    assert cycles == 10, f"Unexpected captured cycles: desired 10, got {cycles}"
+
+    waves.arm()
+    await ClockCycles(dut.clk_tb, 50)
+    assert waves.capturing, "Capture without a window ended"
+    waves.stop()
+    await ClockCycles(dut.clk_tb, 2)
+    assert not waves.capturing, "Capture still running after stop()"
+
+    result = await run
+    assert result.reason == "sentinel", f"Unexpected halt: {result}"
+
+
+@cocotb.test()
+async def waves_divergence(dut):
+    cocotb.start_soon(Clock(dut.clk_tb, 10, "us").start())
+    dut.ext_int_tb.value = 0
+    waves = Waves(dut)
+
+    # The NOPs retire enough instructions for the scoreboard to wake up before the end
+    program = [132, 25, 136, 30, 64] + [0] * 20 + [127] # Movlw 25, Addlw 30, MovwP0
+    reference = list(program)
+    reference[3] = 31 # The ISS adds 31
+
+    await reset(dut)
+    scoreboard = Scoreboard(dut, Cpu(reference), waves=waves)
+    scoreboard.start()
+    await RomDriver(dut, program).run()
+    assert scoreboard.divergence is not None, "Divergence not detected before the end of the program"
+    assert waves.capturing, "No capture started by the divergence"
+    waves.stop()
+    try:
+        scoreboard.finish()
+    except ScoreboardError:
+        pass
@@ -0,0 +1,5 @@
+// Verilator builds with waves.v: $dumpvars needs tracing turned on before time 0,
+// which the cocotb main only does when it dumps the whole design itself
+#include "verilated.h"
+
+static const bool trace_ever_on = (Verilated::traceEverOn(true), true);
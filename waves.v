@@ -0,0 +1,80 @@
+`default_nettype none
+`timescale 1ns/1ns
+
+/*
+windowed waveform capture, instantiated by tb.v in builds defining CPUY_WAVES.
+Nothing is dumped until cpuy_tb.waves arms a trigger, then the selected
+scopes are dumped into cpuy.fst (cpuy.vcd with CPUY_WAVES_VCD) until the
+window ends or the capture is disarmed. Verilator ignores $dumpoff and the
+scopes, it dumps everything from the first capture on
+*/
+
+module waves (
+	input wire clk,
+	input wire [9:0] pc,
+	input wire [2:0] cpu_state
+);
+
+	// Written by cpuy_tb.waves, the scopes of the first capture are dumped by all of them
+	reg [4:0] scopes = 5'b11111; // tb, cpuy, alu, stack, timers
+	reg armed = 0;
+	reg [1:0] trigger = 0; // 0 right away, 1 when the instruction at trigger_pc starts, 2 at an interruption entry
+	reg [9:0] trigger_pc = 0;
+	reg [31:0] window = 0; // Cycles captured from the trigger, 0 until disarmed
+
+	reg capturing = 0;
+	reg [31:0] remaining = 0;
+	reg dumping = 0;
+
+	wire hit = trigger == 0 || (trigger == 1 && cpu_state == 1 && pc == trigger_pc) || // FETCHING_OPCODE
+	           (trigger == 2 && cpu_state == 5); // INTERRUPT_REDIRECTION
+
+	initial begin
+`ifdef CPUY_WAVES_VCD
+		$dumpfile("cpuy.vcd");
+`else
+		$dumpfile("cpuy.fst");
+`endif
+	end
+
+	always @(posedge clk) begin
+		if (!armed) begin
+			capturing <= 0;
+		end else if (!capturing) begin
+			if (hit) begin
+				capturing <= 1;
+				remaining <= window;
+			end
+		end else if (window != 0) begin
+			if (remaining == 1) begin
+				capturing <= 0;
+				armed <= 0;
+			end
+			remaining <= remaining - 1;
+		end
+	end
+
+	always @(posedge capturing) begin
+		if (!dumping) begin
+			dumping = 1;
+			if (scopes[0]) $dumpvars(1, tb);
+			if (scopes[1]) begin
+				$dumpvars(1, tb.cpuy);
+				$dumpvars(1, tb.cpuy.ucode);
+			end
+			if (scopes[2]) $dumpvars(0, tb.cpuy.alu);
+			if (scopes[3]) $dumpvars(0, tb.cpuy.stack);
+			if (scopes[4]) begin
+				$dumpvars(0, tb.cpuy.tmr0);
+				$dumpvars(0, tb.cpuy.tmr1);
+			end
+		end else begin
+			$dumpon;
+		end
+	end
+
+	always @(negedge capturing) begin
+		$dumpoff;
+	end
+
+endmodule